@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.option_parsing import (parse_command_line_parameters,
+                                        make_option)
+from os import path, environ
+from shutil import rmtree
+from subprocess import Popen, PIPE, call
+from tempfile import mkdtemp
+from time import time, sleep
+import sys
+from helper_daemon import SOCKET_ENV_VAR, _connect
+
+base_dir = path.join(path.dirname(path.abspath(__file__)), '..')
+scripts_dir = path.join(base_dir, 'scripts')
+support_dir = path.join(base_dir, 'test', 'support_files')
+
+script_info = {}
+script_info['brief_description'] = "Measures the per-job overhead of the\
+ helper scripts with and without the helper daemon"
+script_info['script_description'] = "Runs the helper scripts executed around\
+ a QIIME call by a Galaxy tool with blast_db and output_dir options\
+ (uncompress_tgz.py, get_blast_db_path.py and compress_path.py) as separate\
+ processes, executing their operations in-process and through a helper\
+ daemon."
+script_info['script_usage'] = [("Example:",
+"Measure the overhead of 20 jobs",
+"%prog -n 20")]
+script_info['output_description'] = "Prints the mean time per job through\
+ standard output"
+script_info['required_options'] = []
+script_info['optional_options'] = [
+    make_option('-n', '--num_jobs', type="int", default=10,
+                help='number of jobs run in each mode [default: %default]')
+]
+script_info['version'] = __version__
+
+def run_job(work_dir, env):
+    """Runs the helper script calls of a job, returns the elapsed time"""
+    python = sys.executable
+    out_tgz = path.join(work_dir, 'out.tgz')
+    commands = [
+        [python, path.join(scripts_dir, 'uncompress_tgz.py'), '-i',
+            path.join(support_dir, 'tar_dir.tgz'), '-o',
+            path.join(work_dir, 'blast_db')],
+        [python, path.join(scripts_dir, 'get_blast_db_path.py'), '-i',
+            path.join(support_dir, 'blast_db')],
+        [python, path.join(scripts_dir, 'compress_path.py'), '-i',
+            path.join(work_dir, 'blast_db'), '-o', out_tgz]]
+    start = time()
+    for command in commands:
+        proc = Popen(command, env=env, stdout=PIPE, stderr=PIPE)
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            raise ValueError, "Error running %s: %s" % (command[1], err)
+    elapsed = time() - start
+    call(['rm', '-rf', path.join(work_dir, 'blast_db'), out_tgz])
+    return elapsed
+
+def mean_job_time(work_dir, env, num_jobs):
+    """Returns the mean time of 'num_jobs' jobs"""
+    return sum([run_job(work_dir, env) for i in range(num_jobs)]) / num_jobs
+
+if __name__ == '__main__':
+    option_parser, opts, args = parse_command_line_parameters(**script_info)
+
+    work_dir = mkdtemp()
+    socket_path = path.join(work_dir, 'helper.sock')
+    env = dict(environ)
+    env[SOCKET_ENV_VAR] = socket_path
+
+    daemon = None
+    try:
+        # Without daemon: nobody is listening on the socket
+        in_process_time = mean_job_time(work_dir, env, opts.num_jobs)
+
+        daemon = Popen([sys.executable,
+            path.join(scripts_dir, 'start_helper_daemon.py'), '-s',
+            socket_path], env=env)
+        sock = _connect(socket_path)
+        while sock is None:
+            sleep(0.05)
+            sock = _connect(socket_path)
+        sock.close()
+        daemon_time = mean_job_time(work_dir, env, opts.num_jobs)
+    finally:
+        if daemon is not None:
+            daemon.terminate()
+            daemon.wait()
+        rmtree(work_dir)
+
+    print "Jobs: %d (3 helper script calls per job)" % opts.num_jobs
+    print "In-process: %.2f ms per job" % (in_process_time * 1000)
+    print "Helper daemon: %.2f ms per job" % (daemon_time * 1000)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.option_parsing import (parse_command_line_parameters,
+                                        make_option)
+from os import path
+from subprocess import Popen, PIPE
+import sys
+
+scripts_dir = path.join(path.dirname(path.abspath(__file__)), '..', 'scripts')
+
+# Runs a script printing its help in a fresh interpreter, reporting the time
+# of each import in the format of python 3's -X importtime: the time spent in
+# the module itself and the time including its own imports, in microseconds
+IMPORT_TIMER = """
+import __builtin__, sys
+from time import time
+from os.path import dirname
+import runpy
+
+script_fp = sys.argv[1]
+sys.argv = [script_fp, '-h']
+sys.path.insert(0, dirname(script_fp))
+
+original_import = __builtin__.__import__
+report = []
+stack = [[0.0]]
+
+def timed_import(name, *args, **kwargs):
+    if name in sys.modules:
+        return original_import(name, *args, **kwargs)
+    stack.append([0.0])
+    start = time()
+    try:
+        return original_import(name, *args, **kwargs)
+    finally:
+        cumulative = time() - start
+        children = stack.pop()[0]
+        stack[-1][0] += cumulative
+        report.append((cumulative - children, cumulative, len(stack), name))
+
+__builtin__.__import__ = timed_import
+start = time()
+try:
+    runpy.run_path(script_fp, run_name='__main__')
+except SystemExit:
+    pass
+total = time() - start
+__builtin__.__import__ = original_import
+
+sys.stdout = sys.__stdout__
+for self_time, cumulative, level, name in report:
+    sys.stderr.write("import time: %9d | %10d | %s%s\\n" % (self_time * 1e6,
+        cumulative * 1e6, '  ' * (level - 1), name))
+sys.stderr.write("total: %d\\n" % (total * 1e6))
+"""
+
+script_info = {}
+script_info['brief_description'] = "Reports the startup time of the helper\
+ scripts"
+script_info['script_description'] = "Runs each helper script executed in the\
+ Galaxy jobs (uncompress_tgz.py, get_blast_db_path.py and compress_path.py)\
+ in a fresh interpreter, parsing its command line, and reports the time of\
+ each module import, as python 3's -X importtime does."
+script_info['script_usage'] = [("Example:",
+"Report the imports of the helper scripts",
+"%prog"), ("Verbose example:", "Report all the imports, not only the slowest",
+"%prog -n 0")]
+script_info['output_description'] = "Prints the import time report of each\
+ script through standard output"
+script_info['required_options'] = []
+script_info['optional_options'] = [
+    make_option('-n', '--num_imports', type="int", default=10,
+                help='number of imports reported for each script, sorted by' +
+                    ' their cumulative time. Use 0 to report all of them in' +
+                    ' import order [default: %default]')
+]
+script_info['version'] = __version__
+
+def import_time_report(script_fp):
+    """Returns the import report lines and the total time of the script"""
+    proc = Popen([sys.executable, '-c', IMPORT_TIMER, script_fp],
+        stdout=PIPE, stderr=PIPE)
+    out, err = proc.communicate()
+    if proc.returncode != 0:
+        raise ValueError, "Error running %s: %s" % (script_fp, err)
+    lines = err.splitlines()
+    return lines[:-1], int(lines[-1].split()[1])
+
+if __name__ == '__main__':
+    option_parser, opts, args = parse_command_line_parameters(**script_info)
+
+    for name in ['uncompress_tgz.py', 'get_blast_db_path.py',
+                 'compress_path.py']:
+        lines, total = import_time_report(path.join(scripts_dir, name))
+        if opts.num_imports > 0:
+            lines = sorted(lines, key=lambda l: int(l.split('|')[1]),
+                reverse=True)[:opts.num_imports]
+        print "%s: %.2f ms" % (name, total / 1000.0)
+        print "import time: self [us] | cumulative | imported package"
+        for line in lines:
+            print line
+        print
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+# Regression suite of the steps whose cost grows with the size of their input:
+# the XML generation of a tool, the update of the tool_conf.xml file and the
+# compression and extraction of the tgz files of the directory datasets. All
+# the inputs are synthetic and generated in a temporary directory, so the
+# suite runs offline. The timings are stored in a JSON file which can be used
+# as the baseline of a later run:
+#
+#   {"format": 1, "platform": "...", "python": "2.7.18", "repeats": 5,
+#    "results": {"generate_xml_string/100": 0.0021, ...}}
+#
+# where each result is the minimum time, in seconds, of the benchmark for the
+# given size (number of options, number of tools or tarball MB).
+
+import json
+import platform
+import sys
+from os import makedirs, path, urandom
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import time
+from xml.dom.minidom import parseString
+from atomic_write import write_if_changed
+from cogent.util.option_parsing import (parse_command_line_parameters,
+                                        make_option)
+from galaxy_integration import update_tool_conf_xml
+from tgz_manager import compress_to_tgz, extract_from_tgz
+from xml_generator import ScriptInfo, generate_xml_string
+from bench_tool_conf_update import make_synthetic_tool_conf, make_section_dict
+from bench_xml_writer import make_synthetic_script_info, min_time
+
+# Version of the results file format
+RESULTS_FORMAT = 1
+
+BENCHMARKS = ['generate_xml_string', 'update_tool_conf_xml',
+              'compress_to_tgz', 'extract_from_tgz']
+
+# Size of the files of the synthetic tarballs, in MB
+TARBALL_FILE_MB = 64
+# Maps each byte to a nucleotide, so random bytes become a random sequence
+DNA_TABLE = 'ACGT' * 64
+# Number of tools of each section of the synthetic tool_conf.xml files
+TOOLS_PER_SECTION = 50
+
+script_info = {}
+script_info['brief_description'] = "Regression suite of the Galaxy tool XML\
+ generation, the tool_conf.xml update and the tgz files"
+script_info['script_description'] = "Times generate_xml_string on synthetic\
+ scripts with options of every type, update_tool_conf_xml on synthetic\
+ tool_conf.xml files and compress_to_tgz and extract_from_tgz on synthetic\
+ directories, for each of the given sizes. The minimum time of each benchmark\
+ is stored in a JSON file. If a baseline file from a previous run is given,\
+ the benchmarks slower than the baseline by more than the threshold are\
+ reported as regressions and the script exits with an error status. All the\
+ inputs are generated in a temporary directory, so it runs offline."
+script_info['script_usage'] = [("Example:",
+"Store the baseline of the default sizes",
+"%prog -o baseline.json"),
+("Example:",
+"Compare against the baseline, flagging the benchmarks more than 10% slower",
+"%prog -o current.json -b baseline.json -t 0.1"),
+("Example:",
+"Only time the tgz files, with tarballs of 1 MB, 1 GB and 5 GB",
+"%prog -o tgz.json -e compress_to_tgz,extract_from_tgz -z 1,1024,5120 -n 1")]
+script_info['output_description'] = "Prints a table with the timings through\
+ standard output and, if an output file is given, stores them as JSON"
+script_info['required_options'] = []
+script_info['optional_options'] = [
+    make_option('-o', '--output_fp', type="new_filepath",
+                help='JSON file to store the timings, which can be used as' +
+                    ' the baseline of later runs'),
+    make_option('-b', '--baseline_fp', type="existing_filepath",
+                help='JSON file with the baseline timings'),
+    make_option('-t', '--threshold', type="float", default=0.25,
+                help='relative slowdown over the baseline reported as a' +
+                    ' regression [default: %default]'),
+    make_option('-e', '--benchmarks', type="string",
+                default=','.join(BENCHMARKS),
+                help='comma-separated list of the benchmarks to run' +
+                    ' [default: %default]'),
+    make_option('-x', '--option_sizes', type="string",
+                default="10,50,100,500",
+                help='comma-separated list with the number of options of' +
+                    ' the synthetic scripts [default: %default]'),
+    make_option('-c', '--tool_conf_sizes', type="string",
+                default="100,1000,10000,50000",
+                help='comma-separated list with the number of tools of the' +
+                    ' synthetic tool_conf.xml files [default: %default]'),
+    make_option('-z', '--tarball_sizes', type="string", default="1,16,64",
+                help='comma-separated list with the size, in MB, of the' +
+                    ' synthetic tarballs. The temporary directory needs' +
+                    ' about twice the largest size of free space' +
+                    ' [default: %default]'),
+    make_option('-n', '--repeats', type="int", default=5,
+                help='number of times each benchmark is run. The minimum' +
+                    ' time is reported [default: %default]'),
+    make_option('--tmp_dir', type="existing_dirpath",
+                help='directory where the synthetic tarballs are generated' +
+                    ' [default: the system temporary directory]')
+]
+script_info['version'] = __version__
+
+def parse_sizes(sizes):
+    """Returns the list of ints of a comma-separated string"""
+    return [int(size) for size in sizes.split(',') if size.strip()]
+
+def make_synthetic_dir(dir_path, size_mb):
+    """Fills dir_path with 'size_mb' MB of files
+
+    Half of each MB is random data and the other half a random DNA sequence,
+    so the files compress like the sequence and binary files of the QIIME
+    directory datasets
+    """
+    half_mb = 512 * 1024
+    makedirs(dir_path)
+    written = 0
+    file_index = 0
+    while written < size_mb:
+        file_mb = min(TARBALL_FILE_MB, size_mb - written)
+        f = open(path.join(dir_path, 'file%d.dat' % file_index), 'wb')
+        for i in range(file_mb):
+            f.write(urandom(half_mb))
+            f.write(urandom(half_mb).translate(DNA_TABLE))
+        f.close()
+        written += file_mb
+        file_index += 1
+
+def bench_generate_xml_string(sizes, repeats):
+    """Returns a list of (size, seconds) timing generate_xml_string on
+    scripts with 'size' options"""
+    results = []
+    for size in sizes:
+        info = ScriptInfo(make_synthetic_script_info(size), 'synthetic_script',
+            'synthetic_script.py')
+        results.append((size, min_time(lambda: generate_xml_string(info),
+            repeats)))
+    return results
+
+def bench_update_tool_conf_xml(sizes, repeats):
+    """Returns a list of (size, seconds) timing update_tool_conf_xml on
+    tool_conf.xml files with 'size' tools"""
+    results = []
+    for size in sizes:
+        num_sections = max(size // TOOLS_PER_SECTION, 1)
+        tool_conf_str = make_synthetic_tool_conf(size, num_sections)
+        section_dict = make_section_dict(160, num_sections)
+        times = []
+        for i in range(repeats):
+            # The update modifies the document, so it is parsed on each run
+            tool_conf = parseString(tool_conf_str)
+            start = time()
+            update_tool_conf_xml(tool_conf, section_dict)
+            times.append(time() - start)
+            tool_conf.unlink()
+        results.append((size, min(times)))
+    return results
+
+def bench_tgz(sizes, repeats, benchmarks, tmp_dir=None):
+    """Returns a dict of {benchmark: [(size, seconds)]} timing compress_to_tgz
+    and extract_from_tgz on directories of 'size' MB
+
+    Input:
+        sizes: list of directory sizes, in MB
+        repeats: number of runs of each benchmark
+        benchmarks: list with the tgz benchmarks to run
+        tmp_dir: directory where the synthetic directories are generated
+    """
+    results = dict([(name, []) for name in benchmarks])
+    for size in sizes:
+        work_dir = mkdtemp(dir=tmp_dir)
+        try:
+            in_dir = path.join(work_dir, 'synthetic_dir')
+            tgz_fp = path.join(work_dir, 'synthetic_dir.tgz')
+            out_dir = path.join(work_dir, 'extracted_dir')
+            make_synthetic_dir(in_dir, size)
+
+            if 'compress_to_tgz' in results:
+                times = []
+                for i in range(repeats):
+                    start = time()
+                    compress_to_tgz(in_dir, tgz_fp)
+                    times.append(time() - start)
+                results['compress_to_tgz'].append((size, min(times)))
+            else:
+                # Only the extraction is timed: the tgz file is built once
+                compress_to_tgz(in_dir, tgz_fp)
+
+            if 'extract_from_tgz' in results:
+                # The input directory is not needed anymore, which halves the
+                # free space needed by the extraction
+                rmtree(in_dir)
+                times = []
+                for i in range(repeats):
+                    start = time()
+                    extract_from_tgz(tgz_fp, out_dir)
+                    times.append(time() - start)
+                    rmtree(out_dir)
+                results['extract_from_tgz'].append((size, min(times)))
+        finally:
+            rmtree(work_dir)
+    return results
+
+def compare_results(results, baseline, threshold):
+    """Compares the timings against the baseline timings
+
+    Inputs:
+        results: dict of {benchmark key: seconds}
+        baseline: dict of {benchmark key: seconds}
+        threshold: relative slowdown reported as a regression
+
+    Returns a sorted list of (benchmark key, baseline seconds, seconds,
+    status) tuples, where status is "ok", "REGRESSION" or "new" if the
+    benchmark is not in the baseline
+    """
+    comparison = []
+    for key in sorted(results):
+        seconds = results[key]
+        if key not in baseline:
+            comparison.append((key, None, seconds, "new"))
+        elif seconds > baseline[key] * (1 + threshold):
+            comparison.append((key, baseline[key], seconds, "REGRESSION"))
+        else:
+            comparison.append((key, baseline[key], seconds, "ok"))
+    return comparison
+
+def load_results(results_fp):
+    """Returns the dict of {benchmark key: seconds} stored in results_fp
+
+    Note: raises a ValueError if the file is not a results file
+    """
+    f = open(results_fp, 'U')
+    try:
+        data = json.load(f)
+    finally:
+        f.close()
+    if not isinstance(data, dict) or data.get('format') != RESULTS_FORMAT:
+        raise ValueError, "%s is not a benchmark results file of format %d" \
+            % (results_fp, RESULTS_FORMAT)
+    return data['results']
+
+def save_results(results, results_fp, repeats):
+    """Stores the dict of {benchmark key: seconds} in results_fp"""
+    write_if_changed(results_fp, json.dumps({'format': RESULTS_FORMAT,
+        'platform': platform.platform(), 'python': platform.python_version(),
+        'repeats': repeats, 'results': results}, sort_keys=True, indent=1))
+
+if __name__ == '__main__':
+    option_parser, opts, args = parse_command_line_parameters(**script_info)
+
+    benchmarks = [name.strip() for name in opts.benchmarks.split(',')]
+    for name in benchmarks:
+        if name not in BENCHMARKS:
+            option_parser.error("Unknown benchmark %s. Valid benchmarks: %s"
+                % (name, ', '.join(BENCHMARKS)))
+    if opts.repeats < 1:
+        option_parser.error("repeats must be greater than 0")
+    if opts.threshold < 0:
+        option_parser.error("threshold can't be negative")
+
+    baseline = load_results(opts.baseline_fp) if opts.baseline_fp else {}
+
+    timings = {}
+    if 'generate_xml_string' in benchmarks:
+        timings['generate_xml_string'] = bench_generate_xml_string(
+            parse_sizes(opts.option_sizes), opts.repeats)
+    if 'update_tool_conf_xml' in benchmarks:
+        timings['update_tool_conf_xml'] = bench_update_tool_conf_xml(
+            parse_sizes(opts.tool_conf_sizes), opts.repeats)
+    tgz_benchmarks = [name for name in benchmarks if name.endswith('_tgz')]
+    if tgz_benchmarks:
+        timings.update(bench_tgz(parse_sizes(opts.tarball_sizes),
+            opts.repeats, tgz_benchmarks, opts.tmp_dir))
+
+    results = {}
+    for name, sizes in timings.items():
+        for size, seconds in sizes:
+            results["%s/%d" % (name, size)] = seconds
+
+    if opts.output_fp:
+        save_results(results, opts.output_fp, opts.repeats)
+
+    comparison = compare_results(results, baseline, opts.threshold)
+    print "%-30s %14s %14s %8s %s" % ("benchmark", "baseline (ms)",
+        "current (ms)", "change", "status")
+    for key, base, seconds, status in comparison:
+        if base is None:
+            print "%-30s %14s %14.2f %8s %s" % (key, "-", seconds * 1000, "-",
+                status)
+        else:
+            change = (seconds - base) / base * 100 if base else 0.0
+            print "%-30s %14.2f %14.2f %7.1f%% %s" % (key, base * 1000,
+                seconds * 1000, change, status)
+
+    regressions = [key for key, base, seconds, status in comparison
+        if status == "REGRESSION"]
+    if regressions:
+        print "%d regressions over a threshold of %.0f%%" % (len(regressions),
+            opts.threshold * 100)
+        sys.exit(1)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.option_parsing import (parse_command_line_parameters,
+                                        make_option)
+from time import time
+from Cheetah.Template import Template
+from xml_generator import LIST_DICT_TO_STRING_FUNCTION
+
+script_info = {}
+script_info['brief_description'] = "Measures the rendering of the command of\
+ a repeat option"
+script_info['script_description'] = "Renders with Cheetah, as Galaxy does,\
+ the command of a tool with a repeat option for an increasing number of\
+ datasets, using the current list_dict_to_string function and the previous\
+ one, which concatenated the paths one by one, and checks that both render\
+ the same command. It needs Cheetah in the python path."
+script_info['script_usage'] = [("Example:",
+"Benchmark repeat options with 10, 100 and 1000 datasets",
+"%prog -s 10,100,1000")]
+script_info['output_description'] = "Prints a table with the timings through\
+ standard output"
+script_info['required_options'] = []
+script_info['optional_options'] = [
+    make_option('-s', '--sizes', type="string", default="10,100,1000",
+                help='comma-separated list with the number of datasets of' +
+                    ' the repeat option [default: %default]'),
+    make_option('-n', '--repeats', type="int", default=20,
+                help='number of times each command is rendered. The' +
+                    ' minimum time is reported [default: %default]')
+]
+script_info['version'] = __version__
+
+# The list_dict_to_string function previously generated
+OLD_LIST_DICT_TO_STRING_FUNCTION = """
+#def list_dict_to_string(list_dict):
+\t#set $file_list = list_dict[0]['additional_input'].__getattr__('file_name')
+\t#for d in list_dict[1:]:
+\t\t#set $file_list = $file_list + ',' + d['additional_input'].__getattr__('file_name')
+\t#end for
+\t#return $file_list
+#end def
+"""
+
+COMMAND = "merge_otu_tables.py -i $list_dict_to_string($input_files_input_fps)"
+
+class Dataset(object):
+    """Stands for the Galaxy wrapper of a dataset in the template namespace,
+    which gives its attributes through __getattr__"""
+    def __init__(self, file_name):
+        self._file_name = file_name
+
+    def __getattr__(self, name):
+        if name == 'file_name':
+            return self._file_name
+        raise AttributeError, name
+
+def get_input_files(num_datasets):
+    """Returns the repeat option value with num_datasets datasets"""
+    return [{'additional_input': Dataset(
+        '/galaxy/database/files/000/dataset_%d.dat' % i)}
+        for i in range(num_datasets)]
+
+def render(function, input_files):
+    """Returns the command rendered with the given list_dict_to_string"""
+    return str(Template(function + COMMAND, searchList=[
+        {'input_files_input_fps': input_files}]))
+
+def time_rendering(function, input_files, repeats):
+    """Returns the minimum time of rendering the command 'repeats' times"""
+    template_class = Template.compile(function + COMMAND)
+    best = None
+    for i in range(repeats):
+        start = time()
+        str(template_class(searchList=[{'input_files_input_fps':
+            input_files}]))
+        elapsed = time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+if __name__ == '__main__':
+    option_parser, opts, args = parse_command_line_parameters(**script_info)
+    sizes = [int(s) for s in opts.sizes.split(',')]
+
+    print "datasets\tconcatenation (ms)\tjoin (ms)"
+    for size in sizes:
+        input_files = get_input_files(size)
+        if render(OLD_LIST_DICT_TO_STRING_FUNCTION, input_files) != \
+                render(LIST_DICT_TO_STRING_FUNCTION, input_files):
+            raise ValueError, "The rendered commands differ for %d " \
+                                "datasets" % size
+        old_time = time_rendering(OLD_LIST_DICT_TO_STRING_FUNCTION,
+            input_files, opts.repeats)
+        new_time = time_rendering(LIST_DICT_TO_STRING_FUNCTION, input_files,
+            opts.repeats)
+        print "%d\t%.3f\t%.3f" % (size, old_time * 1000, new_time * 1000)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.option_parsing import (parse_command_line_parameters,
+                                        make_option)
+from glob import glob
+from os import path
+from subprocess import Popen, PIPE
+from time import time
+import sys
+from script_info_extractor import extract_script_info, DynamicScriptInfoError
+
+# Times the import of a script in a fresh interpreter, as integrate() pays
+# the whole import chain of each script the first time it is imported
+IMPORT_TIMER = """
+import sys
+from time import time
+sys.path.insert(0, sys.argv[1])
+start = time()
+__import__(sys.argv[2])
+sys.stdout.write("%f" % (time() - start))
+"""
+
+test_dir = path.join(path.dirname(path.abspath(__file__)), '..', 'test')
+
+script_info = {}
+script_info['brief_description'] = "Compares the static script_info\
+ extraction against the script import"
+script_info['script_description'] = "For each script in 'input_dir', times\
+ the static extraction of its script_info and the import of the script in a\
+ fresh python interpreter."
+script_info['script_usage'] = [("Example:",
+"Benchmark the scripts of a QIIME installation",
+"%prog -i $HOME/qiime/scripts")]
+script_info['output_description'] = "Prints a table with the timings of each\
+ script through standard output"
+script_info['required_options'] = []
+script_info['optional_options'] = [
+    make_option('-i', '--input_dir', type="existing_dirpath",
+                default=path.join(test_dir, 'support_files'),
+                help='directory containing the scripts [default: %default]'),
+    make_option('-n', '--repeats', type="int", default=3,
+                help='number of times each measure is taken. The minimum' +
+                    ' time is reported [default: %default]')
+]
+script_info['version'] = __version__
+
+def time_static_extraction(script_fp, repeats):
+    """Returns the time needed to statically extract the script_info
+
+    Returns None if the script_info is built dynamically
+    """
+    times = []
+    for i in range(repeats):
+        start = time()
+        try:
+            extract_script_info(script_fp)
+        except DynamicScriptInfoError:
+            return None
+        times.append(time() - start)
+    return min(times)
+
+def time_import(script_fp, repeats):
+    """Returns the time needed to import the script in a fresh interpreter
+
+    Returns None if the script can't be imported
+    """
+    dir_path, command = path.split(script_fp)
+    fname, ext = path.splitext(command)
+    times = []
+    for i in range(repeats):
+        proc = Popen([sys.executable, '-c', IMPORT_TIMER, dir_path, fname],
+                        stdout=PIPE, stderr=PIPE)
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            return None
+        times.append(float(out))
+    return min(times)
+
+if __name__ == '__main__':
+    option_parser, opts, args = parse_command_line_parameters(**script_info)
+
+    script_fps = sorted(glob(path.join(opts.input_dir, '*.py')))
+    if not script_fps:
+        option_parser.error("No python scripts found in %s" % opts.input_dir)
+
+    total_static = 0.0
+    total_import = 0.0
+    fallbacks = 0
+
+    print "%-45s %12s %12s" % ("script", "static (ms)", "import (ms)")
+    for script_fp in script_fps:
+        static_time = time_static_extraction(script_fp, opts.repeats)
+        import_time = time_import(script_fp, opts.repeats)
+
+        if static_time is None:
+            fallbacks += 1
+            # The import path is used for this script
+            static_time = import_time
+        if import_time is None:
+            print "%-45s %12s %12s" % (path.basename(script_fp), "-", "error")
+            continue
+
+        total_static += static_time
+        total_import += import_time
+        print "%-45s %12.2f %12.2f" % (path.basename(script_fp),
+            static_time * 1000, import_time * 1000)
+
+    print
+    print "Scripts: %d (%d fall back to the import path)" % (len(script_fps),
+        fallbacks)
+    print "Total static: %.2f ms" % (total_static * 1000)
+    print "Total import: %.2f ms" % (total_import * 1000)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.option_parsing import (parse_command_line_parameters,
+                                        make_option)
+from os import path
+from time import time
+from xml.dom.minidom import parseString
+from galaxy_integration import (get_section_node, exist_script_in_section,
+    add_section_to_xml, update_tool_conf_xml)
+
+script_info = {}
+script_info['brief_description'] = "Benchmarks the update of a large Galaxy\
+ tool_conf.xml file"
+script_info['script_description'] = "Generates a synthetic tool_conf.xml file\
+ and times its update with the indexed update_tool_conf_xml and with the\
+ previous implementation, which searched the section and the tool of each\
+ script in the DOM."
+script_info['script_usage'] = [("Example:",
+"Benchmark a tool_conf.xml with 10000 tools in 200 sections",
+"%prog -t 10000 -s 200")]
+script_info['output_description'] = "Prints the timings through standard\
+ output"
+script_info['required_options'] = []
+script_info['optional_options'] = [
+    make_option('-t', '--num_tools', type="int", default=10000,
+                help='number of tools in the tool_conf.xml file' +
+                    ' [default: %default]'),
+    make_option('-s', '--num_sections', type="int", default=200,
+                help='number of sections in the tool_conf.xml file' +
+                    ' [default: %default]'),
+    make_option('-q', '--num_scripts', type="int", default=160,
+                help='number of scripts to add to the tool_conf.xml file' +
+                    ' [default: %default]')
+]
+script_info['version'] = __version__
+
+def make_synthetic_tool_conf(num_tools, num_sections):
+    """Returns the contents of a tool_conf.xml file with the given size"""
+    lines = ['<?xml version="1.0" ?>', '<toolbox>']
+    tools_per_section = max(num_tools // num_sections, 1)
+    for i in range(num_sections):
+        lines.append('\t<section id="section%d" name="Section %d">' % (i, i))
+        for j in range(tools_per_section):
+            lines.append('\t\t<tool file="section%d/tool%d.xml"/>' % (i, j))
+        lines.append('\t</section>')
+    lines.append('</toolbox>')
+    return '\n'.join(lines)
+
+def make_section_dict(num_scripts, num_sections):
+    """Returns a section dict in which half of the scripts already exist"""
+    section_dict = {}
+    for i in range(num_scripts):
+        # Half of the scripts go to existing sections, the rest to new ones
+        section = "Section %d" % (i % num_sections if i % 2 else
+                                  num_sections + i % 10)
+        # Half of the scripts in existing sections are already there
+        name = "tool%d.py" % i if i % 4 == 1 else "new_script%d.py" % i
+        section_dict.setdefault(section, []).append(name)
+    return section_dict
+
+def legacy_update_tool_conf_xml(tool_conf, section_dict):
+    """Previous update_tool_conf_xml, which scans the DOM for each script"""
+    for section in section_dict.keys():
+        section_node = get_section_node(section, tool_conf)
+        if section_node:
+            for script in section_dict[section]:
+                if not exist_script_in_section(script, section_node):
+                    name, ext = path.splitext(script)
+                    filepath = section.replace(" ", "").lower()\
+                        + "/" + name + ".xml"
+                    tool_node = tool_conf.createElement('tool')
+                    tool_node.setAttribute("file", filepath)
+                    section_node.appendChild(tool_node)
+        else:
+            add_section_to_xml(section, section_dict[section], tool_conf)
+
+def time_update(function, tool_conf_str, section_dict):
+    """Returns the time of updating the tool_conf and the result"""
+    tool_conf = parseString(tool_conf_str)
+    start = time()
+    function(tool_conf, section_dict)
+    return time() - start, tool_conf.toxml()
+
+if __name__ == '__main__':
+    option_parser, opts, args = parse_command_line_parameters(**script_info)
+
+    tool_conf_str = make_synthetic_tool_conf(opts.num_tools,
+        opts.num_sections)
+    section_dict = make_section_dict(opts.num_scripts, opts.num_sections)
+
+    legacy_time, legacy_xml = time_update(legacy_update_tool_conf_xml,
+        tool_conf_str, section_dict)
+    indexed_time, indexed_xml = time_update(update_tool_conf_xml,
+        tool_conf_str, section_dict)
+
+    if legacy_xml != indexed_xml:
+        raise ValueError, "The indexed update generates a different tool_conf"
+
+    print "tool_conf.xml: %d tools in %d sections, %d scripts added" % (
+        opts.num_tools, opts.num_sections, opts.num_scripts)
+    print "Previous update: %.2f ms" % (legacy_time * 1000)
+    print "Indexed update: %.2f ms" % (indexed_time * 1000)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.option_parsing import (parse_command_line_parameters,
+                                        make_option)
+from time import time
+from xml.dom.minidom import Document
+from script_info_extractor import StaticOption
+from xml_generator import ScriptInfo, write_tool, generate_xml_string
+
+script_info = {}
+script_info['brief_description'] = "Compares the streaming XML writer against\
+ xml.dom.minidom"
+script_info['script_description'] = "Generates the XML of synthetic scripts\
+ with an increasing number of options using the streaming writer (pretty and\
+ compact forms) and a minidom Document serialized with toprettyxml."
+script_info['script_usage'] = [("Example:",
+"Benchmark scripts with 10, 100 and 1000 options",
+"%prog -s 10,100,1000")]
+script_info['output_description'] = "Prints a table with the timings through\
+ standard output"
+script_info['required_options'] = []
+script_info['optional_options'] = [
+    make_option('-s', '--sizes', type="string", default="10,50,100,500",
+                help='comma-separated list with the number of options of' +
+                    ' the synthetic scripts [default: %default]'),
+    make_option('-n', '--repeats', type="int", default=20,
+                help='number of times each XML is generated. The minimum' +
+                    ' time is reported [default: %default]')
+]
+script_info['version'] = __version__
+
+class MinidomWriter(object):
+    """Builds a xml.dom.minidom.Document through the XmlStreamWriter interface
+
+    It reproduces the previous XML generation, which allocated a DOM node for
+    each element and serialized the whole document with toprettyxml
+    """
+    def __init__(self):
+        self.doc = Document()
+        self._stack = [self.doc]
+
+    def start_document(self):
+        pass
+
+    def end_document(self):
+        pass
+
+    def start_element(self, name, attrs=None):
+        node = self.doc.createElement(name)
+        for attr_name, value in attrs or []:
+            node.setAttribute(attr_name, value)
+        self._stack[-1].appendChild(node)
+        self._stack.append(node)
+
+    def end_element(self, name):
+        self._stack.pop()
+
+    def text(self, data):
+        self._stack[-1].appendChild(self.doc.createTextNode(data))
+
+    def element(self, name, attrs=None, text=None):
+        self.start_element(name, attrs)
+        if text is not None:
+            self.text(text)
+        self.end_element(name)
+
+def make_synthetic_script_info(num_options):
+    """Returns a script_info dict with 'num_options' options of all types"""
+    option_kwargs = [
+        {'type': 'string', 'default': 'some_value'},
+        {'type': 'int', 'default': 10},
+        {'type': 'long', 'default': 10L},
+        {'type': 'float', 'default': 0.5},
+        {'type': 'choice', 'choices': ['choice%d' % i for i in range(10)]},
+        {'type': 'multiple_choice',
+         'mchoices': ['mchoice%d' % i for i in range(10)]},
+        {'type': 'existing_filepath'},
+        {'type': 'existing_filepaths'},
+        {'type': 'new_filepath'},
+        {'type': 'blast_db'},
+        {'action': 'store_true'}]
+
+    # Only one input and one output directory options are allowed. The
+    # existing_path and new_path types generate the same parameters as them
+    required = [
+        StaticOption('-i', '--input_dir', type='existing_dirpath',
+            help='The input directory'),
+        StaticOption('-o', '--output_dir', type='new_dirpath',
+            help='The output directory')]
+    optional = []
+    for i in range(num_options - len(required)):
+        kwargs = option_kwargs[i % len(option_kwargs)]
+        optional.append(StaticOption('--option_%d' % i,
+            help='Help of the option %d & its <value> [default: %%default]' % i,
+            **kwargs))
+
+    info = {}
+    info['brief_description'] = "A synthetic script"
+    info['script_description'] = "A synthetic script with %d options" % \
+                                    num_options
+    info['output_description'] = "Some output"
+    info['required_options'] = required
+    info['optional_options'] = optional
+    info['version'] = __version__
+    return info
+
+def min_time(function, repeats):
+    """Returns the minimum time of 'repeats' calls to function"""
+    times = []
+    for i in range(repeats):
+        start = time()
+        function()
+        times.append(time() - start)
+    return min(times)
+
+def minidom_xml_string(info):
+    """Generates the XML string of the script using minidom"""
+    writer = MinidomWriter()
+    write_tool(info, writer)
+    return writer.doc.toprettyxml(indent="\t")
+
+if __name__ == '__main__':
+    option_parser, opts, args = parse_command_line_parameters(**script_info)
+
+    sizes = map(int, opts.sizes.split(','))
+
+    print "%10s %14s %14s %14s" % ("options", "minidom (ms)", "stream (ms)",
+        "compact (ms)")
+    for size in sizes:
+        info = ScriptInfo(make_synthetic_script_info(size), 'synthetic_script',
+            'synthetic_script.py')
+
+        if minidom_xml_string(info) != generate_xml_string(info):
+            raise ValueError, "The streaming writer output differs from the" +\
+                                " minidom output for %d options" % size
+
+        minidom_time = min_time(lambda: minidom_xml_string(info),
+            opts.repeats)
+        stream_time = min_time(lambda: generate_xml_string(info),
+            opts.repeats)
+        compact_time = min_time(lambda: generate_xml_string(info, False),
+            opts.repeats)
+        print "%10d %14.2f %14.2f %14.2f" % (size, minidom_time * 1000,
+            stream_time * 1000, compact_time * 1000)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+# Writing of the files read by Galaxy. Galaxy watches the tools folder and
+# reloads the files as soon as they change, so they are never written in
+# place: a reader sees either the old file or the new one. Rewriting a file
+# with the same contents is skipped, so its mtime does not change and Galaxy
+# does not reload it.
+
+import os
+from hashlib import sha1
+from os import path, chmod, fdopen, fsync, rename, remove, stat
+from tempfile import mkstemp
+
+# Size of the chunks read when hashing a file
+CHUNK_SIZE = 64 * 1024
+
+def get_umask():
+    """Returns the current umask of the process
+
+    Note: the umask can only be read by setting it, so it is briefly 0 for
+        every thread of the process. Use UMASK in code that can run
+        concurrently with other threads
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# The umask of the process, read once when the module is imported
+UMASK = get_umask()
+
+def file_digest(fp):
+    """Returns the sha1 hex digest of the contents of the file fp"""
+    digest = sha1()
+    f = open(fp, 'rb')
+    chunk = f.read(CHUNK_SIZE)
+    while chunk:
+        digest.update(chunk)
+        chunk = f.read(CHUNK_SIZE)
+    f.close()
+    return digest.hexdigest()
+
+def atomic_write(fp, contents):
+    """Writes contents to the file fp atomically
+
+    Inputs:
+        fp: path to the file
+        contents: string with the new contents of the file
+
+    The contents are written to a temporary file in the same directory, which
+    is renamed to fp. If fp exists, its permissions are kept. Otherwise, the
+    file gets the permissions of a file created with open().
+    """
+    dir_path, name = path.split(path.abspath(fp))
+    fd, tmp_fp = mkstemp(dir=dir_path, prefix='.%s.' % name, suffix='.tmp')
+    try:
+        f = fdopen(fd, 'wb')
+        try:
+            f.write(contents)
+            f.flush()
+            fsync(f.fileno())
+        finally:
+            f.close()
+        if path.exists(fp):
+            chmod(tmp_fp, stat(fp).st_mode & 07777)
+        else:
+            chmod(tmp_fp, 0666 & ~UMASK)
+        rename(tmp_fp, fp)
+    except:
+        if path.exists(tmp_fp):
+            remove(tmp_fp)
+        raise
+
+def write_if_changed(fp, contents, dry_run=False):
+    """Writes contents to the file fp only if its current contents differ
+
+    Inputs:
+        fp: path to the file
+        contents: string with the new contents of the file. Unicode strings
+            are encoded as utf-8
+        dry_run: if True, the file is never written
+
+    Returns None if the file already has the given contents, "new" if the
+    file does not exist or "modified" otherwise. The contents are compared
+    by their size and their sha1 digest, and written with atomic_write.
+    """
+    if isinstance(contents, unicode):
+        contents = contents.encode('utf-8')
+
+    if not path.exists(fp):
+        status = "new"
+    elif stat(fp).st_size == len(contents) and \
+            file_digest(fp) == sha1(contents).hexdigest():
+        return None
+    else:
+        status = "modified"
+
+    if not dry_run:
+        atomic_write(fp, contents)
+    return status
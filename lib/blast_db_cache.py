@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+import errno
+import fcntl
+import os
+from hashlib import sha1
+from os import (path, listdir, makedirs, rename, stat, utime, walk, chmod,
+    remove, fstat)
+from shutil import rmtree
+from tempfile import mkdtemp, NamedTemporaryFile
+from time import sleep
+from format_blast_db_string import format_blast_db_string
+from tgz_manager import extract_from_tgz, sniff_archive_format, ERROR_MSG
+
+# Name of the lock file used to serialize the cache eviction
+LOCK_FILENAME = '.lock'
+# Folder of the cache where the content keys of the known files are stored
+KEYS_DIRNAME = '.keys'
+# Name of the extracted database and its size file inside each cache entry
+DB_NAME = 'db'
+SIZE_FILENAME = 'size'
+# Name of the file of each cache entry locked in shared mode by the jobs
+# using the entry. The entries locked by a job are not evicted
+IN_USE_FILENAME = 'in_use'
+# Seconds between the checks of the process holding an entry (see
+# hold_while_alive)
+HOLD_POLL_INTERVAL = 5
+# Size of the chunks read to compute the content key
+READ_CHUNK_SIZE = 1024 * 1024
+
+def _is_alive(pid):
+    """Returns True if the process pid is running"""
+    try:
+        os.kill(pid, 0)
+    except OSError, e:
+        return e.errno == errno.EPERM
+    return True
+
+def hold_while_alive(lock_file, pid, interval=HOLD_POLL_INTERVAL):
+    """Keeps lock_file open in a background process until the process pid
+    exits
+
+    Inputs:
+        lock_file: the open file holding a shared lock on a cache entry (see
+            BlastDbCache.open_db)
+        pid: id of the process using the entry, e.g. the shell of the job
+        interval: seconds between the checks of the process pid
+
+    The flock is held by the open file, so the entry stays locked while the
+    background process runs, after the current process exits. The
+    background process does not keep the standard streams of the current
+    process open.
+    """
+    if os.fork() == 0:
+        try:
+            os.setsid()
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in [0, 1, 2]:
+                os.dup2(devnull, fd)
+            while _is_alive(pid):
+                sleep(interval)
+        finally:
+            os._exit(0)
+    lock_file.close()
+
+def _get_tree_size(in_path):
+    """Returns the size in bytes of a file or a directory tree"""
+    if not path.isdir(in_path):
+        return path.getsize(in_path)
+    size = 0
+    for root, dirs, files in walk(in_path):
+        for name in files:
+            size += path.getsize(path.join(root, name))
+    return size
+
+class BlastDbCache(object):
+    """Class modeling an on-disk cache of extracted blast databases
+
+    Each database tgz file is extracted once in a cache entry keyed by the
+    hash of its contents, so the jobs using the same database share its
+    extraction. The entries are populated in a temporary directory that is
+    renamed into place, so concurrent jobs never see a partial database.
+    """
+    def __init__(self, cache_dir, max_size=None):
+        """Creates the BlastDbCache object
+
+        Input:
+            cache_dir: path to the cache directory. It is created if it does
+                not exist
+            max_size: maximum size in bytes of the cached databases. When it
+                is exceeded, the least recently used entries are evicted. If
+                None, the entries are never evicted
+        """
+        self.cache_dir = path.abspath(cache_dir)
+        self.max_size = max_size
+        self._keys_dir = path.join(self.cache_dir, KEYS_DIRNAME)
+        for dirpath in [self.cache_dir, self._keys_dir]:
+            if not path.exists(dirpath):
+                try:
+                    makedirs(dirpath)
+                except OSError:
+                    # Created by a concurrent job
+                    if not path.isdir(dirpath):
+                        raise
+
+    def _write_atomically(self, fp, data):
+        """Writes data to fp through a temporary file renamed into place"""
+        f = NamedTemporaryFile(dir=self.cache_dir, delete=False)
+        f.write(data)
+        f.close()
+        # The files are shared by the jobs of all the users
+        chmod(f.name, 0644)
+        rename(f.name, fp)
+
+    def get_content_key(self, fp):
+        """Returns the hash of the contents of the file fp
+
+        The key of each file is stored by its inode, size and modification
+        time, so the contents of the file are only read the first time. The
+        full precision of the modification time is used, so a file updated
+        twice in the same second is hashed again.
+        """
+        st = stat(fp)
+        stat_fp = path.join(self._keys_dir, "%d_%d_%d_%s" % (st.st_dev,
+            st.st_ino, st.st_size, repr(st.st_mtime)))
+        if path.exists(stat_fp):
+            f = open(stat_fp, 'U')
+            key = f.read().strip()
+            f.close()
+            return key
+
+        key = sha1()
+        f = open(fp, 'rb')
+        chunk = f.read(READ_CHUNK_SIZE)
+        while chunk:
+            key.update(chunk)
+            chunk = f.read(READ_CHUNK_SIZE)
+        f.close()
+        key = key.hexdigest()
+        self._write_atomically(stat_fp, key)
+        return key
+
+    def _populate(self, tgz_fp, entry_dir):
+        """Extracts tgz_fp in the cache entry entry_dir
+
+        Note: propagates the errors from 'extract_from_tgz'
+        """
+        tmp_dir = mkdtemp(dir=self.cache_dir, prefix='.tmp')
+        try:
+            # The entry is shared by the jobs of all the users
+            chmod(tmp_dir, 0755)
+            extract_from_tgz(tgz_fp, path.join(tmp_dir, DB_NAME))
+            open(path.join(tmp_dir, IN_USE_FILENAME), 'w').close()
+            chmod(path.join(tmp_dir, IN_USE_FILENAME), 0644)
+            f = open(path.join(tmp_dir, SIZE_FILENAME), 'w')
+            f.write(str(_get_tree_size(path.join(tmp_dir, DB_NAME))))
+            f.close()
+            try:
+                rename(tmp_dir, entry_dir)
+            except OSError:
+                # A concurrent job populated the entry first
+                if not path.exists(entry_dir):
+                    raise
+        finally:
+            if path.exists(tmp_dir):
+                rmtree(tmp_dir)
+
+    def _lock_entry(self, entry_dir):
+        """Returns the in-use file of the entry locked in shared mode
+
+        Returns None if the entry does not exist or it was evicted while
+        waiting for the lock
+        """
+        lock_fp = path.join(entry_dir, IN_USE_FILENAME)
+        try:
+            lock_file = open(lock_fp, 'r')
+        except IOError:
+            return None
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        try:
+            if stat(lock_fp).st_ino == fstat(lock_file.fileno()).st_ino:
+                return lock_file
+        except OSError:
+            pass
+        lock_file.close()
+        return None
+
+    def open_db(self, tgz_fp):
+        """Returns the blast database base path of the database in tgz_fp and
+        the file holding its cache entry
+
+        Input:
+            tgz_fp: path to the tgz file with the blast database, to a blast
+                database directory or to a fasta file with the reference
+                sequences
+
+        Returns a tuple of (db_path, lock_file). The cache entry of the
+        database is not evicted while lock_file is open (see
+        hold_while_alive). If tgz_fp is not a tgz file, it is not cached,
+        lock_file is None and the base path of tgz_fp is returned (see
+        format_blast_db_string)
+
+        Note: propagates the errors from 'extract_from_tgz'
+        """
+        if path.isdir(tgz_fp) or sniff_archive_format(tgz_fp) is None:
+            return format_blast_db_string(tgz_fp), None
+
+        try:
+            key = self.get_content_key(tgz_fp)
+            entry_dir = path.join(self.cache_dir, key)
+            lock_file = self._lock_entry(entry_dir)
+            populated = False
+            while lock_file is None:
+                # The entry does not exist or it was just evicted
+                self._populate(tgz_fp, entry_dir)
+                populated = True
+                lock_file = self._lock_entry(entry_dir)
+            if populated:
+                # The new entry is held, so it is not evicted
+                self.evict()
+            # Mark the entry as recently used
+            utime(entry_dir, None)
+        except ValueError, e:
+            if str(e) == ERROR_MSG:
+                return format_blast_db_string(tgz_fp), None
+            raise
+        try:
+            return format_blast_db_string(path.join(entry_dir, DB_NAME)), \
+                lock_file
+        except:
+            lock_file.close()
+            raise
+
+    def get_db_path(self, tgz_fp):
+        """Returns the blast database base path of the database in tgz_fp
+
+        Input:
+            tgz_fp: see open_db
+
+        The cache entry is not held, so it can be evicted once the path is
+        returned. Use open_db to hold it while the database is used.
+
+        Note: propagates the errors from 'extract_from_tgz'
+        """
+        db_path, lock_file = self.open_db(tgz_fp)
+        if lock_file is not None:
+            lock_file.close()
+        return db_path
+
+    def get_entries(self):
+        """Returns a list of (last_used, size, key) tuples of the entries"""
+        entries = []
+        for key in listdir(self.cache_dir):
+            entry_dir = path.join(self.cache_dir, key)
+            if key.startswith('.') or not path.isdir(entry_dir):
+                continue
+            try:
+                f = open(path.join(entry_dir, SIZE_FILENAME), 'U')
+                size = int(f.read())
+                f.close()
+                last_used = path.getmtime(entry_dir)
+            except (IOError, OSError, ValueError):
+                # Entry evicted by a concurrent job
+                continue
+            entries.append((last_used, size, key))
+        return entries
+
+    def _evict_keys(self):
+        """Removes the content keys that point to no cache entry"""
+        live_keys = set([key for last_used, size, key in self.get_entries()])
+        for name in listdir(self._keys_dir):
+            stat_fp = path.join(self._keys_dir, name)
+            try:
+                f = open(stat_fp, 'U')
+                key = f.read().strip()
+                f.close()
+                if key not in live_keys:
+                    remove(stat_fp)
+            except (IOError, OSError):
+                # Removed by a concurrent job
+                continue
+
+    def _evict_entry(self, key):
+        """Removes the cache entry 'key' if no job holds it
+
+        Returns True if the entry was removed
+        """
+        entry_dir = path.join(self.cache_dir, key)
+        try:
+            lock_file = open(path.join(entry_dir, IN_USE_FILENAME), 'r')
+        except IOError:
+            return False
+        try:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                # The entry is in use
+                return False
+            # Rename the entry first, so no job finds it half removed
+            trash_dir = mkdtemp(dir=self.cache_dir, prefix='.trash')
+            rename(entry_dir, path.join(trash_dir, key))
+            rmtree(trash_dir)
+            return True
+        finally:
+            lock_file.close()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in
+        max_size
+
+        The entries held by a job (see open_db) are never evicted, so the
+        cache may be bigger than max_size. The content keys of the files
+        whose entry is not in the cache are also removed. The eviction is
+        serialized among the jobs sharing the cache with a file lock.
+        """
+        if self.max_size is None:
+            return
+
+        lock_file = open(path.join(self.cache_dir, LOCK_FILENAME), 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            entries = sorted(self.get_entries())
+            total_size = sum([size for last_used, size, key in entries])
+            for last_used, size, key in entries:
+                if total_size <= self.max_size:
+                    break
+                if self._evict_entry(key):
+                    total_size -= size
+            self._evict_keys()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
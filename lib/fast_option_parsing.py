@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+# Command line parsing for the Galaxy-QIIME helper scripts. It provides the
+# make_option and parse_command_line_parameters interface of
+# cogent.util.option_parsing on top of optparse, for the option types used by
+# the helper scripts. They run in each Galaxy job, so they do not pay the
+# import of cogent to parse a couple of options. As their script_info is still
+# built with make_option calls, their XML can be generated as before.
+
+from copy import copy
+from optparse import Option, OptionParser, OptionValueError
+from os.path import exists, isdir, isfile
+
+def _check_existing_path(option, opt, value):
+    """Checks that the path given to the option exists"""
+    if not exists(value):
+        raise OptionValueError("Option %s: path does not exist: %r"
+            % (opt, value))
+    return value
+
+def _check_existing_filepath(option, opt, value):
+    """Checks that the path given to the option is an existing file"""
+    if not isfile(value):
+        raise OptionValueError("Option %s: file does not exist: %r"
+            % (opt, value))
+    return value
+
+def _check_existing_dirpath(option, opt, value):
+    """Checks that the path given to the option is an existing directory"""
+    if not isdir(value):
+        raise OptionValueError("Option %s: directory does not exist: %r"
+            % (opt, value))
+    return value
+
+def _check_new_path(option, opt, value):
+    """The new paths are not checked"""
+    return value
+
+class FastOption(Option):
+    """optparse.Option with the path types of the helper scripts"""
+    TYPES = Option.TYPES + ('existing_path', 'existing_filepath',
+        'existing_dirpath', 'new_path', 'new_filepath', 'new_dirpath')
+    TYPE_CHECKER = copy(Option.TYPE_CHECKER)
+    TYPE_CHECKER['existing_path'] = _check_existing_path
+    TYPE_CHECKER['existing_filepath'] = _check_existing_filepath
+    TYPE_CHECKER['existing_dirpath'] = _check_existing_dirpath
+    TYPE_CHECKER['new_path'] = _check_new_path
+    TYPE_CHECKER['new_filepath'] = _check_new_path
+    TYPE_CHECKER['new_dirpath'] = _check_new_path
+
+make_option = FastOption
+
+def _build_usage(script_info):
+    """Returns the usage string of the script from its script_info"""
+    lines = ["%prog [options] " + ' '.join(['{%s}' % opt.get_opt_string()
+        for opt in script_info['required_options']]), "",
+        "[] indicates optional input (order unimportant)",
+        "{} indicates required input (order unimportant)", "",
+        script_info['script_description'], "", "Example usage: ",
+        "Print help message and exit", " %prog -h", ""]
+    for title, description, command in script_info['script_usage']:
+        lines.extend([title, description, " " + command, ""])
+    return '\n'.join(lines)
+
+def parse_command_line_parameters(**script_info):
+    """Parses the command line of a script described by its script_info
+
+    Input:
+        script_info: the script_info dict of the script, as used by
+            cogent.util.option_parsing.parse_command_line_parameters
+
+    Returns a tuple of (option_parser, opts, args). If a required option is
+    not provided or positional arguments are given, it prints the error and
+    exits, as cogent does.
+    """
+    required_options = script_info.get('required_options', [])
+    optional_options = script_info.get('optional_options', [])
+
+    option_parser = OptionParser(usage=_build_usage(script_info),
+        version=script_info.get('version'), option_class=FastOption)
+
+    required = option_parser.add_option_group("REQUIRED options",
+        "The following options must be provided under all circumstances.")
+    for option in required_options:
+        required.add_option(option)
+    for option in optional_options:
+        option_parser.add_option(option)
+
+    opts, args = option_parser.parse_args()
+
+    for option in required_options:
+        if getattr(opts, option.dest) is None:
+            option_parser.error("Required option %s omitted." %
+                option.get_opt_string())
+    if args:
+        option_parser.error("Positional argument detected: %s\n" %
+            str(args[0]) + " Be sure all parameters are identified by" +
+            " their option name.\n (e.g.: include the '-i' in '-i INPUT_DIR')")
+
+    return option_parser, opts, args
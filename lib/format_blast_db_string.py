@@ -9,8 +9,143 @@ __maintainer__ = "Jose Antonio Navas Molina"
 __email__ = "josenavasmolina@gmail.com"
 __status__ = "Development"
 
-from os.path import isdir, splitext, join
-from os import listdir
+import re
+from collections import OrderedDict
+from os.path import isdir, join, exists, dirname
+from os import listdir, stat
+from threading import Lock
+
+# Files that must be present for each volume of a blast database, and the
+# alias file listing the volumes of a multi-volume database, by sequence type
+REQUIRED_EXTENSIONS = {'protein': ['.pin', '.phr', '.psq'],
+                       'nucleotide': ['.nin', '.nhr', '.nsq']}
+ALIAS_EXTENSIONS = {'protein': '.pal',
+                    'nucleotide': '.nal'}
+
+# Suffix of the volumes of a multi-volume database (e.g. 'refseqs.00')
+VOLUME_RE = re.compile(r'\.\d{2,}$')
+
+# Maximum number of directories kept in the memo of resolved directories
+MAX_RESOLVED_DIRS = 256
+
+# Files of a database whose changes can change the database found in its
+# directory: its alias files, which can be edited in place, and its indexes
+STAMPED_EXTENSIONS = ['.pal', '.nal', '.pin', '.nin']
+
+# Memo of the resolved directories, in least recently used order: {path:
+# (stamp, base path)} (see _get_stamp). It is shared by the threads of the
+# helper daemon
+_resolved_dirs = OrderedDict()
+_resolved_dirs_lock = Lock()
+
+def _parse_alias_file(alias_fp):
+    """Returns the list of volumes in the DBLIST line of a blast alias file"""
+    volumes = []
+    f = open(alias_fp, 'U')
+    for line in f:
+        fields = line.split()
+        if fields and fields[0] == 'DBLIST':
+            volumes.extend([v.strip('"') for v in fields[1:]])
+    f.close()
+    return volumes
+
+def _is_complete_volume(in_path, names, base, seq_type):
+    """Returns True if all the files of the volume 'base' are present
+
+    Inputs:
+        in_path: path to the database directory
+        names: set with the names of the files in in_path
+        base: base name of the volume. It can be a path relative to in_path
+        seq_type: 'protein' or 'nucleotide'
+
+    A volume can also be another alias file
+    """
+    if '/' in base:
+        # The volume is not in the database directory
+        base_fp = join(in_path, base)
+        return exists(base_fp + ALIAS_EXTENSIONS[seq_type]) or \
+            all([exists(base_fp + ext)
+                for ext in REQUIRED_EXTENSIONS[seq_type]])
+    return base + ALIAS_EXTENSIONS[seq_type] in names or \
+        all([base + ext in names for ext in REQUIRED_EXTENSIONS[seq_type]])
+
+def _find_blast_dbs(in_path, names):
+    """Returns a sorted list with the base names of the databases in in_path
+
+    Inputs:
+        in_path: path to the database directory
+        names: set with the names of the files in in_path
+
+    A database is an alias file whose volumes are all complete or a complete
+    volume not listed in any alias file. Incomplete databases, the volumes of
+    incomplete multi-volume databases and stray files are ignored.
+    """
+    dbs = set()
+    volumes = set()
+    for seq_type, alias_ext in ALIAS_EXTENSIONS.items():
+        for name in names:
+            if name.endswith(alias_ext):
+                base = name[:-len(alias_ext)]
+                db_volumes = _parse_alias_file(join(in_path, name))
+                if db_volumes and all([_is_complete_volume(in_path, names, v,
+                        seq_type) for v in db_volumes]):
+                    dbs.add(base)
+                volumes.update(db_volumes)
+
+    for seq_type, extensions in REQUIRED_EXTENSIONS.items():
+        index_ext = extensions[0]
+        for name in names:
+            if name.endswith(index_ext):
+                base = name[:-len(index_ext)]
+                if base in volumes:
+                    continue
+                if VOLUME_RE.search(base) and \
+                        VOLUME_RE.sub('', base) + ALIAS_EXTENSIONS[seq_type] \
+                        in names:
+                    continue
+                if _is_complete_volume(in_path, names, base, seq_type):
+                    dbs.add(base)
+    return sorted(dbs)
+
+def _resolve_blast_db_dir(in_path):
+    """Returns the blast database base path of the directory in_path
+
+    Note: raises a ValueError if there is no blast database in in_path or
+        there is more than one
+    """
+    names = listdir(in_path)
+    dbs = _find_blast_dbs(in_path, set(names))
+
+    if len(dbs) == 1:
+        return join(in_path, dbs[0])
+    if len(dbs) > 1:
+        raise ValueError, "Multiple blast databases found in %s: %s" % \
+                            (in_path, ', '.join(dbs))
+
+    if len(names) == 1:
+        # The directory is a wrapper around the database directory or the
+        # fasta file, as generated when compressing a directory
+        return format_blast_db_string(join(in_path, names[0]))
+
+    raise ValueError, "No blast database found in %s" % in_path
+
+def _get_stamp(in_path, db_path):
+    """Returns the stamp of the directory in_path resolved to db_path
+
+    The stamp is a tuple with the (device, inode, mtime) of in_path, of the
+    directory of db_path and of the files of the database with the
+    STAMPED_EXTENSIONS, or None for the files that don't exist
+    """
+    stamp = []
+    for fp in [in_path, dirname(db_path), db_path] + \
+            [db_path + ext for ext in STAMPED_EXTENSIONS]:
+        try:
+            st = stat(fp)
+        except OSError:
+            stamp.append(None)
+        else:
+            stamp.append((st.st_dev, st.st_ino, st.st_mtime))
+    return tuple(stamp)
 
 def format_blast_db_string(in_path):
     """Generate a string with the path to the blast database
@@ -18,15 +153,35 @@ def format_blast_db_string(in_path):
     Input:
         in_path: the path to the blast database base directory or to a fasta
             file with the reference sequences to create the DB on-the-fly
+
+    The database is identified by its alias file (.pal/.nal) if it has
+    multiple volumes, or by its index, header and sequence files otherwise.
+    All the files of the database must be present, while any other file of
+    the directory is ignored. The base path of the last MAX_RESOLVED_DIRS
+    directories is memoized, so a directory is only listed again if the
+    inode or the modification time of the directory, or of the alias or
+    index files of its database, change.
+
+    Note: raises a ValueError if in_path is a directory without a blast
+        database, or with more than one
     """
     if isdir(in_path):
         # The path is the base directory of a blast database
-        # Get one file of the directory
-        f = listdir(in_path)[0]
-        f = join(in_path, f)
-        # Get the base path of the file
-        basepath, ext = splitext(f)
-        return basepath
+        with _resolved_dirs_lock:
+            memo = _resolved_dirs.pop(in_path, None)
+        if memo is not None and memo[0] == _get_stamp(in_path, memo[1]):
+            with _resolved_dirs_lock:
+                # Mark it as the most recently used
+                _resolved_dirs[in_path] = memo
+            return memo[1]
+        # The lock is not held, as a wrapper directory is resolved recursively
+        db_path = _resolve_blast_db_dir(in_path)
+        stamp = _get_stamp(in_path, db_path)
+        with _resolved_dirs_lock:
+            _resolved_dirs[in_path] = (stamp, db_path)
+            while len(_resolved_dirs) > MAX_RESOLVED_DIRS:
+                _resolved_dirs.popitem(last=False)
+        return db_path
     else:
         # The path is a fasta file
-        return in_path
\ No newline at end of file
+        return in_path
@@ -9,11 +9,26 @@ __maintainer__ = "Jose Antonio Navas Molina"
 __email__ = "josenavasmolina@gmail.com"
 __status__ = "Development"
 
-from os import path, mkdir, walk, remove
+import re
+from collections import namedtuple
+from os import path, mkdir, walk
 from shutil import copyfile
 from site import addsitedir
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from time import time
+from StringIO import StringIO
 from xml.dom.minidom import parse, Document
-from xml_generator import make_xml
+from xml.parsers.expat import ExpatError
+from atomic_write import write_if_changed
+from integration_config import (IntegrationConfig, load_config,
+    parse_config_lines)
+from xml_generator import load_script_info, generate_xml_string
+from integration_log import IntegrationLog, get_peak_rss
+from import_sandbox import ImportSandbox, DEFAULT_TIMEOUT, DEFAULT_MEMORY_LIMIT
+from integration_cache import (IntegrationCache, compute_script_key,
+    compute_snapshot_key, CACHE_FILENAME)
+from script_info_snapshot import ScriptInfoSnapshot, load_snapshot
 
 def parse_config_file(lines):
     """Parser for the Galaxy-QIIME configuration file
@@ -23,38 +38,23 @@ def parse_config_file(lines):
         sections: list with all sections
 
     Note: raises a ValueError if the format of the configuration file is not
-        correct
+        correct (see integration_config.parse_config_lines)
     """
-    result = {}
-    sections = []
-
-    current_section = None
-
-    for line in lines:
-        if line and line != "\n":
-            if line.startswith('#'):
-                continue
-            elif line.startswith('\t'):
-                current_section = line.split('\t')[1].replace('\n', '')
-                sections.append(current_section)
-            else:
-                if current_section is None:
-                    raise ValueError, 'Bad configuration file'
-                fields = line.split()
-                try:
-                    result[fields[0]] = (current_section, fields[1])
-                except IndexError:
-                    result[fields[0]] = (current_section, None)
-
-    return result, sections
+    config = parse_config_lines(lines)
+    result = dict([(name, (config[name].section,
+        config[name].get_remove_opts_string())) for name in config])
+    return result, list(config.sections)
 
-def create_dirs(galaxy_dir, sections):
+def create_dirs(galaxy_dir, sections, dry_run=False):
     """Create directories in the galaxy tool folder for all the QIIME sections
 
     Inputs:
         galaxy_dir: the full path to the Galaxy installation directory
         sections: a list with the different sections in which the QIIME scripts
             will be grouped by
+        dry_run: if True, the directories are not created
+
+    Returns the list of the directories that did not exist.
 
     Note: raises a ValueError if the galaxy_dir path doesn't follow the
         directory structure of a Galaxy installation directory
@@ -64,11 +64,71 @@ def create_dirs(galaxy_dir, sections):
     if not path.exists(tools_dir):
         raise ValueError, 'Wrong galaxy installation path'
 
+    new_dirs = []
     for sect in sections:
         sect = sect.replace(" ", "").lower()
         dir_path = path.join(tools_dir, sect)
-        if not path.exists(dir_path):
-            mkdir(dir_path)
+        if not path.exists(dir_path) and dir_path not in new_dirs:
+            new_dirs.append(dir_path)
+            if not dry_run:
+                mkdir(dir_path)
+    return new_dirs
+
+def remove_whitespace_nodes(node):
+    """Removes the whitespace-only text nodes under the given DOM node"""
+    for child in list(node.childNodes):
+        if child.nodeType == child.TEXT_NODE and not child.data.strip():
+            node.removeChild(child)
+        else:
+            remove_whitespace_nodes(child)
+
+# Maximum number of threads checking the configured scripts. The checks are
+# I/O bound, so they overlap well on network filesystems
+DISCOVERY_THREADS = 16
+
+def find_configured_scripts(scripts_dir, script_names):
+    """Looks for the configured scripts in the scripts directory
+
+    Inputs:
+        scripts_dir: path to the directory containing the scripts
+        script_names: list with the names of the configured scripts
+
+    Returns:
+        found: list of (script name, script path) tuples of the scripts
+            present in scripts_dir, in the order of script_names
+        missing: list with the names of the scripts not present
+
+    Only the configured scripts are checked, in parallel, so the rest of the
+    files of the directory are never listed.
+    """
+    script_fps = [path.join(scripts_dir, name) for name in script_names]
+    if not script_fps:
+        return [], []
+    pool = ThreadPool(min(DISCOVERY_THREADS, len(script_fps)))
+    try:
+        present = pool.map(path.isfile, script_fps)
+    finally:
+        pool.close()
+        pool.join()
+
+    found = []
+    missing = []
+    for name, script_fp, is_file in zip(script_names, script_fps, present):
+        if is_file:
+            found.append((name, script_fp))
+        else:
+            missing.append(name)
+    return found, missing
+
+def walk_scripts_dir(scripts_dir):
+    """Returns the (script name, script path) tuples of the python files
+    under scripts_dir, in walk order"""
+    scripts = []
+    for root, dirs, files in walk(scripts_dir):
+        for name in files:
+            if name.endswith('.py'):
+                scripts.append((name, path.join(root, name)))
+    return scripts
 
 def get_galaxy_tool_conf_file(galaxy_dir, update):
     """Generates the contents of the Galaxy's tool_conf.xml file
@@ -83,6 +143,9 @@ def get_galaxy_tool_conf_file(galaxy_dir, update):
     in the Galaxy installation folder and updates it. Otherwise, it generates
     a new tool_conf.xml file from scratch.
 
+    The whitespace between the elements of the current file is dropped, so
+    writing it back with toprettyxml does not change an unmodified file.
+
     Note: raises a ValueError if the galaxy_dir path doesn't follow the
         directory structure of a Galaxy installation directory
     """
@@ -92,7 +155,9 @@ def get_galaxy_tool_conf_file(galaxy_dir, update):
         raise ValueError, 'Wrong galaxy installation path'
 
     if update:
-        return parse(tool_conf_fp)
+        tool_conf = parse(tool_conf_fp)
+        remove_whitespace_nodes(tool_conf)
+        return tool_conf
     else:
         tool_conf = Document()
 
@@ -172,6 +237,47 @@ def add_section_to_xml(section, script_list, xml):
         section_node.appendChild(tool_node)
 
 
+def index_tool_conf(tool_conf):
+    """Indexes the sections and the tools of the tool_conf XML document
+
+    Input:
+        tool_conf: the xml.dom.minidom.Document object to be indexed
+
+    Returns:
+        section_nodes: a dict of {section name: section DOM Element}
+        section_files: a dict of {section name: set of tool file paths}
+
+    The document is traversed only once. If several sections share the same
+    name, the first one is indexed, as get_section_node does.
+    """
+    section_nodes = {}
+    section_files = {}
+
+    for node in tool_conf.getElementsByTagName('section'):
+        section = node.getAttribute('name')
+        if section in section_nodes:
+            continue
+        section_nodes[section] = node
+        section_files[section] = set([child.getAttribute('file')
+            for child in node.childNodes
+            if child.nodeType == child.ELEMENT_NODE and
+                child.hasAttribute('file')])
+
+    return section_nodes, section_files
+
+def get_tool_conf_entries(tool_conf):
+    """Returns the set of (section name, tool file) entries of the tool_conf
+
+    Input:
+        tool_conf: the xml.dom.minidom.Document object of the tool_conf.xml
+            file, or None if it does not exist or it is not valid
+    """
+    if tool_conf is None:
+        return set()
+    section_nodes, section_files = index_tool_conf(tool_conf)
+    return set([(section, fp) for section, files in section_files.items()
+        for fp in files])
+
 def update_tool_conf_xml(tool_conf, section_dict):
     """Updates the tool_conf xml file with the specified sections
 
@@ -183,117 +289,532 @@ def update_tool_conf_xml(tool_conf, section_dict):
     It modifies the tool_conf xml.dom.minidom.Document in order to contain also
     the information of section_dict
     """
+    section_nodes, section_files = index_tool_conf(tool_conf)
+
     for section in section_dict.keys():
-        section_node = get_section_node(section, tool_conf)
-        if section_node:
+        section_node = section_nodes.get(section)
+        if section_node is not None:
+            files = section_files[section]
             for script in section_dict[section]:
-                if not exist_script_in_section(script, section_node):
-                    name, ext = path.splitext(script)
-                    filepath = section.replace(" ", "").lower()\
-                        + "/" + name + ".xml"
+                name, ext = path.splitext(script)
+                filepath = section.replace(" ", "").lower()\
+                    + "/" + name + ".xml"
+                if filepath not in files:
                     tool_node = tool_conf.createElement('tool')
                     tool_node.setAttribute("file", filepath)
                     section_node.appendChild(tool_node)
+                    files.add(filepath)
         else:
             add_section_to_xml(section, section_dict[section], tool_conf)
 
-def create_activate_file(galaxy_dir):
+def create_activate_file(galaxy_dir, dry_run=False):
     """Generates the activate.sh file in the Galaxy installation folder
 
     Input:
         galaxy_dir: the full path to the Galaxy installation directory
+        dry_run: if True, the file is not written
 
     The activate.sh contains the environment variables definitions needed
-    for running QIIME within the Galaxy environment
+    for running QIIME within the Galaxy environment. It is only written if
+    its contents changed, saving the previous one as activate.sh.bak.
+
+    Returns the change of the activate.sh file (see
+    atomic_write.write_if_changed)
     """
     activate_fp = path.join(galaxy_dir, 'activate.sh')
-    if path.exists(activate_fp):
-        activate_bak_fp = path.join(galaxy_dir, 'activate.sh.bak')
-        copyfile(activate_fp, activate_bak_fp)
-        remove(activate_fp)
-    f = open(activate_fp, 'w')
-    f.write("export GALAXY_HOME=%s\n" % galaxy_dir)
-    f.close()
+    contents = "export GALAXY_HOME=%s\n" % galaxy_dir
+    status = write_if_changed(activate_fp, contents, dry_run=True)
+    if status is not None and not dry_run:
+        if status == "modified":
+            activate_bak_fp = path.join(galaxy_dir, 'activate.sh.bak')
+            copyfile(activate_fp, activate_bak_fp)
+        write_if_changed(activate_fp, contents)
+    return status
+
+def format_integration_diff(diff, galaxy_dir):
+    """Returns the integration diff as a list of human readable lines
+
+    Inputs:
+        diff: the dict returned by integrate
+        galaxy_dir: the full path to the Galaxy installation directory, which
+            the paths are shown relative to
+
+    Each created directory or file is prefixed by "A", each modified file by
+    "M" and each added or removed tool_conf.xml entry by "+" or "-"
+    """
+    lines = []
+    for status, prefix in [('new', 'A'), ('modified', 'M')]:
+        for fp in diff[status]:
+            lines.append("%s %s" % (prefix, path.relpath(fp, galaxy_dir)))
+    for key, prefix in [('tool_conf_added', '+'), ('tool_conf_removed', '-')]:
+        for section, fp in diff[key]:
+            lines.append("%s %s: %s" % (prefix, section, fp))
+    return lines
+
+# Release name at the end of the name of a configuration file, e.g. 1.9.0 in
+# QIIME_1.9.0.conf
+RELEASE_NAME_RE = re.compile(r'\d[\w.-]*$')
+
+class Release(namedtuple('Release', ['name', 'scripts_dir', 'config',
+        'snapshot'])):
+    """A release of the scripts to integrate
+
+    name: the release name, used to version the tool ids and the sections,
+        or None to integrate the scripts without versioning them
+    scripts_dir: path to the directory containing the scripts, or None if
+        they are read from the snapshot
+    config: path to the Galaxy-QIIME configuration file of the release, or
+        an already loaded integration_config.IntegrationConfig object
+    snapshot: path to the script_info snapshot of the release, an already
+        loaded script_info_snapshot.ScriptInfoSnapshot object, or None
+    """
+    __slots__ = ()
+
+def get_release_name(config_fp):
+    """Returns the release name of a configuration file
+
+    It is the version at the end of the file name (e.g. '1.9.0' for
+    QIIME_1.9.0.conf) or, if there is none, the file name without extension
+    """
+    name = path.splitext(path.basename(config_fp))[0]
+    match = RELEASE_NAME_RE.search(name)
+    return match.group() if match else name
+
+def get_versioned_tool_id(script_name, release):
+    """Returns the Galaxy tool id of the script in the given release
+
+    The id is the script name without extension, followed by the release
+    name with its non alphanumeric characters replaced by underscores. If
+    release is None, the id is not versioned.
+    """
+    tool_id = path.splitext(script_name)[0]
+    if release is None:
+        return tool_id
+    return "%s_%s" % (tool_id, re.sub(r'\W', '_', release))
+
+def get_versioned_section(section, release):
+    """Returns the name of the section in the given release
+
+    The release name is appended to the section name, unless it already
+    ends with it (e.g. 'QIIME 1.9.0') or release is None.
+    """
+    if release is None or section.endswith(release):
+        return section
+    return "%s %s" % (section, release)
+
+def _generate_script_xml(task):
+    """Generates the XML strings of a single script
+
+    Input:
+        task: tuple of (script_fp, remove_opts, link_inputs,
+            blast_db_cache_dir, sandbox, snapshot, tools), where tools is a
+            list of (tool id, release name) tuples
+
+    Returns a tuple of (xml_strings, status, timings). The script is loaded
+    once and xml_strings is a dict with its XML string for each of the
+    Galaxy tool ids in tools, requiring the QIIME version of its release. If the XML generation fails, xml_strings is
+    None and status contains the error. Otherwise, status is "Ok". timings
+    is a dict with the seconds spent importing the script ('import') and
+    generating its XML strings ('xml'), and the increase of the peak RSS of
+    the process, in KB ('rss_delta'). If the script is imported in the
+    sandbox, the increase of the peak RSS of the child process is added.
+
+    Note: it is used as the worker function of the integration process pool,
+        so it never raises and it does not write anything to disk
+    """
+    script_fp, remove_opts, link_inputs, blast_db_cache_dir, sandbox, \
+        snapshot, tools = task
+    timings = {'import': 0.0, 'xml': 0.0}
+    if sandbox is not None:
+        sandbox.last_rss_delta = None
+    rss = get_peak_rss()
+    start = time()
+    try:
+        info = load_script_info(script_fp, remove_opts, sandbox, snapshot)
+        timings['import'] = time() - start
+        start = time()
+        xml_strings = {}
+        for tool_id, release in tools:
+            xml_strings[tool_id] = generate_xml_string(info.with_id(tool_id),
+                link_inputs=link_inputs,
+                blast_db_cache_dir=blast_db_cache_dir, release=release)
+        timings['xml'] = time() - start
+        status = "Ok"
+    except Exception as exc:
+        xml_strings, status = None, str(type(exc)) + " : " + str(exc)
+    timings['rss_delta'] = get_peak_rss() - rss
+    if sandbox is not None and sandbox.last_rss_delta is not None:
+        # The memory of the import is not accounted in this process
+        timings['rss_delta'] += sandbox.last_rss_delta
+    return xml_strings, status, timings
+
+def generate_xml_strings(tasks, scripts_dirs, jobs=1):
+    """Generates the XML strings of the given scripts
+
+    Inputs:
+        tasks: list of (script_fp, remove_opts, link_inputs,
+            blast_db_cache_dir, sandbox, snapshot, tools) tuples
+        scripts_dirs: list with the paths of the directories containing the
+            scripts
+        jobs: number of worker processes used to import the scripts and
+            generate the XML strings
+
+    Returns a list of (xml_strings, status, timings) tuples, in the same
+    order as 'tasks' (see _generate_script_xml). If jobs is greater than 1,
+    the work is distributed among a pool of 'jobs' processes. Otherwise, it
+    is done in the current process. The scripts read from a snapshot are
+    never imported, so they are always generated in the current process.
+    """
+    for scripts_dir in scripts_dirs:
+        addsitedir(scripts_dir)
+
+    results = [None] * len(tasks)
+    pool_tasks = []
+    for i, task in enumerate(tasks):
+        if jobs > 1 and task[5] is None:
+            pool_tasks.append((i, task))
+        else:
+            results[i] = _generate_script_xml(task)
+
+    if pool_tasks:
+        pool = Pool(jobs)
+        try:
+            pool_results = pool.map(_generate_script_xml,
+                [task for i, task in pool_tasks])
+        finally:
+            pool.close()
+            pool.join()
+        for (i, task), result in zip(pool_tasks, pool_results):
+            results[i] = result
+    return results
+
+def _load_release(release):
+    """Returns the Release with its configuration and snapshot loaded"""
+    config = release.config
+    if not isinstance(config, IntegrationConfig):
+        config = load_config(config)
+    snapshot = release.snapshot
+    if snapshot is not None and not isinstance(snapshot, ScriptInfoSnapshot):
+        snapshot = load_snapshot(snapshot)
+    return Release(release.name, release.scripts_dir, config, snapshot)
+
+def _find_release_scripts(release, walk_scripts):
+    """Returns the scripts of a loaded release
+
+    Returns a tuple of (candidates, missing), where candidates is the list
+    of (script name, script path) tuples to integrate and missing is the
+    list of the configured scripts that were not found (see
+    find_configured_scripts and walk_scripts_dir). The scripts of a snapshot
+    are given by their name.
+    """
+    config = release.config
+    snapshot = release.snapshot
+    if snapshot is not None:
+        names = list(snapshot) if walk_scripts else \
+            [name for name in config if name in snapshot]
+        candidates = [(name, name) for name in names]
+        missing = [name for name in config if name not in snapshot]
+    elif walk_scripts:
+        candidates = walk_scripts_dir(release.scripts_dir)
+        present = set([name for name, script_fp in candidates])
+        missing = [name for name in config if name not in present]
+    else:
+        candidates, missing = find_configured_scripts(release.scripts_dir,
+            list(config))
+    return candidates, missing
+
+def _get_log_name(name, release):
+    """Returns the name of the script in the log and the cache"""
+    return name if release is None else "%s/%s" % (release, name)
 
 def integrate(scripts_dir, galaxy_dist_dir, config_file, update_tool_conf,
-                                                                        log_fp):
+                        log_fp, jobs=1, force=False, link_inputs=False,
+                        blast_db_cache_dir=None, log_format='text', top_n=10,
+                        dry_run=False, walk_scripts=False,
+                        sandbox_imports=True, import_timeout=DEFAULT_TIMEOUT,
+                        import_memory_limit=DEFAULT_MEMORY_LIMIT,
+                        snapshot=None):
     """Integrates the tools in the scripts folder into the given Galaxy instance
 
     Inputs:
         scripts_dir: path to the directory containing all the scripts to be 
             integrated on Galaxy
         galaxy_dist_dir: path to the Galaxy's installation folder
-        config_file: path to the Galaxy-QIIME configuration file
+        config_file: path to the Galaxy-QIIME configuration file, or an
+            already loaded integration_config.IntegrationConfig object
         update_tool_conf: boolean showing if the current tool_conf file should
             be updated or a new tool_conf file should be created 
         log_fp: path to where the log file should be written
 
-    Walks through all the scripts present in the 'scripts_dir' folder and 
-    integrates them in the Galaxy instance 'galaxy_dist_dir'. The integration is
+    Integrates the scripts of the 'scripts_dir' folder listed in the
+    'config_file' in the Galaxy instance 'galaxy_dist_dir'. The integration is
     done according to the 'config_file', which specifies: the different sections
     in which the scripts will be grouped, which scripts of the script folder 
     will be integrated and which option of these script will NOT be included
     in the Galaxy interface.
 
+    Only the configured scripts are looked for in 'scripts_dir' and the
+    missing ones are reported at the beginning of the log. If walk_scripts
+    is True, the whole 'scripts_dir' tree is walked instead, which also
+    logs the python files that are not in the configuration file.
+
     If update_tool_conf is True, it will update the current tool_conf.xml file
     present in the Galaxy instance. Otherwise, it will override it with a new
     tool_conf.xml configuration file.
 
     If a log_fp is given, the script will write the log file into this path.
     Otherwise, it will create a log file in the scripts_dir folder
+
+    If jobs is greater than 1, the scripts are imported and their XML strings
+    are generated by a pool of 'jobs' worker processes. The current process
+    is the only one writing the XML files, the tool_conf.xml file and the
+    log file.
+
+    The XML file of a script is only regenerated if the script, its
+    remove_opts or the XML generator have changed since the last integration,
+    according to the cache stored in the Galaxy's tools folder. If force is
+    True, the XML files of all the scripts are regenerated.
+
+    If link_inputs is True, the generated commands only extract the input
+    datasets that are tgz files and link the rest (see
+    xml_generator.CommandGenerator). If blast_db_cache_dir is provided, the
+    blast databases are extracted in that directory of the Galaxy server,
+    shared by all the jobs (see blast_db_cache.BlastDbCache).
+
+    The scripts whose script_info is built dynamically have to be imported.
+    If sandbox_imports is True, each one is imported in a short-lived child
+    process, killed if it takes longer than 'import_timeout' seconds or uses
+    more than 'import_memory_limit' MB of address space (see
+    import_sandbox.ImportSandbox).
+    Only its serialized script_info comes back, so the memory of the
+    integration process does not grow with the number of imported scripts.
+
+    If a script_info snapshot is given, as a path or as a loaded
+    script_info_snapshot.ScriptInfoSnapshot object, the scripts are read from
+    the snapshot instead of 'scripts_dir', which can be None, and nothing is
+    imported. The walk of 'scripts_dir' lists the scripts of the snapshot and
+    all the XML files are generated in the current process.
+
+    For each generated script, the log records its wall time, the time spent
+    importing it, generating its XML and writing it, and the increase of the
+    peak RSS of the process which generated it. The log ends with a summary
+    of the run listing the 'top_n' slowest scripts. If log_format is 'json',
+    the log is written as one JSON object per line (see
+    integration_log.IntegrationLog).
+
+    The target state of the Galaxy instance is computed in memory and only
+    the directories and files that change are written, so Galaxy only
+    reloads the affected tools. If dry_run is True, nothing is written, not
+    even the log file or the cache.
+
+    Returns a dict with the diff between the current and the target state:
+    the paths of the directories and files created ('new') and modified
+    ('modified'), and the (section name, tool file) entries added to and
+    removed from the tool_conf.xml file ('tool_conf_added',
+    'tool_conf_removed'). See format_integration_diff.
+
+    It integrates a single unversioned release (see integrate_releases).
     """
-    script_dict, sections = parse_config_file(open(config_file, 'U'))
+    if not log_fp:
+        log_fp = path.join(scripts_dir or galaxy_dist_dir, 'integration.log')
+
+    return integrate_releases([Release(None, scripts_dir, config_file,
+        snapshot)], galaxy_dist_dir, update_tool_conf, log_fp, jobs, force,
+        link_inputs, blast_db_cache_dir, log_format, top_n, dry_run,
+        walk_scripts, sandbox_imports, import_timeout, import_memory_limit)
+
+def integrate_releases(releases, galaxy_dist_dir, update_tool_conf, log_fp,
+                        jobs=1, force=False, link_inputs=False,
+                        blast_db_cache_dir=None, log_format='text', top_n=10,
+                        dry_run=False, walk_scripts=False,
+                        sandbox_imports=True, import_timeout=DEFAULT_TIMEOUT,
+                        import_memory_limit=DEFAULT_MEMORY_LIMIT):
+    """Integrates several releases of the scripts in a single pass
+
+    Inputs:
+        releases: list of Release objects
+        galaxy_dist_dir: path to the Galaxy's installation folder
+        update_tool_conf: boolean showing if the current tool_conf file should
+            be updated or a new tool_conf file should be created
+        log_fp: path to where the log file should be written. If None, it is
+            written in the galaxy_dist_dir folder
+
+    Each release is integrated as in integrate, with the tool ids and the
+    sections versioned by the release name (see get_versioned_tool_id and
+    get_versioned_section), so the scripts of all the releases are
+    available side by side. The XML files are stored in the folder of their
+    versioned section, named after their tool id.
+
+    The configuration files are loaded once, the XML strings of all the
+    releases are generated by the same worker pool and the tool_conf.xml
+    file, the cache and the log file are written once. A script with the
+    same source code (or snapshot entry) and remove_opts in several releases
+    is loaded once, and its XML strings are generated from the same
+    ScriptInfo object. Each tool requires the qiime package version named
+    after its release. The scripts are logged as 'release/script name'.
+
+    The rest of the options and the returned diff are the same as in
+    integrate.
+
+    Note: raises a ValueError if the release names are not unique, or if
+        the scripts of more than one release would be imported without the
+        import sandbox, as their modules would clash in the same process
+    """
+    start = time()
+
+    releases = map(_load_release, releases)
+    release_names = [release.name for release in releases]
+    if len(set(release_names)) != len(release_names):
+        raise ValueError, "Release names are not unique: %s" % \
+            ', '.join(map(str, release_names))
+    if not sandbox_imports and \
+            len([r for r in releases if r.snapshot is None]) > 1:
+        raise ValueError, "The scripts of several releases can only be " \
+            "imported using the import sandbox"
+
+    sections = []
+    for release in releases:
+        for section in release.config.sections:
+            section = get_versioned_section(section, release.name)
+            if section not in sections:
+                sections.append(section)
 
     galaxy_dist_dir = path.abspath(galaxy_dist_dir)
 
-    create_dirs(galaxy_dist_dir, sections)
+    diff = {'new': create_dirs(galaxy_dist_dir, sections, dry_run),
+            'modified': []}
 
     tool_conf = get_galaxy_tool_conf_file(galaxy_dist_dir, update_tool_conf)
+    tool_conf_fp = path.join(galaxy_dist_dir, 'tool_conf.xml')
+    if update_tool_conf:
+        old_entries = get_tool_conf_entries(tool_conf)
+    else:
+        try:
+            old_entries = get_tool_conf_entries(parse(tool_conf_fp))
+        except ExpatError:
+            old_entries = set()
 
     section_dict = {}
     for section in sections:
         section_dict[section] = []
 
     if not log_fp:
-        log_fp = path.join(scripts_dir, 'integration.log')
-
-    log_file = open(log_fp, 'w')
+        log_fp = path.join(galaxy_dist_dir, 'integration.log')
+
+    log_file = StringIO() if dry_run else open(log_fp, 'w')
+    log = IntegrationLog(log_file, log_format, top_n)
+
+    cache = IntegrationCache(path.join(galaxy_dist_dir, 'tools',
+        CACHE_FILENAME))
+
+    sandbox = None
+    if sandbox_imports:
+        sandbox = ImportSandbox(import_timeout, import_memory_limit)
+
+    release_scripts = []
+    for release in releases:
+        candidates, missing = _find_release_scripts(release, walk_scripts)
+        release_scripts.append((release, candidates))
+        for name in missing:
+            log.script(_get_log_name(name, release.name), 'missing')
+
+    # Collect the scripts to integrate, keeping their order for the log. The
+    # tasks are shared by the scripts with the same name and cache key
+    scripts = []
+    tasks = []
+    task_index = {}
+    for release, candidates in release_scripts:
+        for name, script_fp in candidates:
+            log_name = _get_log_name(name, release.name)
+            entry = release.config.get(name)
+            if entry is None:
+                scripts.append((log_name, None, None, None, None, None))
+                continue
+            section = get_versioned_section(entry.section, release.name)
+            remove_opts = entry.get_remove_opts_string()
+            if release.snapshot is not None:
+                key = compute_snapshot_key(release.snapshot.get_entry(name),
+                    remove_opts, link_inputs, blast_db_cache_dir)
+            else:
+                key = compute_script_key(script_fp, remove_opts, link_inputs,
+                    blast_db_cache_dir)
+            tool_id = get_versioned_tool_id(name, release.name)
+            xml_fp = path.join(galaxy_dist_dir, 'tools',
+                section.replace(" ", "").lower(), tool_id + ".xml")
+            cached = not force and cache.is_fresh(log_name, key, xml_fp)
+            task = None
+            if not cached:
+                task = task_index.get((name, key))
+                if task is None:
+                    task = len(tasks)
+                    task_index[(name, key)] = task
+                    tasks.append((script_fp, remove_opts, link_inputs,
+                        blast_db_cache_dir, sandbox, release.snapshot, []))
+                tasks[task][6].append((tool_id, release.name))
+            scripts.append((log_name, section, key, xml_fp, tool_id, task))
+
+    scripts_dirs = [release.scripts_dir for release in releases
+        if release.snapshot is None]
+    results = generate_xml_strings(tasks, scripts_dirs, jobs)
+
+    logged_tasks = set()
+    for log_name, section, key, xml_fp, tool_id, task in scripts:
+        if section is None:
+            log.script(log_name, 'skipped')
+            continue
+        if task is None:
+            section_dict[section].append(path.basename(xml_fp))
+            log.script(log_name, 'unchanged')
+            continue
+        xml_strings, status, timings = results[task]
+        if xml_strings is not None:
+            # The time spent in a shared task is only logged once
+            timings = dict(timings)
+            if task in logged_tasks:
+                timings['import'] = timings['xml'] = 0.0
+                timings['rss_delta'] = 0
+            logged_tasks.add(task)
+            write_start = time()
+            change = write_if_changed(xml_fp, xml_strings[tool_id], dry_run)
+            if change is not None:
+                diff[change].append(xml_fp)
+            timings['write'] = time() - write_start
+            timings['wall'] = timings['import'] + timings['xml'] + \
+                timings['write']
+            section_dict[section].append(path.basename(xml_fp))
+            cache.update(log_name, key)
+            log.script(log_name, 'ok', timings=timings)
+        else:
+            cache.remove(log_name)
+            log.script(log_name, 'failed', error=status)
 
-    addsitedir(scripts_dir)
+    if not dry_run:
+        cache.save()
 
-    for root, dirs, files in walk(scripts_dir):
-        for name in files:
-            if name.endswith('.py'):
-                log_file.write("Generating XML file for %s script... " % name)
-                if name in script_dict.keys():
-                    section, remove_opts = script_dict[name]
-                    output_dir = path.join(galaxy_dist_dir, 'tools',
-                        section.replace(" ", "").lower())
-                    try:
-                        make_xml(name, output_dir, remove_opts)
-                        section_dict[section].append(name)
-                        log_file.write("Ok\n")
-                    except Exception as exc:
-                        log_file.write(str(type(exc)) + " : " + str(exc) + "\n")
-                else:
-                    log_file.write("skipped - not in configuration file\n")
-
-
-    log_file.write("Generating tool_conf... ")
+    step_start = time()
     update_tool_conf_xml(tool_conf, section_dict)
-    log_file.write("Ok\n")
+    new_entries = get_tool_conf_entries(tool_conf)
+    diff['tool_conf_added'] = sorted(new_entries - old_entries)
+    diff['tool_conf_removed'] = sorted(old_entries - new_entries)
+    log.step("Generating tool_conf", time() - step_start)
 
-    log_file.write("Writing tool_conf... ")
+    step_start = time()
     # Write tool_conf.xml file
-    tool_conf_fp = path.join(galaxy_dist_dir, 'tool_conf.xml')
-    f = open(tool_conf_fp, 'w')
-    f.write(tool_conf.toprettyxml(indent='\t'))
-    f.close()
-    log_file.write("Ok\n")
+    change = write_if_changed(tool_conf_fp,
+        tool_conf.toprettyxml(indent='\t'), dry_run)
+    if change is not None:
+        diff[change].append(tool_conf_fp)
+    log.step("Writing tool_conf", time() - step_start)
 
-    log_file.write("Generating activate.sh file... ")
-    create_activate_file(galaxy_dist_dir)
-    log_file.write("Ok\n")
+    step_start = time()
+    change = create_activate_file(galaxy_dist_dir, dry_run)
+    if change is not None:
+        diff[change].append(path.join(galaxy_dist_dir, 'activate.sh'))
+    log.step("Generating activate.sh file", time() - step_start)
+
+    log.summary(time() - start)
 
     # Close log file
     log_file.close()
+
+    return diff
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+import json
+import socket
+from os import chmod, environ, getuid, makedirs, path, remove, stat, umask
+from stat import S_ISDIR, S_ISSOCK
+from SocketServer import (ThreadingMixIn, UnixStreamServer,
+    StreamRequestHandler)
+from tempfile import gettempdir
+
+# Environment variable with the path to the socket of the helper daemon
+SOCKET_ENV_VAR = 'QIIME_GALAXY_HELPER_SOCKET'
+
+def get_default_socket_path():
+    """Returns the path to the helper daemon socket
+
+    It is the value of the QIIME_GALAXY_HELPER_SOCKET environment variable or,
+    if it is not defined, a socket in a per-user directory of the temporary
+    directory, which the helper daemon creates with mode 0700
+    """
+    return environ.get(SOCKET_ENV_VAR) or path.join(gettempdir(),
+        'qiime_galaxy_helper_%d' % getuid(), 'helper.sock')
+
+def _is_private_dir(dir_path):
+    """Returns True if dir_path is a directory owned by the current user or
+    root that only its owner can write"""
+    try:
+        st = stat(dir_path)
+    except OSError:
+        return False
+    return S_ISDIR(st.st_mode) and st.st_uid in (getuid(), 0) and \
+        not st.st_mode & 022
+
+def is_trusted_socket(socket_path):
+    """Returns True if socket_path is a socket of the current user in a
+    private directory
+
+    Otherwise, another local user could listen on socket_path and answer the
+    helper requests with forged paths
+    """
+    try:
+        st = stat(socket_path)
+    except OSError:
+        return False
+    return S_ISSOCK(st.st_mode) and st.st_uid == getuid() and \
+        _is_private_dir(path.dirname(path.abspath(socket_path)))
+
+def resolve_cached(in_path, cache_dir, max_size):
+    """Returns the blast database base path, using the cache in cache_dir"""
+    from blast_db_cache import BlastDbCache
+    return BlastDbCache(cache_dir, max_size).get_db_path(in_path)
+
+# Operations served by the helper daemon. For each operation, the module and
+# the name of the function executing it and the positions of its path
+# arguments, which are made absolute by the client, as the daemon runs in
+# another directory. The modules are imported when the operation is executed
+# in-process, so the clients only load the one they use
+OPERATIONS = {}
+OPERATIONS['extract'] = ('tgz_manager', 'extract_if_is_tgz', [0, 1])
+OPERATIONS['compress'] = ('tgz_manager', 'compress_to_tgz', [0, 1])
+OPERATIONS['resolve'] = ('format_blast_db_string', 'format_blast_db_string',
+                         [0])
+OPERATIONS['resolve_cached'] = ('helper_daemon', 'resolve_cached', [0, 1])
+
+# Exceptions raised again by the client when the operation fails in the
+# daemon. Any other exception is raised as a RuntimeError
+ERRORS = {'ValueError': ValueError, 'IOError': IOError, 'OSError': OSError}
+
+def _get_operation(op):
+    """Returns the function executing the operation 'op' and its path
+    arguments positions
+
+    Note: raises a KeyError if the operation does not exist
+    """
+    module_name, function_name, path_args = OPERATIONS[op]
+    return getattr(__import__(module_name), function_name), path_args
+
+def _to_str(value):
+    """Encodes the unicode strings decoded by json as utf-8 strings"""
+    return value.encode('utf-8') if isinstance(value, unicode) else value
+
+def execute_request(request):
+    """Executes a helper daemon request
+
+    Input:
+        request: dict with the operation name, 'op', and its list of
+            arguments, 'args'
+
+    Returns a dict with the return value of the operation under 'result' or,
+    if it failed, the exception class name under 'error' and its message
+    under 'message'
+    """
+    try:
+        function, path_args = _get_operation(request['op'])
+        args = map(_to_str, request['args'])
+    except (KeyError, TypeError):
+        return {'error': 'ValueError',
+                'message': "Invalid helper request: %s" % request}
+    try:
+        return {'result': function(*args)}
+    except Exception as exc:
+        return {'error': exc.__class__.__name__, 'message': str(exc)}
+
+class HelperRequestHandler(StreamRequestHandler):
+    """Serves the requests of a client connection, one JSON object per line
+    """
+    def handle(self):
+        line = self.rfile.readline()
+        while line:
+            try:
+                response = execute_request(json.loads(line))
+            except ValueError:
+                response = {'error': 'ValueError',
+                            'message': "Invalid helper request: %s" % line}
+            self.wfile.write(json.dumps(response) + '\n')
+            self.wfile.flush()
+            line = self.rfile.readline()
+
+class HelperDaemon(ThreadingMixIn, UnixStreamServer):
+    """Unix socket server executing the helper operations in threads"""
+    daemon_threads = True
+
+    def __init__(self, socket_path):
+        """Creates the HelperDaemon object listening on socket_path
+
+        The directory of socket_path is created with mode 0700 if it does not
+        exist, and the socket is only accessible by the current user.
+
+        Note: raises a ValueError if another daemon is listening on
+            socket_path or if the socket directory can be written by other
+            users (see is_trusted_socket). A stale socket file is removed
+        """
+        socket_dir = path.dirname(path.abspath(socket_path))
+        if not path.exists(socket_dir):
+            makedirs(socket_dir, 0700)
+        if not _is_private_dir(socket_dir):
+            raise ValueError, "The socket directory %s must be owned by the" \
+                % socket_dir + " current user and writable only by its owner"
+        if path.exists(socket_path):
+            sock = _connect(socket_path)
+            if sock is not None:
+                sock.close()
+                raise ValueError, "A helper daemon is already listening on" +\
+                                    " %s" % socket_path
+            remove(socket_path)
+        UnixStreamServer.__init__(self, socket_path, HelperRequestHandler)
+
+    def server_bind(self):
+        """Binds the socket, only accessible by the current user"""
+        old_umask = umask(0177)
+        try:
+            UnixStreamServer.server_bind(self)
+        finally:
+            umask(old_umask)
+        chmod(self.server_address, 0600)
+
+    def server_close(self):
+        """Closes the server and removes its socket file"""
+        UnixStreamServer.server_close(self)
+        if path.exists(self.server_address):
+            remove(self.server_address)
+
+def _connect(socket_path):
+    """Returns a socket connected to socket_path, or None if nobody listens
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+def call_helper(op, args, socket_path=None):
+    """Executes a helper operation in the helper daemon
+
+    Inputs:
+        op: the operation name (see OPERATIONS)
+        args: list with the arguments of the operation
+        socket_path: path to the helper daemon socket. If None, the default
+            socket is used (see get_default_socket_path)
+
+    Returns the return value of the operation. If the helper daemon is not
+    running, or its socket is not trusted (see is_trusted_socket), the
+    operation is executed in the current process.
+
+    Note: raises a ValueError if the operation does not exist. If the
+        operation fails, its exception is raised again (see ERRORS)
+    """
+    try:
+        module_name, function_name, path_args = OPERATIONS[op]
+    except KeyError:
+        raise ValueError, "Unknown helper operation: %s" % op
+
+    args = list(args)
+    for i in path_args:
+        if args[i] is not None:
+            args[i] = path.abspath(args[i])
+
+    socket_path = socket_path or get_default_socket_path()
+    sock = _connect(socket_path) if is_trusted_socket(socket_path) else None
+    if sock is None:
+        function, path_args = _get_operation(op)
+        return function(*args)
+
+    try:
+        f = sock.makefile('rw')
+        f.write(json.dumps({'op': op, 'args': args}) + '\n')
+        f.flush()
+        line = f.readline()
+        f.close()
+    finally:
+        sock.close()
+
+    if not line:
+        raise IOError, "The helper daemon closed the connection"
+    response = json.loads(line)
+    if 'error' in response:
+        raise ERRORS.get(response['error'], RuntimeError)(
+            _to_str(response['message']))
+    return _to_str(response['result'])
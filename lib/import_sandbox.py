@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+# Import of the scripts whose script_info can't be statically extracted. Each
+# script is imported in a short-lived child process, which sends back its
+# serialized script_info and the memory used by the import. The modules
+# imported by the scripts, their state and their memory never reach the
+# integration process, and a script that hangs on import is killed.
+
+import json
+import sys
+from optparse import NO_DEFAULT
+from os import environ, close, remove, pathsep
+from os.path import abspath, split, splitext
+from subprocess import Popen, PIPE
+from tempfile import mkstemp
+from threading import Timer
+from integration_log import get_peak_rss
+
+# Default maximum time, in seconds, to import a script
+DEFAULT_TIMEOUT = 120
+# Default maximum address space of the child process, in MB. The limit is on
+# the virtual memory mapped by the process, which can be much larger than
+# its RSS (e.g. thread stacks and shared libraries), so there is no limit by
+# default
+DEFAULT_MEMORY_LIMIT = 0
+
+# script_info keys holding lists of options
+OPTION_KEYS = ['required_options', 'optional_options']
+# Option attributes sent back by the child process
+OPTION_ATTRS = ['action', 'type', 'help', 'choices', 'mchoices']
+
+class ScriptImportError(ImportError):
+    """The script could not be imported in the child process"""
+    pass
+
+def serialize_option(option):
+    """Returns a JSON serializable dict with the attributes of an option
+
+    Input:
+        option: the optparse or cogent option object
+
+    The default is serialized as a string, as it is only used to generate the
+    XML, or as None if the option has no default
+    """
+    data = {'opts': option._short_opts + option._long_opts}
+    for attr in OPTION_ATTRS:
+        data[attr] = getattr(option, attr, None)
+    default = option.default
+    data['default'] = None if isinstance(default, tuple) else str(default)
+    return data
+
+def serialize_script_info(script_info):
+    """Returns a JSON serializable copy of the script_info dict
+
+    The options are serialized with serialize_option and the values that are
+    not JSON serializable are dropped
+    """
+    data = {}
+    for key, value in script_info.items():
+        if key in OPTION_KEYS:
+            data[key] = map(serialize_option, value)
+        else:
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            data[key] = value
+    return data
+
+def _to_str(value):
+    """Encodes the unicode strings decoded by json as utf-8 strings"""
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return map(_to_str, value)
+    if isinstance(value, dict):
+        return dict([(_to_str(k), _to_str(v)) for k, v in value.items()])
+    return value
+
+def deserialize_script_info(data):
+    """Rebuilds the script_info dict serialized by serialize_script_info
+
+    The options are rebuilt as script_info_extractor.StaticOption objects
+    """
+    from script_info_extractor import StaticOption
+
+    script_info = _to_str(data)
+    for key in OPTION_KEYS:
+        if key in script_info:
+            options = []
+            for attrs in script_info[key]:
+                opts = attrs.pop('opts')
+                if attrs['default'] is None:
+                    attrs['default'] = NO_DEFAULT
+                options.append(StaticOption(*opts, **attrs))
+            script_info[key] = options
+    return script_info
+
+def _kill(proc, state):
+    """Kills the child process proc when its timeout expires"""
+    state['timed_out'] = True
+    try:
+        proc.kill()
+    except OSError:
+        pass
+
+class ImportSandbox(object):
+    """Class modeling the import of scripts in child processes"""
+    def __init__(self, timeout=DEFAULT_TIMEOUT,
+            memory_limit=DEFAULT_MEMORY_LIMIT):
+        """Creates the ImportSandbox object
+
+        Inputs:
+            timeout: maximum time, in seconds, to import a script. If None,
+                there is no timeout
+            memory_limit: maximum address space of the child process, in MB
+                (RLIMIT_AS, not its RSS). If None or 0, there is no limit
+        """
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        # Increase of the peak RSS of the child process, in KB, during the
+        # last import (see get_script_info)
+        self.last_rss_delta = None
+
+    def _limit_memory(self):
+        """Sets the memory limit of the child process, before it starts"""
+        if self.memory_limit:
+            import resource
+            limit = self.memory_limit * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    def get_script_info(self, script_fp):
+        """Returns the script_info dict of a script, importing it in a child
+        process
+
+        Input:
+            script_fp: path to the script
+
+        The child process gets the python path of the current process and
+        the directory of the script. The increase of the peak RSS of the
+        child process while importing the script, in KB, is stored in
+        last_rss_delta, as it is not accounted in the current process.
+
+        Note: raises a ScriptImportError if the import fails, takes longer
+            than the timeout or exceeds the memory limit
+        """
+        fd, output_fp = mkstemp(suffix='.json')
+        close(fd)
+        env = dict(environ)
+        env['PYTHONPATH'] = pathsep.join([p for p in sys.path if p])
+        module_fp = splitext(abspath(__file__))[0] + '.py'
+        try:
+            proc = Popen([sys.executable, module_fp, abspath(script_fp),
+                output_fp], stdout=PIPE, stderr=PIPE, env=env,
+                preexec_fn=self._limit_memory, close_fds=True)
+            state = {'timed_out': False}
+            timer = None
+            if self.timeout:
+                timer = Timer(self.timeout, _kill, [proc, state])
+                timer.start()
+            try:
+                out, err = proc.communicate()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+            if state['timed_out']:
+                raise ScriptImportError, "Importing %s took more than %s " \
+                    "seconds" % (script_fp, self.timeout)
+            if proc.returncode != 0:
+                lines = err.strip().splitlines()
+                raise ScriptImportError, "Unable to import %s: %s" % \
+                    (script_fp, lines[-1] if lines else
+                     "exit status %d" % proc.returncode)
+
+            f = open(output_fp, 'U')
+            data = json.load(f)
+            f.close()
+        finally:
+            remove(output_fp)
+        self.last_rss_delta = data['rss_delta']
+        return deserialize_script_info(data['script_info'])
+
+def _import_script_info(script_fp, output_fp):
+    """Imports the script and writes its serialized script_info to output_fp
+
+    The increase of the peak RSS of the process during the import, in KB, is
+    written along with the script_info.
+
+    Note: it runs in the child process
+    """
+    rss = get_peak_rss()
+    dir_path, command = split(script_fp)
+    # The script directory goes first, so a script with the same name in
+    # another directory of the python path is not imported instead
+    sys.path.insert(0, dir_path)
+    fname, ext = splitext(command)
+    script_info = __import__(fname).script_info
+    data = {'script_info': serialize_script_info(script_info)}
+    data['rss_delta'] = get_peak_rss() - rss
+    f = open(output_fp, 'w')
+    json.dump(data, f)
+    f.close()
+
+if __name__ == '__main__':
+    _import_script_info(sys.argv[1], sys.argv[2])
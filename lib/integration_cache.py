@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+import json
+from hashlib import sha1
+from os import path
+from atomic_write import write_if_changed, file_digest
+
+# Name of the cache file, stored in the Galaxy's tools folder
+CACHE_FILENAME = '.qiime_galaxy_cache.json'
+
+# Modules whose source code determines the XML generated for a script: the
+# XML generator and writer and the modules reading the script_info
+GENERATOR_MODULES = ['xml_generator', 'xml_stream_writer',
+                     'script_info_extractor', 'import_sandbox',
+                     'script_info_snapshot']
+
+# Memo of the digest of the XML generator source code
+_generator_digest = []
+
+def get_module_fp(module):
+    """Returns the path to the source code of the module"""
+    module_fp = path.splitext(module.__file__)[0] + '.py'
+    if not path.exists(module_fp):
+        module_fp = module.__file__
+    return module_fp
+
+def get_generator_digest():
+    """Returns the sha1 digest of the XML generator source code
+
+    The XML generated for a script changes with the source code of any of the
+    GENERATOR_MODULES, so the digest is part of the cache keys
+    """
+    if not _generator_digest:
+        digest = sha1()
+        for module_name in GENERATOR_MODULES:
+            digest.update('%s\0%s\0' % (module_name,
+                file_digest(get_module_fp(__import__(module_name)))))
+        _generator_digest.append(digest.hexdigest())
+    return _generator_digest[0]
+
+def compute_script_key(script_fp, remove_opts, link_inputs=False,
+        blast_db_cache_dir=None):
+    """Returns the cache key of a script
+
+    Inputs:
+        script_fp: path to the script
+        remove_opts: the options of the script that won't be included in the
+            Galaxy's interface, as listed in the configuration file
+        link_inputs: boolean showing if the XML command links the input
+            datasets instead of extracting them
+        blast_db_cache_dir: path to the blast database cache directory used
+            by the XML command
+
+    The key is a hash of the script source code, its remove_opts, the
+    command options and the XML generator source code. It changes whenever
+    the generated XML can change.
+    """
+    key = sha1()
+    key.update(get_generator_digest())
+    key.update('\0%s\0%s\0%s\0' % (remove_opts, link_inputs,
+        blast_db_cache_dir))
+    f = open(script_fp, 'rb')
+    key.update(f.read())
+    f.close()
+    return key.hexdigest()
+
+def compute_snapshot_key(entry, remove_opts, link_inputs=False,
+        blast_db_cache_dir=None):
+    """Returns the cache key of a script read from a script_info snapshot
+
+    Inputs:
+        entry: the serialized script_info of the script in the snapshot (see
+            script_info_snapshot.ScriptInfoSnapshot.get_entry)
+        remove_opts, link_inputs, blast_db_cache_dir: see compute_script_key
+
+    The key is computed as in compute_script_key, hashing the serialized
+    script_info instead of the script source code.
+    """
+    key = sha1()
+    key.update(get_generator_digest())
+    key.update('\0%s\0%s\0%s\0' % (remove_opts, link_inputs,
+        blast_db_cache_dir))
+    key.update(json.dumps(entry, sort_keys=True))
+    return key.hexdigest()
+
+class IntegrationCache(object):
+    """Class modeling the persistent cache of the integrated scripts"""
+    def __init__(self, cache_fp):
+        """Creates the IntegrationCache object
+
+        Input:
+            cache_fp: path to the cache file. If it does not exist or it is
+                not a valid cache file, the cache starts empty
+        """
+        self.cache_fp = cache_fp
+        self._keys = {}
+        if path.exists(cache_fp):
+            try:
+                f = open(cache_fp, 'U')
+                self._keys = dict(json.load(f))
+                f.close()
+            except (ValueError, TypeError):
+                self._keys = {}
+
+    def is_fresh(self, script, key, xml_fp):
+        """Returns True if the XML file of the script is up to date
+
+        Inputs:
+            script: the script name
+            key: the current cache key of the script (see compute_script_key)
+            xml_fp: path to the XML file generated for the script
+        """
+        return self._keys.get(script) == key and path.exists(xml_fp)
+
+    def update(self, script, key):
+        """Stores the cache key of the script"""
+        self._keys[script] = key
+
+    def remove(self, script):
+        """Removes the script from the cache, if present"""
+        self._keys.pop(script, None)
+
+    def save(self):
+        """Writes the cache to disk, if it changed"""
+        write_if_changed(self.cache_fp, json.dumps(self._keys, indent=0,
+            sort_keys=True))
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+# Loader of the Galaxy-QIIME configuration files. A configuration file lists
+# the sections of the Galaxy tool panel, each one as a line starting with a
+# tab, followed by the scripts integrated under them and, separated by
+# whitespace, the comma-separated list of their options that won't be
+# included in the Galaxy's interface:
+#
+#   # A comment
+#   <tab>QIIME 1.9.0
+#   %include QIIME_1.8.0.conf
+#   %remove check_id_map.py
+#   alpha_diversity.py    show_metrics
+#
+# '%include <file>' adds the scripts of another configuration file, relative
+# to the including one, to the current section. The section lines of the
+# included file are ignored. A script listed after an include overrides the
+# included entry, while '%remove <script>' drops it.
+
+import re
+from collections import namedtuple, OrderedDict
+from os import path, stat
+
+BLANK_RE = re.compile(r'^\s*(#.*)?$')
+SECTION_RE = re.compile(r'^\t+(?P<section>[^\t#][^\t]*?)\s*$')
+DIRECTIVE_RE = re.compile(r'^%(?P<directive>\w+)\s+(?P<arg>\S+)\s*$')
+SCRIPT_RE = re.compile(
+    r'^(?P<script>[^\s#%]+)(?:\s+(?P<remove_opts>\S+))?\s*$')
+OPTION_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Memo of the loaded configuration files, keyed by their absolute path. Each
+# value is a tuple of (stamps, config), where stamps has the modification
+# time and the size of every file read, including the included ones
+_loaded_configs = {}
+
+class ScriptEntry(namedtuple('ScriptEntry', ['section', 'remove_opts'])):
+    """Configuration of a script: its section and the frozenset of the names
+    of its options that won't be included in the Galaxy's interface"""
+    __slots__ = ()
+
+    def get_remove_opts_string(self):
+        """Returns the remove options as the comma-separated string expected
+        by xml_generator.ScriptInfo.remove_options, or None if there are no
+        options to remove"""
+        return ','.join(sorted(self.remove_opts)) or None
+
+class IntegrationConfig(object):
+    """Class modeling a loaded Galaxy-QIIME configuration file
+
+    It is a read-only mapping of {script name: ScriptEntry}, iterated in the
+    order of the configuration file, with the ordered list of its sections
+    """
+    def __init__(self, sections, scripts):
+        """Creates the IntegrationConfig object
+
+        Inputs:
+            sections: list with the section names, in order
+            scripts: list of (script name, ScriptEntry) tuples, in order
+        """
+        self._sections = tuple(sections)
+        self._names = tuple([name for name, entry in scripts])
+        self._scripts = dict(scripts)
+        section_scripts = dict([(section, []) for section in self._sections])
+        for name, entry in scripts:
+            section_scripts[entry.section].append(name)
+        self._section_scripts = dict([(section, tuple(names))
+            for section, names in section_scripts.items()])
+
+    @property
+    def sections(self):
+        """Tuple with the section names, in order"""
+        return self._sections
+
+    def get_section_scripts(self, section):
+        """Returns the tuple of the script names of the section, in order"""
+        return self._section_scripts[section]
+
+    def get(self, name, default=None):
+        """Returns the ScriptEntry of the script 'name', or default"""
+        return self._scripts.get(name, default)
+
+    def __getitem__(self, name):
+        return self._scripts[name]
+
+    def __contains__(self, name):
+        return name in self._scripts
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+def _parse_remove_opts(remove_opts, location, errors):
+    """Returns the frozenset of the options in the remove_opts string
+
+    Invalid or repeated option names are added to errors
+    """
+    if remove_opts is None:
+        return frozenset()
+    names = remove_opts.split(',')
+    for name in names:
+        if not OPTION_NAME_RE.match(name):
+            errors.append("%s: invalid option name '%s'" % (location, name))
+    if len(set(names)) != len(names):
+        errors.append("%s: repeated option in '%s'" % (location, remove_opts))
+    return frozenset(names)
+
+def _parse_lines(lines, source, base_dir, included, stack, read_files):
+    """Parses the lines of a configuration file in a single pass
+
+    Inputs:
+        lines: iterable with the lines of the configuration file
+        source: name of the file, used in the error messages
+        base_dir: directory the included files are relative to
+        included: boolean showing if the file is included by another one. If
+            so, its section lines are ignored and its scripts can be outside
+            a section
+        stack: list with the absolute paths of the files being included,
+            to detect include cycles
+        read_files: list where the paths of the included files are added
+
+    Returns a tuple of (entries, sections, errors), where entries is an
+    OrderedDict of {script name: [section, remove_opts, location,
+    inherited]}, sections is the list of sections and errors is the list of
+    the errors found
+    """
+    entries = OrderedDict()
+    sections = []
+    errors = []
+    section = None
+
+    for lineno, line in enumerate(lines, 1):
+        location = "%s:%d" % (source, lineno)
+        line = line.rstrip('\r\n')
+        if BLANK_RE.match(line):
+            continue
+
+        match = SECTION_RE.match(line)
+        if match:
+            if not included:
+                section = match.group('section')
+                if section not in sections:
+                    sections.append(section)
+            continue
+
+        match = DIRECTIVE_RE.match(line)
+        if match:
+            directive, arg = match.group('directive', 'arg')
+            if directive == 'include':
+                if section is None and not included:
+                    errors.append("%s: include outside a section" % location)
+                    continue
+                inc_entries, inc_errors = _parse_file(path.join(base_dir,
+                    arg), stack, read_files, location)
+                errors.extend(inc_errors)
+                for name, (s, remove_opts, loc, inh) in inc_entries.items():
+                    if name in entries:
+                        errors.append("%s: duplicate script %s, already "
+                            "listed at %s" % (loc, name, entries[name][2]))
+                    else:
+                        entries[name] = [section, remove_opts, loc, True]
+            elif directive == 'remove':
+                if arg in entries:
+                    del entries[arg]
+                else:
+                    errors.append("%s: cannot remove %s, it is not listed"
+                        % (location, arg))
+            else:
+                errors.append("%s: unknown directive %%%s" % (location,
+                    directive))
+            continue
+
+        match = SCRIPT_RE.match(line)
+        if not match:
+            errors.append("%s: malformed line '%s'" % (location, line))
+            continue
+        name = match.group('script')
+        if section is None and not included:
+            errors.append("%s: script %s is not under a section" %
+                (location, name))
+        remove_opts = _parse_remove_opts(match.group('remove_opts'),
+            location, errors)
+        if name in entries and not entries[name][3]:
+            errors.append("%s: duplicate script %s, already listed at %s" %
+                (location, name, entries[name][2]))
+        # An inherited entry is overridden in its place
+        entries[name] = [section, remove_opts, location, False]
+
+    return entries, sections, errors
+
+def _parse_file(config_fp, stack, read_files, location):
+    """Parses an included configuration file
+
+    Inputs:
+        config_fp: path to the included file
+        stack: list with the absolute paths of the files being included
+        read_files: list where the paths of the read files are added
+        location: location of the include directive, for the error messages
+
+    Returns a tuple of (entries, errors) (see _parse_lines)
+    """
+    config_fp = path.abspath(config_fp)
+    if config_fp in stack:
+        return {}, ["%s: include cycle: %s" % (location,
+            ' -> '.join(stack + [config_fp]))]
+    if not path.isfile(config_fp):
+        return {}, ["%s: included file %s does not exist" % (location,
+            config_fp)]
+    read_files.append(config_fp)
+    f = open(config_fp, 'U')
+    entries, sections, errors = _parse_lines(f, config_fp,
+        path.dirname(config_fp), True, stack + [config_fp], read_files)
+    f.close()
+    return entries, errors
+
+def parse_config_lines(lines, source='<config>', base_dir='.',
+        read_files=None):
+    """Parses the lines of a Galaxy-QIIME configuration file
+
+    Inputs:
+        lines: iterable with the lines of the configuration file
+        source: name of the configuration file, used in the error messages
+        base_dir: directory the included files are relative to
+        read_files: if provided, list where the paths of the included files
+            are added
+
+    Returns an IntegrationConfig object.
+
+    Note: raises a ValueError listing all the errors of the file, such as
+        scripts outside a section, duplicate scripts, invalid option names or
+        missing included files
+    """
+    if read_files is None:
+        read_files = []
+    stack = [path.abspath(source)] if path.isfile(source) else []
+    entries, sections, errors = _parse_lines(lines, source, base_dir, False,
+        stack, read_files)
+    if errors:
+        raise ValueError, "Bad configuration file:\n" + '\n'.join(errors)
+    return IntegrationConfig(sections, [(name, ScriptEntry(section,
+        remove_opts)) for name, (section, remove_opts, location, inherited)
+        in entries.items()])
+
+def _get_stamps(read_files):
+    """Returns the modification time and size of each file in read_files"""
+    stamps = []
+    for fp in read_files:
+        try:
+            st = stat(fp)
+        except OSError:
+            return None
+        stamps.append((fp, st.st_mtime, st.st_size))
+    return tuple(stamps)
+
+def load_config(config_fp):
+    """Loads a Galaxy-QIIME configuration file
+
+    Input:
+        config_fp: path to the configuration file
+
+    Returns an IntegrationConfig object. The loaded files are memoized by
+    their modification time and size, so the file and its included files are
+    only parsed again if any of them changes.
+
+    Note: raises a ValueError if the configuration file is not correct (see
+        parse_config_lines)
+    """
+    config_fp = path.abspath(config_fp)
+    if config_fp in _loaded_configs:
+        stamps, config = _loaded_configs[config_fp]
+        if _get_stamps([s[0] for s in stamps]) == stamps:
+            return config
+
+    read_files = [config_fp]
+    f = open(config_fp, 'U')
+    try:
+        config = parse_config_lines(f, config_fp, path.dirname(config_fp),
+            read_files)
+    finally:
+        f.close()
+    stamps = _get_stamps(read_files)
+    if stamps is not None:
+        _loaded_configs[config_fp] = (stamps, config)
+    return config
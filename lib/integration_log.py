@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+import json
+import sys
+from resource import getrusage, RUSAGE_SELF
+
+# Formats of the integration log
+LOG_FORMATS = ['text', 'json']
+
+# Phases timed for each generated script, in the order they are logged
+PHASES = ['import', 'xml', 'write']
+
+def get_peak_rss():
+    """Returns the peak resident set size of the current process, in KB
+
+    On Linux, the ru_maxrss of a child process starts at the RSS of its
+    parent when it was forked, so the high-water mark of the process memory
+    is read from /proc if it is available
+    """
+    try:
+        f = open('/proc/self/status')
+        try:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+        finally:
+            f.close()
+    except IOError:
+        pass
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on Mac OS X and in KB on Linux
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return peak
+
+class IntegrationLog(object):
+    """Class modeling the log of an integration run"""
+    def __init__(self, log_file, log_format='text', top_n=10):
+        """Creates the IntegrationLog object
+
+        Inputs:
+            log_file: open file object where the log is written
+            log_format: 'text' for the human readable log or 'json' for one
+                JSON object per line
+            top_n: number of slowest scripts listed in the summary
+
+        Note: raises a ValueError if log_format is not a valid format
+        """
+        if log_format not in LOG_FORMATS:
+            raise ValueError, "Unknown log format: %s" % log_format
+        self.log_file = log_file
+        self.log_format = log_format
+        self.top_n = top_n
+        self.scripts = []
+
+    def _write_record(self, record):
+        """Writes the record as a JSON line"""
+        self.log_file.write(json.dumps(record, sort_keys=True) + "\n")
+
+    def script(self, name, status, error=None, timings=None):
+        """Logs the integration of a script
+
+        Inputs:
+            name: the script name
+            status: 'ok', 'unchanged', 'skipped', 'missing' or 'failed'
+            error: the error string of a failed script
+            timings: dict with the time in seconds spent in each of PHASES,
+                the wall time ('wall') and the increase of the peak RSS of
+                the process which generated the XML, and of the child
+                process which imported the script, in KB ('rss_delta')
+        """
+        record = {'event': 'script', 'script': name, 'status': status}
+        if error is not None:
+            record['error'] = error
+        if timings is not None:
+            record.update(timings)
+        self.scripts.append(record)
+
+        if self.log_format == 'json':
+            self._write_record(record)
+            return
+
+        self.log_file.write("Generating XML file for %s script... " % name)
+        if status == 'skipped':
+            self.log_file.write("skipped - not in configuration file\n")
+        elif status == 'missing':
+            self.log_file.write("missing - not in scripts directory\n")
+        elif status == 'unchanged':
+            self.log_file.write("Ok (unchanged)\n")
+        elif status == 'failed':
+            self.log_file.write("%s\n" % error)
+        else:
+            self.log_file.write("Ok [%s]\n" % self._format_timings(record))
+
+    def _format_timings(self, record):
+        """Returns the timings of the record as a human readable string"""
+        fields = ["wall: %.3fs" % record['wall']]
+        fields.extend(["%s: %.3fs" % (phase, record[phase])
+            for phase in PHASES])
+        fields.append("peak RSS delta: %d KB" % record['rss_delta'])
+        return ', '.join(fields)
+
+    def step(self, description, elapsed):
+        """Logs a successful integration step that took 'elapsed' seconds"""
+        if self.log_format == 'json':
+            self._write_record({'event': 'step', 'step': description,
+                'status': 'ok', 'elapsed': elapsed})
+        else:
+            self.log_file.write("%s... Ok\n" % description)
+
+    def summary(self, elapsed):
+        """Logs the summary of the run, which took 'elapsed' seconds
+
+        The summary has the number of scripts with each status and the top_n
+        slowest generated scripts, by wall time
+        """
+        counts = {}
+        for status in ['ok', 'unchanged', 'skipped', 'missing', 'failed']:
+            counts[status] = len([r for r in self.scripts
+                if r['status'] == status])
+        timed = [r for r in self.scripts if 'wall' in r]
+        timed.sort(key=lambda r: r['wall'], reverse=True)
+        slowest = timed[:self.top_n]
+
+        if self.log_format == 'json':
+            record = {'event': 'summary', 'elapsed': elapsed,
+                'slowest': [[r['script'], r['wall']] for r in slowest]}
+            record.update(counts)
+            self._write_record(record)
+            return
+
+        self.log_file.write("Integration summary: %d scripts generated, %d "
+            "unchanged, %d skipped, %d missing, %d failed in %.3fs\n" %
+            (counts['ok'], counts['unchanged'], counts['skipped'],
+            counts['missing'], counts['failed'], elapsed))
+        if slowest:
+            self.log_file.write("Slowest scripts:\n")
+            for r in slowest:
+                self.log_file.write("\t%s\t%.3fs\n" % (r['script'], r['wall']))
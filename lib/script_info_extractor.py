@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+import ast
+from optparse import NO_DEFAULT
+from os.path import splitext, split
+
+# Binary operators that can be used while building the script_info values,
+# e.g. help="A long help string" + " split in several lines"
+_BINARY_OPERATORS = {}
+_BINARY_OPERATORS[ast.Add] = lambda a, b: a + b
+_BINARY_OPERATORS[ast.Sub] = lambda a, b: a - b
+_BINARY_OPERATORS[ast.Mult] = lambda a, b: a * b
+_BINARY_OPERATORS[ast.Div] = lambda a, b: a / b
+_BINARY_OPERATORS[ast.Mod] = lambda a, b: a % b
+
+# Builtin types that optparse accepts as option types
+_BUILTIN_TYPES = {'str': 'string', 'int': 'int', 'long': 'long',
+                  'float': 'float', 'complex': 'complex'}
+
+class DynamicScriptInfoError(ValueError):
+    """The script_info of a script can't be extracted without running it"""
+    pass
+
+class StaticOption(object):
+    """Class modeling a script option extracted from the script source code
+
+    It provides the attributes of cogent.util.option_parsing.CogentOption
+    used to build an xml_generator.OptionInfo object.
+    """
+    def __init__(self, *opts, **attrs):
+        """Creates the StaticOption object from the make_option arguments
+
+        Input:
+            opts: the option strings (e.g. '-i', '--input_fp')
+            attrs: the keyword arguments of the make_option call
+        """
+        self._short_opts = [opt for opt in opts if not opt.startswith('--')]
+        self._long_opts = [opt for opt in opts if opt.startswith('--')]
+        self.action = attrs.get('action', 'store')
+        self.help = attrs.get('help')
+        self.default = attrs.get('default', NO_DEFAULT)
+        self.choices = attrs.get('choices')
+        self.mchoices = attrs.get('mchoices')
+
+        # Same type inference as optparse.Option._check_type
+        self.type = attrs.get('type')
+        if self.type is None:
+            if self.action in ['store', 'append']:
+                self.type = 'choice' if self.choices is not None else 'string'
+        else:
+            self.type = _BUILTIN_TYPES.get(self.type, self.type)
+
+    def get_opt_string(self):
+        """Returns the option string used to name the option"""
+        if self._long_opts:
+            return self._long_opts[0]
+        return self._short_opts[0]
+
+def _is_main_block(node):
+    """Returns True if node is the 'if __name__ == "__main__":' block"""
+    if not isinstance(node, ast.If) or not isinstance(node.test, ast.Compare):
+        return False
+    test = node.test
+    return isinstance(test.left, ast.Name) and test.left.id == '__name__' and \
+            len(test.comparators) == 1 and \
+            isinstance(test.comparators[0], ast.Str) and \
+            test.comparators[0].s == '__main__'
+
+def _uses_name(node, name):
+    """Returns True if the variable 'name' is referenced inside node"""
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and child.id == name:
+            return True
+    return False
+
+def _referenced_names(node):
+    """Returns the set of variable names referenced or bound inside node
+
+    Includes the names bound by import statements and by function and class
+    definitions. A star import can bind any name, so it is returned as '*'
+    """
+    names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name):
+            names.add(child.id)
+        elif isinstance(child, (ast.FunctionDef, ast.ClassDef)):
+            names.add(child.name)
+        elif isinstance(child, ast.alias):
+            names.add(child.asname or child.name.split('.')[0])
+    return names
+
+def _mutable_ids(value):
+    """Returns the set of ids of the mutable objects in value
+
+    The lists, dicts and StaticOption objects are mutable, so any of them can
+    be shared by several variables
+    """
+    ids = set()
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (list, dict, StaticOption)):
+            if id(value) in ids:
+                continue
+            ids.add(id(value))
+        if isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif isinstance(value, dict):
+            stack.extend(value.keys())
+            stack.extend(value.values())
+    return ids
+
+def _forget_names(forgotten, names, script_info):
+    """Forgets the value of the variables that may have been modified
+
+    Inputs:
+        forgotten: the variable names whose value is not known anymore. If it
+            includes '*' (a star import), all the variables are forgotten
+        names: dict of {variable name: value} with the known values
+        script_info: the script_info dict built so far, or None
+
+    The variables sharing a mutable object with the forgotten ones are also
+    forgotten, as they can be modified through any of them.
+
+    Note: raises a DynamicScriptInfoError if the script_info shares a mutable
+        object with the forgotten variables, or if a star import can rebind
+        the script_info
+    """
+    if '*' in forgotten:
+        if script_info is not None:
+            raise DynamicScriptInfoError, "script_info can be rebound by " + \
+                                            "a star import"
+        forgotten = names.keys()
+    ids = set()
+    for name in forgotten:
+        if name in names:
+            ids |= _mutable_ids(names.pop(name))
+    if not ids:
+        return
+    for name in names.keys():
+        if _mutable_ids(names[name]) & ids:
+            del names[name]
+    if script_info is not None and _mutable_ids(script_info) & ids:
+        raise DynamicScriptInfoError, "A value used by script_info is " + \
+                                        "modified after its definition"
+
+def _is_script_info_item(node):
+    """Returns True if node is a script_info['key'] subscript"""
+    return isinstance(node, ast.Subscript) and \
+            isinstance(node.value, ast.Name) and \
+            node.value.id == 'script_info' and \
+            isinstance(node.slice, ast.Index)
+
+def _evaluate(node, names):
+    """Evaluates the expression 'node' without running any code
+
+    Inputs:
+        node: the ast node of the expression
+        names: dict of {variable name: value} with the module level variables
+            whose value is known
+
+    Note: raises a DynamicScriptInfoError if the value of the expression
+        can't be statically known
+    """
+    if isinstance(node, ast.Str):
+        return node.s
+    elif isinstance(node, ast.Num):
+        return node.n
+    elif isinstance(node, ast.Name):
+        if node.id in names:
+            return names[node.id]
+        elif node.id in ['True', 'False', 'None']:
+            return {'True': True, 'False': False, 'None': None}[node.id]
+        elif node.id in _BUILTIN_TYPES:
+            # Option types can be given as the builtin type (e.g. type=int)
+            return node.id
+    elif isinstance(node, ast.List):
+        return [_evaluate(elt, names) for elt in node.elts]
+    elif isinstance(node, ast.Tuple):
+        return tuple([_evaluate(elt, names) for elt in node.elts])
+    elif isinstance(node, ast.Dict):
+        return dict([(_evaluate(k, names), _evaluate(v, names))
+                        for k, v in zip(node.keys, node.values)])
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return -_evaluate(node.operand, names)
+    elif isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        try:
+            return _BINARY_OPERATORS[type(node.op)](
+                _evaluate(node.left, names), _evaluate(node.right, names))
+        except (TypeError, ValueError, ZeroDivisionError):
+            pass
+    elif isinstance(node, ast.Call) and node.starargs is None and \
+            node.kwargs is None:
+        func = node.func
+        func_name = func.id if isinstance(func, ast.Name) else \
+                    func.attr if isinstance(func, ast.Attribute) else None
+        if func_name == 'make_option':
+            args = [_evaluate(arg, names) for arg in node.args]
+            kwargs = dict([(kw.arg, _evaluate(kw.value, names))
+                            for kw in node.keywords])
+            return StaticOption(*args, **kwargs)
+
+    raise DynamicScriptInfoError, "Expression at line %d can't be " \
+                            % node.lineno + "statically evaluated"
+
+def extract_script_info(script_fp):
+    """Extracts the script_info dict of a script without importing it
+
+    Input:
+        script_fp: path to the script
+
+    Parses the source code of the script and rebuilds its 'script_info' dict
+    from the module level statements that define it. The make_option calls
+    are replaced by StaticOption objects.
+
+    Note: raises a DynamicScriptInfoError if the script_info dict is built
+        dynamically (e.g. it uses values computed by other modules), so it
+        can't be known without importing the script
+    """
+    source = open(script_fp, 'U').read()
+    try:
+        module = ast.parse(source, script_fp)
+    except SyntaxError, e:
+        raise DynamicScriptInfoError, "Unable to parse %s: %s" % (script_fp, e)
+
+    names = {}
+    script_info = None
+
+    for node in module.body:
+        if _is_main_block(node):
+            continue
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.Import,
+                            ast.ImportFrom)):
+            # Imports and definitions rebind their names, and the functions
+            # may modify the variables they reference if they are called
+            _forget_names(_referenced_names(node), names, script_info)
+            continue
+
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target = node.targets[0]
+            if isinstance(target, ast.Name) and target.id == 'script_info':
+                value = _evaluate(node.value, names)
+                if not isinstance(value, dict):
+                    raise DynamicScriptInfoError, "script_info is not a dict"
+                script_info = value
+                continue
+            elif _is_script_info_item(target):
+                if script_info is None:
+                    raise DynamicScriptInfoError, "script_info is used " + \
+                                                    "before its definition"
+                key = _evaluate(target.slice.value, names)
+                script_info[key] = _evaluate(node.value, names)
+                continue
+            elif isinstance(target, ast.Name) and \
+                    not _uses_name(node.value, 'script_info'):
+                # Keep track of the module level constants, as they can be
+                # used in the script_info (e.g. __version__)
+                try:
+                    value = _evaluate(node.value, names)
+                except DynamicScriptInfoError:
+                    # The expression may modify the variables it uses
+                    _forget_names(_referenced_names(node), names,
+                        script_info)
+                    continue
+                names[target.id] = value
+                continue
+
+        if _uses_name(node, 'script_info'):
+            raise DynamicScriptInfoError, "script_info is modified at " + \
+                                            "line %d" % node.lineno
+        # Any other statement can modify the variables it references (e.g.
+        # opts.append(...), opts[0] = ... or opts += ...)
+        _forget_names(_referenced_names(node), names, script_info)
+
+    if script_info is None:
+        raise DynamicScriptInfoError, "script_info not found in %s" % script_fp
+
+    return script_info
+
+def get_script_info(script_fp, sandbox=None):
+    """Returns the script_info dict of a script
+
+    Input:
+        script_fp: path to the script
+        sandbox: import_sandbox.ImportSandbox object used to import the
+            script in a child process. If None, the script is imported in the
+            current process
+
+    The script_info is statically extracted from the script source code. The
+    script is only imported if its script_info is built dynamically, so its
+    directory must be in the python path in that case if no sandbox is used.
+    """
+    try:
+        return extract_script_info(script_fp)
+    except (DynamicScriptInfoError, IOError):
+        if sandbox is not None:
+            return sandbox.get_script_info(script_fp)
+        dir_path, command = split(script_fp)
+        fname, ext = splitext(command)
+        return __import__(fname).script_info
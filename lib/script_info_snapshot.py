@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+# Snapshots of the script_info of a scripts tree. A snapshot stores, for each
+# script, the part of its script_info used to build an xml_generator
+# ScriptInfo object, with its options reduced to the attributes used by
+# OptionInfo (see import_sandbox.serialize_script_info). A snapshot exported
+# once per QIIME release lets the XML files be generated without a QIIME
+# installation and without importing any script.
+#
+# The snapshot is a JSON file, gzip compressed if its name ends in '.gz':
+#
+#   {"format": 1, "release": "1.9.0",
+#    "scripts": {"alpha_diversity.py": {"version": ..., ...}, ...}}
+
+import gzip
+import json
+from multiprocessing import Pool
+from os.path import abspath, split, splitext
+from site import addsitedir
+from StringIO import StringIO
+from atomic_write import write_if_changed
+from import_sandbox import serialize_script_info, deserialize_script_info
+from script_info_extractor import get_script_info
+from xml_generator import ScriptInfo
+
+# Version of the snapshot file format
+SNAPSHOT_FORMAT = 1
+
+# script_info keys stored in the snapshot, as used by xml_generator.ScriptInfo
+SNAPSHOT_KEYS = ['version', 'brief_description', 'script_description',
+                 'output_description', 'required_options', 'optional_options']
+
+class ScriptInfoSnapshot(object):
+    """Class modeling the script_info snapshot of a scripts tree
+
+    It is a read-only container of script names, iterated in sorted order
+    """
+    def __init__(self, scripts, release=None):
+        """Creates the ScriptInfoSnapshot object
+
+        Inputs:
+            scripts: dict of {script name: serialized script_info}
+            release: optional name of the release of the scripts
+        """
+        self._scripts = scripts
+        self.release = release
+
+    def get_entry(self, name):
+        """Returns the serialized script_info of the script 'name'"""
+        return self._scripts[name]
+
+    def get_script_info(self, name):
+        """Returns a new script_info dict of the script 'name'
+
+        Note: raises a ValueError if the script is not in the snapshot
+        """
+        if name not in self._scripts:
+            raise ValueError, "Script %s not in the snapshot" % name
+        return deserialize_script_info(self._scripts[name])
+
+    def to_json(self):
+        """Returns the snapshot as a compact JSON string"""
+        return json.dumps({'format': SNAPSHOT_FORMAT,
+            'release': self.release, 'scripts': self._scripts},
+            sort_keys=True, separators=(',', ':'))
+
+    def __contains__(self, name):
+        return name in self._scripts
+
+    def __iter__(self):
+        return iter(sorted(self._scripts))
+
+    def __len__(self):
+        return len(self._scripts)
+
+def save_snapshot(snapshot, snapshot_fp):
+    """Writes the snapshot to snapshot_fp
+
+    The file is gzip compressed if snapshot_fp ends in '.gz'. Returns the
+    change of the file (see atomic_write.write_if_changed).
+    """
+    contents = snapshot.to_json()
+    if snapshot_fp.endswith('.gz'):
+        buf = StringIO()
+        # A fixed mtime keeps the file unchanged if the snapshot is the same
+        f = gzip.GzipFile(filename='', mode='wb', fileobj=buf, mtime=0)
+        f.write(contents)
+        f.close()
+        contents = buf.getvalue()
+    return write_if_changed(snapshot_fp, contents)
+
+def load_snapshot(snapshot_fp):
+    """Loads the snapshot stored in snapshot_fp
+
+    Returns a ScriptInfoSnapshot object.
+
+    Note: raises a ValueError if the file is not a valid snapshot
+    """
+    if snapshot_fp.endswith('.gz'):
+        f = gzip.open(snapshot_fp, 'rb')
+    else:
+        f = open(snapshot_fp, 'U')
+    try:
+        data = json.load(f)
+    finally:
+        f.close()
+    if not isinstance(data, dict) or data.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError, "%s is not a script_info snapshot of format %d" % \
+            (snapshot_fp, SNAPSHOT_FORMAT)
+    return ScriptInfoSnapshot(data['scripts'], data.get('release'))
+
+def _export_script_task(task):
+    """Serializes the script_info of a single script
+
+    Input:
+        task: tuple of (script name, script_fp, sandbox)
+
+    Returns a tuple of (script name, serialized script_info, error). The
+    serialized script_info is checked by building its ScriptInfo object, so
+    the scripts that can't be integrated are reported at export time.
+
+    Note: it is used as the worker function of the export process pool, so
+        it never raises
+    """
+    name, script_fp, sandbox = task
+    try:
+        script_info = get_script_info(script_fp, sandbox)
+        data = serialize_script_info(dict([(key, script_info[key])
+            for key in SNAPSHOT_KEYS if key in script_info]))
+        data = json.loads(json.dumps(data))
+        ScriptInfo(deserialize_script_info(data), splitext(name)[0], name)
+        return name, data, None
+    except Exception as exc:
+        return name, None, str(type(exc)) + " : " + str(exc)
+
+def export_snapshot(scripts, release=None, jobs=1, sandbox=None):
+    """Builds the script_info snapshot of a list of scripts
+
+    Inputs:
+        scripts: list of (script name, script path) tuples
+        release: optional name of the release of the scripts
+        jobs: number of worker processes used to read the scripts
+        sandbox: import_sandbox.ImportSandbox object used to import the
+            scripts whose script_info is built dynamically. If None, they are
+            imported in the worker processes
+
+    Returns a tuple of (snapshot, errors), where snapshot is a
+    ScriptInfoSnapshot object with the scripts that could be read and errors
+    is a list of (script name, error) tuples with the rest.
+    """
+    tasks = []
+    for name, script_fp in scripts:
+        # The directory must be in the path if the script has to be imported
+        addsitedir(split(abspath(script_fp))[0])
+        tasks.append((name, script_fp, sandbox))
+
+    if jobs > 1:
+        pool = Pool(jobs)
+        try:
+            results = pool.map(_export_script_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map(_export_script_task, tasks)
+
+    entries = {}
+    errors = []
+    for name, data, error in results:
+        if error is None:
+            entries[name] = data
+        else:
+            errors.append((name, error))
+    return ScriptInfoSnapshot(entries, release), errors
@@ -10,21 +10,242 @@ __email__ = "josenavasmolina@gmail.com"
 __status__ = "Development"
 
 import tarfile
-from shutil import move
-from os import path
+import struct
+import zlib
+from collections import deque
+from copy import copy
+from multiprocessing.pool import ThreadPool
+from operator import attrgetter
+from shutil import move, rmtree, copyfile
+from os import path, makedirs, rename, chmod, link, symlink, stat
+from subprocess import Popen, PIPE
+from tempfile import mkdtemp
+from time import time
+from atomic_write import UMASK
 
 ERROR_MSG = "The input file is not a tar file!"
+XZ_ERROR_MSG = "The xz tool is not installed, unable to extract the input file"
 
-def compress_to_tgz(in_path, tgz_fp):
+# Magic bytes at the start of the compressed files, and their format
+MAGIC_BYTES = [('\x1f\x8b', 'gzip'),
+               ('BZh', 'bz2'),
+               ('\xfd7zXZ\x00', 'xz')]
+
+# Size of the blocks of the tar stream that are compressed in parallel
+GZIP_BLOCK_SIZE = 128 * 1024
+
+def _deflate_block(args):
+    """Compresses a block of data as a piece of a raw deflate stream
+
+    Input:
+        args: tuple of (data, compresslevel, last)
+
+    The blocks are compressed independently. All of them except the last one
+    end with a sync flush, so they are byte aligned and their concatenation
+    is a valid deflate stream.
+    """
+    data, compresslevel, last = args
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED,
+        -zlib.MAX_WBITS)
+    return compressor.compress(data) + \
+        compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+class ParallelGzipFile(object):
+    """Write-only file object that compresses its data on a thread pool
+
+    The data is split in blocks of GZIP_BLOCK_SIZE bytes that are compressed
+    in parallel, as pigz does. The result is a standard single member gzip
+    file, which can be read by any gzip reader.
+    """
+    def __init__(self, filename, compresslevel=9, threads=2,
+                    block_size=GZIP_BLOCK_SIZE):
+        """Creates the ParallelGzipFile object
+
+        Input:
+            filename: path to the output gzip file
+            compresslevel: the zlib compression level, from 1 to 9
+            threads: number of threads used to compress the blocks
+            block_size: size in bytes of the blocks compressed in parallel
+        """
+        self._out = open(filename, 'wb')
+
+        self.name = filename
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self._threads = threads
+        self._pool = ThreadPool(threads)
+        # Blocks being compressed, in the order they have to be written
+        self._pending = deque()
+        self._buffer = []
+        self._buffered = 0
+        self._crc = zlib.crc32("") & 0xffffffff
+        self._size = 0
+
+        # Gzip header: magic, deflate method, no flags, mtime, extra flags
+        # and unknown OS
+        xfl = "\002" if compresslevel == 9 else \
+                "\004" if compresslevel == 1 else "\000"
+        self._out.write("\037\213\010\000" + struct.pack("<L", long(time())) +
+            xfl + "\377")
+
+    def _submit(self, data, last):
+        """Queues the compression of a block"""
+        self._pending.append(self._pool.apply_async(_deflate_block,
+            ((data, self.compresslevel, last),)))
+        # Limit the blocks held in memory
+        while len(self._pending) > 2 * self._threads:
+            self._out.write(self._pending.popleft().get())
+
+    def write(self, data):
+        """Writes data to the gzip file"""
+        self._crc = zlib.crc32(data, self._crc) & 0xffffffff
+        self._size += len(data)
+        self._buffer.append(data)
+        self._buffered += len(data)
+
+        if self._buffered >= self.block_size:
+            data = "".join(self._buffer)
+            end = len(data) - len(data) % self.block_size
+            for start in range(0, end, self.block_size):
+                self._submit(data[start:start + self.block_size], False)
+            self._buffer = [data[end:]]
+            self._buffered = len(data) - end
+
+    def tell(self):
+        """Returns the number of uncompressed bytes written"""
+        return self._size
+
+    def close(self):
+        """Compresses the remaining data and writes the gzip trailer"""
+        if self._out.closed:
+            return
+        self._submit("".join(self._buffer), True)
+        self._buffer = []
+        while self._pending:
+            self._out.write(self._pending.popleft().get())
+        self._pool.close()
+        self._pool.join()
+
+        self._out.write(struct.pack("<LL", self._crc,
+            self._size & 0xffffffff))
+        self._out.close()
+
+def compress_to_tgz(in_path, tgz_fp, compresslevel=9, threads=1):
     """Generate a tgz file with the contents of the provided path
 
     Input:
         in_path: path to include in the tgz file
         tgz_fp: path to the result tgz file
+        compresslevel: the gzip compression level, from 1 to 9
+        threads: number of threads used to compress the tgz file
+
+    If threads is greater than 1, the tar stream is compressed in parallel
+    blocks (see ParallelGzipFile)
+    """
+    if threads > 1:
+        gz = ParallelGzipFile(tgz_fp, compresslevel, threads)
+        try:
+            t = tarfile.open(fileobj = gz, mode = 'w')
+            t.add(in_path, path.basename(in_path))
+            t.close()
+        finally:
+            gz.close()
+    else:
+        t = tarfile.open(name = tgz_fp, mode = 'w:gz',
+            compresslevel = compresslevel)
+        t.add(in_path, path.basename(in_path))
+        t.close()
+
+def _extract_member(t, member, output_dir, directories):
+    """Extracts a member of a tar stream as TarFile.extractall does
+
+    Inputs:
+        t: the tarfile.TarFile object
+        member: the tarfile.TarInfo object of the member to extract
+        output_dir: path to the directory where the member is extracted
+        directories: list where the directory members are appended. Their
+            attributes are set by _set_directories_attributes once all the
+            members have been extracted
+    """
+    if member.isdir():
+        directories.append(member)
+        # Extract directories with a safe mode, so their contents can be
+        # extracted even if they are read-only
+        member = copy(member)
+        member.mode = 0700
+    t.extract(member, output_dir)
+
+def _set_directory_attributes(t, member, dirpath):
+    """Sets the owner, modification time and mode of member to dirpath"""
+    try:
+        t.chown(member, dirpath)
+        t.utime(member, dirpath)
+        t.chmod(member, dirpath)
+    except tarfile.ExtractError:
+        pass
+
+def _set_directories_attributes(t, directories, output_dir):
+    """Sets the owner, modification time and mode of the extracted dirs"""
+    directories.sort(key=attrgetter('name'), reverse=True)
+    for member in directories:
+        _set_directory_attributes(t, member, path.join(output_dir,
+            member.name))
+
+def sniff_archive_format(fp):
+    """Returns the archive format of a file by looking at its first bytes
+
+    Input:
+        fp: path to the file
+
+    Returns 'gzip', 'bz2' or 'xz' if the file is compressed with one of those
+    formats, 'tar' if it starts with a valid tar header or None otherwise.
+    A compressed file is not necessarily a tar file: this is only known when
+    it is decompressed.
+    """
+    f = open(fp, 'rb')
+    header = f.read(tarfile.BLOCKSIZE)
+    f.close()
+
+    for magic, archive_format in MAGIC_BYTES:
+        if header.startswith(magic):
+            return archive_format
+
+    try:
+        tarfile.TarInfo.frombuf(header)
+    except tarfile.HeaderError:
+        return None
+    return 'tar'
+
+def link_or_copy(src, dst):
+    """Makes the contents of the file src available at dst without copying it
+
+    Inputs:
+        src: path to the source file
+        dst: path where the file will be available
+
+    If src and the directory of dst are in the same filesystem, dst is a hard
+    link to src or, if hard links are not allowed, a symbolic link. Otherwise,
+    src is copied to dst.
     """
-    t = tarfile.open(name = tgz_fp, mode = 'w:gz')
-    t.add(in_path, path.basename(in_path))
-    t.close()
+    dst_dir = path.dirname(path.abspath(dst))
+    if stat(src).st_dev == stat(dst_dir).st_dev:
+        try:
+            link(src, dst)
+            return
+        except OSError:
+            pass
+        try:
+            symlink(path.abspath(src), dst)
+            return
+        except OSError:
+            pass
+    copyfile(src, dst)
+
+def _close_xz(xz_proc):
+    """Closes the pipe with the xz process and waits for it to finish"""
+    if xz_proc is not None:
+        xz_proc.stdout.close()
+        xz_proc.wait()
 
 def extract_from_tgz(tgz_file, output_path):
     """Extract the contents of the tgz file in the provided output path
@@ -36,22 +257,108 @@ def extract_from_tgz(tgz_file, output_path):
     If the tgz_file only contains one file, it is extracted and renamed as the
     path indicated 'output_path'
 
-    Note: raises a ValueError if tgz_file is not a tgz_file
+    The tgz file is decompressed only once: it is read as a stream and the
+    layout of the output is decided when the second member header is read.
+    Until then, the first member is kept in a temporary directory next to
+    'output_path', which is moved into place without copying any data.
+
+    The tar file can be compressed with gzip, bzip2 or, if the xz tool is
+    installed, xz.
+
+    Note: raises a ValueError if tgz_file is not a tgz_file, or if it is
+        compressed with xz and the xz tool is not installed
         If there is any other error during the extraction, it propagates the
         error raised by tarfile
     """
-    try:
-        t = tarfile.open(name = tgz_file, mode = 'r')
-    except tarfile.ReadError:
+    archive_format = sniff_archive_format(tgz_file)
+    if archive_format is None:
         raise ValueError, ERROR_MSG
-    else:
-        names_list = t.getnames()
-        # if the tgz_file only has one file is not necessary to generate an
-        # output directory
-        if len(names_list) == 1:
-            t.extractall()
-            move(names_list[0], output_path)
+
+    xz_proc = None
+    if archive_format == 'xz':
+        # tarfile does not support xz, decompress it with the xz tool
+        try:
+            xz_proc = Popen(['xz', '-dc', tgz_file], stdout=PIPE)
+        except OSError:
+            raise ValueError, XZ_ERROR_MSG
+    try:
+        if xz_proc is not None:
+            t = tarfile.open(fileobj = xz_proc.stdout, mode = 'r|')
         else:
-            t.extractall(path=output_path)
+            t = tarfile.open(name = tgz_file, mode = 'r|*')
+        first = t.next()
+    except (tarfile.ReadError, OSError):
+        _close_xz(xz_proc)
+        raise ValueError, ERROR_MSG
+
+    try:
+        if first is None:
+            # Empty tgz file, nothing to extract
+            return
+
+        output_path = path.abspath(output_path)
+        directories = []
+        tmp_dir = mkdtemp(dir=path.dirname(output_path))
+        try:
+            _extract_member(t, first, tmp_dir, directories)
+            member = t.next()
+
+            if member is None:
+                # The tgz_file only has one file: it is not necessary to
+                # generate an output directory
+                move(path.join(tmp_dir, first.name), output_path)
+                if first.isdir():
+                    # The directory has been renamed as output_path
+                    _set_directory_attributes(t, first, output_path)
+                return
+
+            if path.exists(output_path):
+                # Move the first member inside the existing output directory
+                if first.isdir():
+                    if not path.exists(path.join(output_path, first.name)):
+                        makedirs(path.join(output_path, first.name))
+                else:
+                    first_dir = path.dirname(path.join(output_path,
+                        first.name))
+                    if not path.exists(first_dir):
+                        makedirs(first_dir)
+                    rename(path.join(tmp_dir, first.name),
+                        path.join(output_path, first.name))
+            else:
+                # The temporary directory becomes the output directory
+                chmod(tmp_dir, 0777 & ~UMASK)
+                rename(tmp_dir, output_path)
+
+            while member is not None:
+                _extract_member(t, member, output_path, directories)
+                member = t.next()
+
+            _set_directories_attributes(t, directories, output_path)
+        finally:
+            if path.exists(tmp_dir):
+                rmtree(tmp_dir)
+    finally:
         t.close()
-    
\ No newline at end of file
+        _close_xz(xz_proc)
+
+def extract_if_is_tgz(tgz_fp, output_path):
+    """Extracts the contents of tgz_fp if it is a tgz file
+
+    Inputs:
+        tgz_fp: path to the tgz file
+        output_path: path to the output directory or file
+
+    If tgz_fp is not a tgz file, links it (or copies it, see 'link_or_copy')
+        to output_path. The format is detected by the first bytes of the
+        file, so plain files are neither read nor copied
+
+    Note: propagates the errors from 'extract_from_tgz'
+    """
+    try:
+        extract_from_tgz(tgz_fp, output_path)
+    except ValueError, e:
+        # The input tgz_fp was a single file, link it as 'output_path'
+        if str(e) == ERROR_MSG:
+            link_or_copy(tgz_fp, output_path)
+        else:
+            raise ValueError, e
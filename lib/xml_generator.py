@@ -9,9 +9,18 @@ __maintainer__ = "Jose Antonio Navas Molina"
 __email__ = "josenavasmolina@gmail.com"
 __status__ = "Development"
 
-from os.path import splitext, split, join
+from os.path import splitext, split, join, abspath
 from os import remove
-from xml.dom.minidom import Document
+from glob import glob
+import fnmatch
+from multiprocessing import Pool
+from site import addsitedir
+from StringIO import StringIO
+from time import time
+from atomic_write import write_if_changed
+from import_sandbox import ImportSandbox, DEFAULT_TIMEOUT, DEFAULT_MEMORY_LIMIT
+from script_info_extractor import get_script_info
+from xml_stream_writer import XmlStreamWriter
 
 # Dict used for convert the cogent.util.option_parsing.CogentOption.TYPES
 # to Galaxy types
@@ -31,16 +40,20 @@ type_converter['new_dirpath'] = "output_dir"
 type_converter['new_path'] = "output_dir"
 type_converter['blast_db'] = "blast_db"
 
+# Galaxy types that are written in the outputs section of the XML
+OUTPUT_TYPES = ["output", "output_dir"]
+
 # Definitions for the command text
 COMMAND_LINE_COMPRESS = ";\ncompress_path.py -i %s -o $%s\n"
 COMMAND_LINE_UNCOMPRESS = "uncompress_tgz.py -i $%s -o %s;\n"
+# Cheetah function joining the paths of the datasets of a repeat option. The
+# paths are joined at once, so rendering is linear in the number of datasets.
+# It replaced a function concatenating the paths one by one: the template
+# text in the XML files changed, but the command rendered by Galaxy is the
+# same (see benchmarks/bench_repeat_template.py)
 LIST_DICT_TO_STRING_FUNCTION = """
 #def list_dict_to_string(list_dict):
-\t#set $file_list = list_dict[0]['additional_input'].__getattr__('file_name')
-\t#for d in list_dict[1:]:
-\t\t#set $file_list = $file_list + ',' + d['additional_input'].__getattr__('file_name')
-\t#end for
-\t#return $file_list
+\t#return ','.join([d['additional_input'].file_name for d in list_dict])
 #end def
 """
 GET_BLAST_DB_NAME = """
@@ -49,9 +62,78 @@ GET_BLAST_DB_NAME = """
  BLAST_DB_NAME=`get_blast_db_path.py -i blast_db`;
 #end if
 """
+# Definition for the command text when the blast databases are extracted in a
+# cache shared by all the jobs. The cache entry is held until the job shell
+# exits
+GET_BLAST_DB_NAME_CACHE = """
+#if str($%s) != 'None':
+ BLAST_DB_NAME=`get_blast_db_path.py -i $%s -c %s --hold_pid \$\$`;
+#end if
+"""
+# Galaxy extensions of the datasets passed through uncompress_tgz.py when the
+# inputs are linked: the archive formats that it extracts and the generic
+# datatypes, whose contents are sniffed by uncompress_tgz.py
+ARCHIVE_EXTS = ['tgz', 'tar', 'tar.gz', 'tar.bz2', 'tar.xz', 'gz', 'gzip',
+                'bz2', 'bzip2', 'xz', 'data', 'binary']
+# Definitions for the command text when the inputs are linked: only the
+# archive datasets are extracted, the rest are used from the Galaxy's dataset
+# path
+COMMAND_LINE_LINK = """#if $%s.ext in """ + str(ARCHIVE_EXTS) + """:
+uncompress_tgz.py -i $%s -o %s;
+#else:
+ln -s $%s %s;
+#end if
+"""
+GET_BLAST_DB_NAME_LINK = """
+#if str($%s) != 'None':
+#if $%s.ext in """ + str(ARCHIVE_EXTS) + """:
+ uncompress_tgz.py -i $%s -o blast_db;
+ BLAST_DB_NAME=`get_blast_db_path.py -i blast_db`;
+#else:
+ BLAST_DB_NAME=$%s;
+#end if
+#end if
+"""
+
+def _rebuild_model(cls, values):
+    """Rebuilds a pickled OptionInfo or ScriptInfo object"""
+    obj = cls.__new__(cls)
+    obj._set_fields(values)
+    return obj
+
+class _ImmutableModel(object):
+    """Base class of the immutable OptionInfo and ScriptInfo objects
 
-class OptionInfo(object):
+    The subclasses list their public attributes in _FIELDS and set them once
+    with _set_fields. The objects are pickled as the tuple of their field
+    values, so they cross process boundaries cheaply.
+    """
+    __slots__ = ()
+    _FIELDS = ()
+
+    def _set_fields(self, values):
+        """Sets the attributes listed in _FIELDS to values"""
+        for field, value in zip(self._FIELDS, values):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError, "%s objects are immutable" % \
+            self.__class__.__name__
+
+    def __delattr__(self, name):
+        raise AttributeError, "%s objects are immutable" % \
+            self.__class__.__name__
+
+    def __reduce__(self):
+        return _rebuild_model, (self.__class__, tuple([getattr(self, field)
+            for field in self._FIELDS]))
+
+class OptionInfo(_ImmutableModel):
     """Class modeling a script option from the Galaxy's XML point of view"""
+    _FIELDS = ('name', 'type', 'short_opt', 'long_opt', 'label', 'default',
+               'choices', 'format')
+    __slots__ = _FIELDS
+
     def __init__(self, option):
         """Creates the OptionInfo object from a cogent's option
 
@@ -61,51 +143,51 @@ class OptionInfo(object):
         Note: raises ValueError if the given option type is not defined in 
             Galaxy
         """
-        self.name = option.get_opt_string().replace("-", "")
+        name = option.get_opt_string().replace("-", "")
 
         # Type boolean is not defined in 
         # cogent.util.option_parsing.CogentOption.TYPES
         # The only way to know if it is boolean or not is looking at the
         # action attribute
         try:
-            self.type = "boolean" if option.action in ['store_true',
+            galaxy_type = "boolean" if option.action in ['store_true',
                             'store_false'] else type_converter[option.type]
         except KeyError:
             raise ValueError, "Option type %s not supported on Galaxy" \
                                 % option.type
 
         # We only need one item of the _short_opts and _long_opts lists
-        self.short_opt = option._short_opts[0] if len(option._short_opts) > 0 \
+        short_opt = option._short_opts[0] if len(option._short_opts) > 0 \
                                                 else None
-        self.long_opt = option._long_opts[0] if len(option._long_opts) > 0 \
+        long_opt = option._long_opts[0] if len(option._long_opts) > 0 \
                                                 else None
 
-        self.label = option.help
-
         # If the option is boolean, by default is unselected on Galaxy
         # (is not passed to the command)
-        self.default = None
-        if self.type == "boolean":
-            self.default = "False"
+        if galaxy_type == "boolean":
+            default = "False"
         else:
-            self.default = str(option.default) if option.default.__class__ != \
+            default = str(option.default) if option.default.__class__ != \
                                          tuple else None
 
-        if self.type == "select":
-            self.choices = option.choices
-        elif self.type == "multiple_select":
-            self.choices = option.mchoices
+        if galaxy_type == "select":
+            choices = option.choices
+        elif galaxy_type == "multiple_select":
+            choices = option.mchoices
         else:
-            self.choices = None
+            choices = None
 
         # Galaxy needs to know the format of the output.
         # If the output is a directory, we compress it and we pass to Galaxy
         # the tgz file.
-        self.format = None
-        if self.type == "output":
-            self.format = "txt"
-        elif self.type == "output_dir":
-            self.format = "tgz"
+        data_format = None
+        if galaxy_type == "output":
+            data_format = "txt"
+        elif galaxy_type == "output_dir":
+            data_format = "tgz"
+
+        self._set_fields((name, galaxy_type, short_opt, long_opt, option.help,
+            default, choices, data_format))
 
     def get_command_line_string(self):
         """Return the command line option"""
@@ -130,8 +212,16 @@ class OptionInfo(object):
         label += ": " + self.label.replace("%default", str(self.default))
         return label
 
-class ScriptInfo(object):
-    """Class modeling a script from Galaxy's point of view"""
+class ScriptInfo(_ImmutableModel):
+    """Class modeling a script from Galaxy's point of view
+
+    The required and optional options are kept as tuples, indexed by their
+    name, so looking up or removing an option does not scan them
+    """
+    _FIELDS = ('id', 'name', 'version', 'description', 'required_opts',
+               'optional_opts', 'help', 'command')
+    __slots__ = _FIELDS + ('_required_index', '_optional_index')
+
     def __init__(self, script_info_dict, script_name, command):
         """Creates the ScriptInfo object
 
@@ -144,55 +234,96 @@ class ScriptInfo(object):
             script_name: a string with the name of the script
             command: a string with the base command used to call the script
         """
-        self.id = script_name
-        self.name = script_name.replace("_", " ")
-        self.version = script_info_dict['version']
-        self.description = script_info_dict['brief_description']
-        self.required_opts = map(OptionInfo,
-            script_info_dict['required_options'])
+        required_opts = tuple(map(OptionInfo,
+            script_info_dict['required_options']))
         try:
-            self.optional_opts = map(OptionInfo,
-                script_info_dict['optional_options'])
+            optional_opts = tuple(map(OptionInfo,
+                script_info_dict['optional_options']))
         except KeyError:
-            self.optional_opts = []
-        self.help = '\n'.join([script_info_dict['script_description'],
-            script_info_dict['output_description']])
-        self.command = command
+            optional_opts = ()
+        self._set_fields((script_name, script_name.replace("_", " "),
+            script_info_dict['version'], script_info_dict['brief_description'],
+            required_opts, optional_opts,
+            '\n'.join([script_info_dict['script_description'],
+                script_info_dict['output_description']]), command))
+
+    def _set_fields(self, values):
+        """Sets the attributes listed in _FIELDS and builds the option index"""
+        _ImmutableModel._set_fields(self, values)
+        object.__setattr__(self, '_required_index',
+            dict([(opt.name, opt) for opt in self.required_opts]))
+        object.__setattr__(self, '_optional_index',
+            dict([(opt.name, opt) for opt in self.optional_opts]))
 
     def _get_optional_opt(self, name):
         """Returns the optional option called 'name' if it exists."""
-        for opt in self.optional_opts:
-            if opt.name == name:
-                return opt
-        return None
+        return self._optional_index.get(name)
+
+    def get_option(self, name):
+        """Returns the option called 'name', required or optional, or None"""
+        if name in self._required_index:
+            return self._required_index[name]
+        return self._optional_index.get(name)
+
+    def with_id(self, tool_id):
+        """Returns a ScriptInfo with the Galaxy tool id 'tool_id'
+
+        The object is not modified. If tool_id is None or it is the current
+        id, the same object is returned.
+        """
+        if tool_id is None or tool_id == self.id:
+            return self
+        values = [getattr(self, field) for field in self._FIELDS]
+        values[self._FIELDS.index('id')] = tool_id
+        return _rebuild_model(self.__class__, values)
 
     def remove_options(self, remove_opts):
-        """Remove the options listed at 'remove_opts'
+        """Returns a ScriptInfo without the options listed at 'remove_opts'
+
+        Input:
+            remove_opts: comma-separated string with the option names
+
+        The object is not modified. If remove_opts is empty, the same object
+        is returned.
 
         Note: raises 'ValueError' if one of the listed options does not exists
             or it is required by the script.
         """
-        if remove_opts:
-            opt_names = remove_opts.split(',')
+        if not remove_opts:
+            return self
 
-            for name in opt_names:
-                opt = self._get_optional_opt(name)
-                if opt:
-                    self.optional_opts.remove(opt)
-                else:
-                    raise ValueError, "Option %s does not exists or is"%name +\
-                                        " it a required option" 
+        opt_names = set(remove_opts.split(','))
+        for name in opt_names:
+            if name not in self._optional_index:
+                raise ValueError, "Option %s does not exists or is"%name +\
+                                    " it a required option"
 
+        values = [getattr(self, field) for field in self._FIELDS]
+        values[self._FIELDS.index('optional_opts')] = tuple([opt for opt in
+            self.optional_opts if opt.name not in opt_names])
+        return _rebuild_model(self.__class__, values)
 
 class CommandGenerator(object):
     """Class that generates the command line text for the 'command' tag"""
-    def __init__(self, info):
+    def __init__(self, info, link_inputs=False, blast_db_cache_dir=None):
         """Creates the CommandGenerator object
 
         Input:
             info: a ScriptInfo object
+            link_inputs: boolean showing if the input_dir and blast_db
+                datasets are only extracted when their Galaxy extension is
+                one of ARCHIVE_EXTS. Otherwise,
+                the input_dir dataset is symlinked into the job working
+                directory and the blast_db dataset path is used directly. If
+                False, all of them are passed through uncompress_tgz.py
+            blast_db_cache_dir: path to the blast database cache directory on
+                the Galaxy server. If provided, the blast_db datasets are
+                extracted in the cache, shared by all the jobs (see
+                blast_db_cache.BlastDbCache)
         """
         self.info = info
+        self.link_inputs = link_inputs
+        self.blast_db_cache_dir = blast_db_cache_dir
         self.command_text = self.info.command
 
         self._type_dependant_functions = {}
@@ -273,8 +404,16 @@ class CommandGenerator(object):
             option_string = "\n#if str($%s) != 'None':\n%s\n#end if\n" % \
                             (option.name, option_string)
 
-        self.command_text = GET_BLAST_DB_NAME % (option.name, option.name) + \
-            self.command_text + option_string
+        if self.blast_db_cache_dir:
+            get_blast_db_name = GET_BLAST_DB_NAME_CACHE % (option.name,
+                option.name, self.blast_db_cache_dir)
+        elif self.link_inputs:
+            get_blast_db_name = GET_BLAST_DB_NAME_LINK % ((option.name,) * 4)
+        else:
+            get_blast_db_name = GET_BLAST_DB_NAME % (option.name, option.name)
+
+        self.command_text = get_blast_db_name + self.command_text + \
+            option_string
 
     def _generate_integer_float_command_text(self, option):
         """Generate the command text for a option of type integer or float"""
@@ -356,27 +495,28 @@ class CommandGenerator(object):
         option_string += " " if option.is_short_command_line() else "="
         option_string += input_dir
 
-        self._uncompress_command = COMMAND_LINE_UNCOMPRESS % (option.name,
-            input_dir)
+        if self.link_inputs:
+            self._uncompress_command = COMMAND_LINE_LINK % (option.name,
+                option.name, input_dir, option.name, input_dir)
+        else:
+            self._uncompress_command = COMMAND_LINE_UNCOMPRESS % (option.name,
+                input_dir)
 
         self.command_text += option_string
 
 class XmlOptionsAttributesGenerator(object):
     """Class that generates the XML tags and attributes for the script options
     """
-    def __init__(self, info, doc, inputs, outputs):
+    def __init__(self, info, writer):
         """Creates the XmlOptionsAttributesGenerator object
 
         Input:
             info: a ScriptInfo object
-            doc: a xml.dom.minidom.Document object
-            inputs: the DOM element of 'doc' that models the script inputs
-            outputs: the DOM element of 'doc' that models the script outputs
+            writer: a xml_stream_writer.XmlStreamWriter object where the
+                option elements are written
         """
         self.info = info
-        self.doc = doc
-        self.inputs = inputs
-        self.outputs = outputs
+        self.writer = writer
 
         self._is_optional = False
 
@@ -407,229 +547,396 @@ class XmlOptionsAttributesGenerator(object):
                                     self._generate_blast_db_attributes
 
     def update(self):
-        """Updates the inputs and outputs node adding the script options"""
+        """Writes the inputs and outputs elements with the script options"""
+        self.writer.start_element("inputs")
+        self._write_options(outputs=False)
+        self.writer.end_element("inputs")
+
+        self.writer.start_element("outputs")
+        self._write_options(outputs=True)
+        self.writer.end_element("outputs")
+
+    def _write_options(self, outputs):
+        """Writes the elements of the input or the output options"""
         self._is_optional = False
         for option in self.info.required_opts:
-            self._type_dependant_functions[option.type](option)
+            if (option.type in OUTPUT_TYPES) == outputs:
+                self._type_dependant_functions[option.type](option)
 
         self._is_optional = True
         for option in self.info.optional_opts:
-            self._type_dependant_functions[option.type](option)
+            if (option.type in OUTPUT_TYPES) == outputs:
+                self._type_dependant_functions[option.type](option)
+
+    def _write_choices(self, option):
+        """Writes the option elements of a select or multiple select option"""
+        if self._is_optional:
+            self.writer.element("option", [("value", "None"),
+                ("selected", "True")], "Selection is Optional")
+
+        for choice in option.choices:
+            self.writer.element("option", [("value", choice)], choice)
 
     def _generate_integer_float_attributes(self, option):
         """Generate the XML node and attributes for an integer option"""
-        param = self.doc.createElement("param")
-        param.setAttribute("name", option.name)
-        param.setAttribute("type", option.type)
-        param.setAttribute("label", option.get_label())
-        param.setAttribute("optional", str(self._is_optional))
+        attrs = [("name", option.name), ("type", option.type),
+            ("label", option.get_label()),
+            ("optional", str(self._is_optional))]
 
         if option.has_default():
-            param.setAttribute("default", option.default)
+            attrs.append(("default", option.default))
         if not self._is_optional:
-            param.setAttribute("value", "0")
-
-        self.inputs.appendChild(param)
+            attrs.append(("value", "0"))
 
+        self.writer.element("param", attrs)
 
     def _generate_text_data_attributes(self, option):
         """Generate the XML node and attributes for a text, float or data option
         """
-        param = self.doc.createElement("param")
-        param.setAttribute("name", option.name)
-        param.setAttribute("type", option.type)
-        param.setAttribute("label", option.get_label())
-        param.setAttribute("optional", str(self._is_optional))
+        attrs = [("name", option.name), ("type", option.type),
+            ("label", option.get_label()),
+            ("optional", str(self._is_optional))]
 
         if option.has_default():
-            param.setAttribute("default", option.default)
+            attrs.append(("default", option.default))
 
-        self.inputs.appendChild(param)
+        self.writer.element("param", attrs)
 
     def _generate_blast_db_attributes(self, option):
         """Generate the XML node and attributes for a text, float or data option
         """
-        param = self.doc.createElement("param")
-        param.setAttribute("name", option.name)
-        param.setAttribute("type", "data")
-        param.setAttribute("label", option.get_label())
-        param.setAttribute("optional", str(self._is_optional))
+        attrs = [("name", option.name), ("type", "data"),
+            ("label", option.get_label()),
+            ("optional", str(self._is_optional))]
 
         if option.has_default():
-            param.setAttribute("default", option.default)
+            attrs.append(("default", option.default))
 
-        self.inputs.appendChild(param)
+        self.writer.element("param", attrs)
 
     def _generate_input_dir_attributes(self, option):
         """Generate the XML node and attributes for an input_dir option"""
-        param = self.doc.createElement("param")
-        param.setAttribute("name", option.name)
-        param.setAttribute("type", "data")
-        param.setAttribute("label", option.get_label())
-
-        self.inputs.appendChild(param)
+        self.writer.element("param", [("name", option.name), ("type", "data"),
+            ("label", option.get_label())])
 
     def _generate_select_attributes(self, option):
         """Generate the XML node and attributes for a select option"""
-        param = self.doc.createElement("param")
-        param.setAttribute("name", option.name)
-        param.setAttribute("type", option.type)
-        param.setAttribute("label", option.get_label())
-
-        if self._is_optional:
-            opt = self.doc.createElement("option")
-            opt.setAttribute("value", "None")
-            opt.setAttribute("selected", "True")
-            opt_text = self.doc.createTextNode("Selection is Optional")
-            opt.appendChild(opt_text)
-            param.appendChild(opt)
-
-        for choice in option.choices:
-            opt = self.doc.createElement("option")
-            opt.setAttribute("value", choice)
-            opt_text = self.doc.createTextNode(choice)
-            opt.appendChild(opt_text)
-            param.appendChild(opt)
-
-        param.setAttribute("optional", str(self._is_optional))
-        self.inputs.appendChild(param)
+        self.writer.start_element("param", [("name", option.name),
+            ("type", option.type), ("label", option.get_label()),
+            ("optional", str(self._is_optional))])
+        self._write_choices(option)
+        self.writer.end_element("param")
 
     def _generate_multiple_select_attributes(self, option):
         """Generate the XML node and attributes for a multiple select option"""
-        param = self.doc.createElement("param")
-        param.setAttribute("name", option.name)
-        param.setAttribute("type", "select")
-        param.setAttribute("label", option.get_label())
-        param.setAttribute("multiple", "True")
-
-        if self._is_optional:
-            opt = self.doc.createElement("option")
-            opt.setAttribute("value", "None")
-            opt.setAttribute("selected", "True")
-            opt_text = self.doc.createTextNode("Selection is Optional")
-            opt.appendChild(opt_text)
-            param.appendChild(opt)
-
-        for choice in option.choices:
-            opt = self.doc.createElement("option")
-            opt.setAttribute("value", choice)
-            opt_text = self.doc.createTextNode(choice)
-            opt.appendChild(opt_text)
-            param.appendChild(opt)
-
-        param.setAttribute("optional", str(self._is_optional))
-        self.inputs.appendChild(param)
+        self.writer.start_element("param", [("name", option.name),
+            ("type", "select"), ("label", option.get_label()),
+            ("multiple", "True"), ("optional", str(self._is_optional))])
+        self._write_choices(option)
+        self.writer.end_element("param")
 
     def _generate_repeat_attributes(self, option):
         """Generate the XML node and attributes for a repeat option"""
-        repeat = self.doc.createElement("repeat")
-        repeat.setAttribute("name", "input_files_%s" % option.name)
-        repeat.setAttribute("title", option.name)
-        repeat.setAttribute("optional", str(self._is_optional))
-
-        param = self.doc.createElement("param")
-        param.setAttribute("name", "additional_input")
-        param.setAttribute("type", "data")
-        param.setAttribute("label", option.get_label())
-
-        repeat.appendChild(param)
-        self.inputs.appendChild(repeat)
-        
+        self.writer.start_element("repeat", [
+            ("name", "input_files_%s" % option.name), ("title", option.name),
+            ("optional", str(self._is_optional))])
+        self.writer.element("param", [("name", "additional_input"),
+            ("type", "data"), ("label", option.get_label())])
+        self.writer.end_element("repeat")
+
     def _generate_output_attributes(self, option):
         """Generate the XML node and attributes for an output option"""
-        data = self.doc.createElement("data")
-        data.setAttribute("name", option.name)
-        data.setAttribute("format", option.format)
-        self.outputs.appendChild(data)
+        self.writer.element("data", [("name", option.name),
+            ("format", option.format)])
 
     def _generate_boolean_attributes(self, option):
         """Generate the XML node and attributes for a boolean option"""
-        param = self.doc.createElement("param")
-        param.setAttribute("type", option.type)
-        param.setAttribute("name", option.name)
-        param.setAttribute("label", option.get_label())
-        param.setAttribute("selected", option.default)
-        self.inputs.appendChild(param)
-
-def generate_xml_string(info):
-    """Generate the xml string for a given script
+        self.writer.element("param", [("type", option.type),
+            ("name", option.name), ("label", option.get_label()),
+            ("selected", option.default)])
+
+def write_tool(info, writer, link_inputs=False, blast_db_cache_dir=None,
+        release=None):
+    """Write the xml document for a given script using the given writer
 
     Input:
         info: a ScriptInfo object
+        writer: object with the xml_stream_writer.XmlStreamWriter interface
+        link_inputs: boolean showing if the command links the input datasets
+            instead of extracting them (see CommandGenerator)
+        blast_db_cache_dir: path to the blast database cache directory used
+            by the command (see CommandGenerator)
+        release: name of the QIIME release required by the tool. If None,
+            the qiime package requirement is not versioned
     """
-    doc = Document()
+    writer.start_document()
 
     # Setting tool attributes
-    tool = doc.createElement("tool")
-    tool.setAttribute("id", info.id)
-    tool.setAttribute("name", info.name)
-    tool.setAttribute("version", info.version)
-    doc.appendChild(tool)
+    writer.start_element("tool", [("id", info.id), ("name", info.name),
+        ("version", info.version)])
 
     # Setting description attributes
-    description = doc.createElement("description")
-    descr_text = doc.createTextNode(info.description)
-    description.appendChild(descr_text)
-    tool.appendChild(description)
+    writer.element("description", text=info.description)
 
     # Setting requirements attributes
-    requirements = doc.createElement("requirements")
-    req = doc.createElement("requirement")
-    req.setAttribute("type", "package")
-    req_text = doc.createTextNode("qiime")
-    req.appendChild(req_text)
-    requirements.appendChild(req)
-    tool.appendChild(requirements)
+    writer.start_element("requirements")
+    requirement_attrs = [("type", "package")]
+    if release is not None:
+        requirement_attrs.append(("version", release))
+    writer.element("requirement", requirement_attrs, "qiime")
+    writer.end_element("requirements")
 
     # Setting command attributes
-    command = doc.createElement("command")
-    command_generator = CommandGenerator(info)
+    command_generator = CommandGenerator(info, link_inputs,
+        blast_db_cache_dir)
     command_generator.update()
-    command_text = doc.createTextNode(command_generator.command_text)
-    command.appendChild(command_text)
-    tool.appendChild(command)
+    writer.element("command", text=command_generator.command_text)
 
     # Setting inputs and outputs attributes
-    inputs = doc.createElement("inputs")
-    outputs = doc.createElement("outputs")
-    xml_options_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                            outputs)
+    xml_options_generator = XmlOptionsAttributesGenerator(info, writer)
     xml_options_generator.update()
-    tool.appendChild(inputs)
-    tool.appendChild(outputs)
 
     # Setting help attributes
-    help = doc.createElement("help")
-    help_text = doc.createTextNode(info.help)
-    help.appendChild(help_text)
-    tool.appendChild(help)
+    writer.element("help", text=info.help)
 
-    return doc.toprettyxml(indent="\t")
+    writer.end_element("tool")
+    writer.end_document()
 
-def make_xml(script_fp, output_dir, remove_opts):
-    """Generate the XML file for a given script
+def write_xml(info, out, pretty=True, link_inputs=False,
+        blast_db_cache_dir=None, release=None):
+    """Write the xml document for a given script
+
+    Input:
+        info: a ScriptInfo object
+        out: file object where the xml document is written
+        pretty: boolean showing if the document is indented. If True, the
+            output is byte-for-byte the same as the one generated by
+            xml.dom.minidom's toprettyxml. Otherwise, it is written in a
+            compact form
+        link_inputs: boolean showing if the command links the input datasets
+            instead of extracting them (see CommandGenerator)
+        blast_db_cache_dir: path to the blast database cache directory used
+            by the command (see CommandGenerator)
+        release: name of the QIIME release required by the tool (see
+            write_tool)
+    """
+    write_tool(info, XmlStreamWriter(out, pretty), link_inputs,
+        blast_db_cache_dir, release)
+
+def generate_xml_string(info, pretty=True, link_inputs=False,
+        blast_db_cache_dir=None, release=None):
+    """Generate the xml string for a given script
+
+    Input:
+        info: a ScriptInfo object
+        pretty: boolean showing if the document is indented (see write_xml)
+        link_inputs: boolean showing if the command links the input datasets
+            instead of extracting them (see CommandGenerator)
+        blast_db_cache_dir: path to the blast database cache directory used
+            by the command (see CommandGenerator)
+        release: name of the QIIME release required by the tool (see
+            write_tool)
+    """
+    out = StringIO()
+    write_xml(info, out, pretty, link_inputs, blast_db_cache_dir, release)
+    return out.getvalue()
+
+def load_script_info(script_fp, remove_opts, sandbox=None, snapshot=None):
+    """Returns the ScriptInfo object of a given script
 
     Input:
         script_fp: path to the script
-        output_dir: folder where to store the XML file
         remove_opts: list of option names that won't be included in the
             Galaxy's interface
+        sandbox: import_sandbox.ImportSandbox object used to import the
+            script if needed. If None, it is imported in the current process
+        snapshot: script_info_snapshot.ScriptInfoSnapshot object. If given,
+            the script_info is read from the snapshot, by the script file
+            name, and the script is never read nor imported
+
+    Note: if the script_info of the script is built dynamically, the script
+        is imported, so its directory must be in the python path if no
+        sandbox is used
     """
     dir_path, command = split(script_fp)
     fname, ext = splitext(command)
 
-    script = __import__(fname)
-
     # Create the script info
-    info = ScriptInfo(script.script_info, fname, command)
+    if snapshot is not None:
+        script_info = snapshot.get_script_info(command)
+    else:
+        script_info = get_script_info(script_fp, sandbox)
+    info = ScriptInfo(script_info, fname, command)
 
     # Remove the options that the user does not want to appear in the XML
-    info.remove_options(remove_opts)
+    return info.remove_options(remove_opts)
+
+def make_xml_string(script_fp, remove_opts, link_inputs=False,
+        blast_db_cache_dir=None, sandbox=None, snapshot=None):
+    """Generate the XML string for a given script
+
+    Input:
+        script_fp: path to the script
+        remove_opts: list of option names that won't be included in the
+            Galaxy's interface
+        link_inputs: boolean showing if the command links the input datasets
+            instead of extracting them (see CommandGenerator)
+        blast_db_cache_dir: path to the blast database cache directory used
+            by the command (see CommandGenerator)
+        sandbox: import_sandbox.ImportSandbox object used to import the
+            script if needed (see load_script_info)
+        snapshot: script_info snapshot the script is read from, if given
+            (see load_script_info)
+
+    Note: if the script_info of the script is built dynamically, the script
+        is imported, so its directory must be in the python path if no
+        sandbox is used
+    """
+    info = load_script_info(script_fp, remove_opts, sandbox, snapshot)
 
     # Get the xml string
-    string_xml = generate_xml_string(info)
+    return generate_xml_string(info, link_inputs=link_inputs,
+        blast_db_cache_dir=blast_db_cache_dir)
+
+def make_xml(script_fp, output_dir, remove_opts, link_inputs=False,
+        blast_db_cache_dir=None, sandbox=None, snapshot=None):
+    """Generate the XML file for a given script
+
+    Input:
+        script_fp: path to the script
+        output_dir: folder where to store the XML file
+        remove_opts: list of option names that won't be included in the
+            Galaxy's interface
+        link_inputs: boolean showing if the command links the input datasets
+            instead of extracting them (see CommandGenerator)
+        blast_db_cache_dir: path to the blast database cache directory used
+            by the command (see CommandGenerator)
+        sandbox: import_sandbox.ImportSandbox object used to import the
+            script if needed (see load_script_info)
+        snapshot: script_info snapshot the script is read from, if given
+            (see load_script_info)
+
+    Returns None if the XML file was already up to date, "new" if it was
+    created or "modified" if it was replaced. The XML is not streamed to the
+    file: it is generated in memory (see generate_xml_string) and the file
+    is replaced atomically, only if its contents change (see
+    atomic_write.write_if_changed).
+    """
+    info = load_script_info(script_fp, remove_opts, sandbox, snapshot)
+
+    # Generate the xml string and write it to the file if it changed
+    return write_if_changed(join(output_dir, info.id+".xml"),
+        generate_xml_string(info, link_inputs=link_inputs,
+            blast_db_cache_dir=blast_db_cache_dir))
+
+def expand_script_fps(script_fps, snapshot=None):
+    """Returns the list of scripts given by a list of paths and glob patterns
+
+    Input:
+        script_fps: list of script paths and glob patterns
+        snapshot: script_info_snapshot.ScriptInfoSnapshot object. If given,
+            the file name of each pattern is matched against the script names
+            of the snapshot instead of the filesystem
+
+    The paths matched by each pattern are sorted and the duplicates removed.
+    A pattern that does not match any path is kept, so its error is reported.
+    """
+    result = []
+    for pattern in script_fps:
+        if snapshot is not None:
+            matches = fnmatch.filter(snapshot, split(pattern)[1])
+        else:
+            matches = glob(pattern)
+        for script_fp in sorted(matches) or [pattern]:
+            if script_fp not in result:
+                result.append(script_fp)
+    return result
+
+def _make_xml_task(task):
+    """Generates the XML file of a single script
+
+    Input:
+        task: tuple of (script_fp, output_dir, remove_opts, link_inputs,
+            blast_db_cache_dir, sandbox, snapshot)
 
-    # Create the xml file
-    outf = open(join(output_dir, fname+".xml"), 'w')
-    outf.write(string_xml)
-    outf.close()
+    Returns a dict with the script path ('script_fp'), a boolean showing if
+    the XML file was generated ('ok'), the change of the XML file
+    ('change', see make_xml), the error if it was not generated ('error') and
+    the time spent in seconds ('elapsed').
+
+    Note: it is used as the worker function of the make_xmls process pool,
+        so it never raises
+    """
+    script_fp, output_dir, remove_opts, link_inputs, blast_db_cache_dir, \
+        sandbox, snapshot = task
+    start = time()
+    change = None
+    try:
+        change = make_xml(script_fp, output_dir, remove_opts, link_inputs,
+            blast_db_cache_dir, sandbox, snapshot)
+        ok, error = True, None
+    except Exception as exc:
+        ok, error = False, str(type(exc)) + " : " + str(exc)
+    return {'script_fp': script_fp, 'ok': ok, 'change': change,
+            'error': error, 'elapsed': time() - start}
+
+def make_xmls(script_fps, output_dir, remove_opts_map=None,
+        default_remove_opts=None, jobs=1, link_inputs=False,
+        blast_db_cache_dir=None, sandbox_imports=True,
+        import_timeout=DEFAULT_TIMEOUT,
+        import_memory_limit=DEFAULT_MEMORY_LIMIT, snapshot=None):
+    """Generate the XML files for a list of scripts
+
+    Input:
+        script_fps: list of script paths and glob patterns
+        output_dir: folder where to store the XML files
+        remove_opts_map: dict of {script name: remove_opts} with the option
+            names of each script that won't be included in the Galaxy's
+            interface, as in the configuration file
+        default_remove_opts: remove_opts of the scripts not present in
+            remove_opts_map
+        jobs: number of worker processes used to generate the XML files
+        link_inputs: boolean showing if the command links the input datasets
+            instead of extracting them (see CommandGenerator)
+        blast_db_cache_dir: path to the blast database cache directory used
+            by the command (see CommandGenerator)
+        sandbox_imports: if True, the scripts that have to be imported are
+            imported in child processes (see import_sandbox.ImportSandbox), so
+            their modules do not accumulate in the worker processes
+        import_timeout: maximum time, in seconds, to import a script
+        import_memory_limit: maximum address space, in MB, of the process
+            importing a script. If 0, there is no limit
+        snapshot: script_info_snapshot.ScriptInfoSnapshot object. If given,
+            the scripts are read from the snapshot by their file name (see
+            expand_script_fps) and nothing is imported. As there is no import
+            to distribute, the XML files are generated in the current process
+
+    Returns a list with the result of each script (see _make_xml_task), in the
+    same order as the expanded script_fps. The failure of a script does not
+    stop the generation of the rest.
+    """
+    remove_opts_map = remove_opts_map or {}
+    script_fps = expand_script_fps(script_fps, snapshot)
+    sandbox = None
+    if sandbox_imports and snapshot is None:
+        sandbox = ImportSandbox(import_timeout, import_memory_limit)
+
+    tasks = []
+    for script_fp in script_fps:
+        if snapshot is None:
+            # The directory must be in the path if the script is imported
+            addsitedir(split(abspath(script_fp))[0])
+        remove_opts = remove_opts_map.get(split(script_fp)[1],
+            default_remove_opts)
+        tasks.append((script_fp, output_dir, remove_opts, link_inputs,
+            blast_db_cache_dir, sandbox, snapshot))
+
+    if jobs > 1 and snapshot is None:
+        pool = Pool(jobs)
+        try:
+            return pool.map(_make_xml_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        return map(_make_xml_task, tasks)
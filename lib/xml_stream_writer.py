@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+def escape(data):
+    """Escapes the XML special characters the same way xml.dom.minidom does"""
+    return data.replace("&", "&amp;").replace("<", "&lt;").\
+                replace("\"", "&quot;").replace(">", "&gt;")
+
+class XmlStreamWriter(object):
+    """Class that writes an XML document incrementally to a file object
+
+    The document is written as the elements are started and ended, without
+    building it in memory. In pretty mode, the output is byte-for-byte the
+    same as xml.dom.minidom's toprettyxml(indent="\\t") of the equivalent
+    document: sorted attributes, one node per line and elements whose only
+    child is a text node written in a single line. Otherwise, the document is
+    written without any indentation and the attributes keep their order.
+    """
+    def __init__(self, out, pretty=True, indent="\t", newl="\n"):
+        """Creates the XmlStreamWriter object
+
+        Input:
+            out: file object where the XML document is written
+            pretty: boolean showing if the document is indented as minidom's
+                toprettyxml does
+            indent: string used to indent each level in pretty mode
+            newl: string written at the end of each line in pretty mode
+        """
+        self.out = out
+        self.pretty = pretty
+        self._indent = indent if pretty else ""
+        self._newl = newl if pretty else ""
+        # Stack with the names of the open elements
+        self._stack = []
+        # The start tag of the last started element is not closed until we
+        # know if it has children
+        self._open_tag = False
+        # Text of the last open element, which is written when we know if
+        # it is its only child
+        self._pending_text = None
+
+    def _flush(self):
+        """Writes the pending start tag and text of the current element"""
+        if self._open_tag:
+            self.out.write(">")
+            self._open_tag = False
+            if self._pending_text is None:
+                self.out.write(self._newl)
+        if self._pending_text is not None:
+            self.out.write(self._newl)
+            self._write_text(self._pending_text)
+            self._pending_text = None
+
+    def _write_text(self, data):
+        """Writes the text node 'data' in its own line"""
+        self.out.write(escape("%s%s%s" % (self._indent * len(self._stack),
+            data, self._newl)))
+
+    def start_document(self):
+        """Writes the XML declaration"""
+        self.out.write('<?xml version="1.0" ?>' + self._newl)
+
+    def end_document(self):
+        """Checks that all the elements have been ended
+
+        Note: raises a ValueError if there is any element not ended
+        """
+        if self._stack:
+            raise ValueError, "Element %s not ended" % self._stack[-1]
+
+    def start_element(self, name, attrs=None):
+        """Writes the start tag of an element
+
+        Input:
+            name: the element tag name
+            attrs: list of (name, value) tuples with the element attributes
+        """
+        self._flush()
+
+        attrs = list(attrs) if attrs else []
+        if self.pretty:
+            attrs.sort()
+
+        self.out.write(self._indent * len(self._stack) + "<" + name)
+        for attr_name, value in attrs:
+            self.out.write(' %s="%s"' % (attr_name, escape(value)))
+
+        self._stack.append(name)
+        self._open_tag = True
+
+    def end_element(self, name):
+        """Writes the end tag of the current element
+
+        Note: raises a ValueError if 'name' is not the current element
+        """
+        if not self._stack or self._stack[-1] != name:
+            raise ValueError, "Element %s is not the current element" % name
+        self._stack.pop()
+
+        if self._open_tag and self._pending_text is None:
+            # Element without children
+            self.out.write("/>" + self._newl)
+            self._open_tag = False
+        elif self._open_tag:
+            # Element whose only child is a text node: single line
+            self.out.write(">" + escape(self._pending_text))
+            self.out.write("</%s>%s" % (name, self._newl))
+            self._open_tag = False
+            self._pending_text = None
+        else:
+            self.out.write("%s</%s>%s" % (self._indent * len(self._stack),
+                name, self._newl))
+
+    def text(self, data):
+        """Writes a text node inside the current element"""
+        if self._open_tag and self._pending_text is None:
+            self._pending_text = data
+        else:
+            self._flush()
+            self._write_text(data)
+
+    def element(self, name, attrs=None, text=None):
+        """Writes a whole element, optionally containing a text node
+
+        Input:
+            name: the element tag name
+            attrs: list of (name, value) tuples with the element attributes
+            text: string with the text of the element
+        """
+        self.start_element(name, attrs)
+        if text is not None:
+            self.text(text)
+        self.end_element(name)
@@ -9,9 +9,9 @@ __maintainer__ = "Jose Antonio Navas Molina"
 __email__ = "josenavasmolina@gmail.com"
 __status__ = "Development"
 
-from cogent.util.option_parsing import (parse_command_line_parameters,
-                                        make_option)
-from tgz_manager import compress_to_tgz
+from fast_option_parsing import (parse_command_line_parameters,
+                                 make_option)
+from helper_daemon import call_helper
 
 script_info = {}
 script_info['brief_description'] = """Generate a tgz file with the contents of\
@@ -31,12 +31,26 @@ script_info['required_options'] = [
     make_option('-o', '--output_tgz', type="new_filepath",
                 help='File path of the output tgz file')
 ]
-script_info['optional_options'] = []
+script_info['optional_options'] = [
+    make_option('-l', '--compression_level', type="int", default=9,
+                help='gzip compression level, from 1 (fastest) to 9 (best)' +
+                    ' [default: %default]'),
+    make_option('-t', '--threads', type="int", default=1,
+                help='Number of threads used to compress the tgz file' +
+                    ' [default: %default]')
+]
 script_info['version'] = __version__
 
 if __name__ == '__main__':
     option_parser, opts, args = parse_command_line_parameters(**script_info)
     input_path = opts.input_path
     tgz_fp = opts.output_tgz
+    compresslevel = opts.compression_level
+    threads = opts.threads
+
+    if compresslevel < 1 or compresslevel > 9:
+        option_parser.error("compression_level must be between 1 and 9")
+    if threads < 1:
+        option_parser.error("threads must be greater than 0")
 
-    compress_to_tgz(input_path, tgz_fp)
\ No newline at end of file
+    call_helper('compress', [input_path, tgz_fp, compresslevel, threads])
\ No newline at end of file
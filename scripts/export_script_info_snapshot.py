@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.option_parsing import (parse_command_line_parameters,
+                                        make_option)
+import sys
+from galaxy_integration import find_configured_scripts, walk_scripts_dir
+from import_sandbox import ImportSandbox
+from integration_config import load_config
+from script_info_snapshot import export_snapshot, save_snapshot
+
+script_info = {}
+script_info['brief_description'] = """Exports the script_info of a scripts\
+ directory to a snapshot file"""
+script_info['script_description'] = """Reads the 'script_info' of the scripts\
+ in the input directory and stores the information needed to generate their\
+ Galaxy XML files in a single JSON file, gzip compressed if its name ends in\
+ '.gz'. make_xml.py and integrate_on_galaxy.py can then generate the XML files\
+ from the snapshot without a QIIME installation.
+If a configuration file is given, only its scripts are exported and the script\
+ exits with an error status if any of them can't be exported. Otherwise, all\
+ the python files of the directory tree are exported and the ones without a\
+ valid script_info are only reported."""
+script_info['script_usage'] = [("Example:",
+"Export the script_info of the QIIME 1.9.0 scripts listed in the configuration\
+ file 'QIIME_1.9.0.conf' using 4 processes.",
+"%prog -i qiime/scripts -c QIIME_1.9.0.conf -r 1.9.0 -o qiime_1.9.0.json.gz\
+ -j 4")]
+script_info['output_description'] = "A JSON file with the script_info of each\
+ script"
+script_info['required_options'] = [
+    make_option('-i', '--input_dir', type="existing_dirpath",
+                help='directory containing the scripts to export'),
+    make_option('-o', '--output_fp', type="new_filepath",
+                help='output snapshot file path. It is gzip compressed if' +
+                    ' it ends in .gz')
+]
+script_info['optional_options'] = [
+    make_option('-c', '--config_file', type="existing_filepath",
+                help='Galaxy-QIIME configuration file with the scripts to' +
+                    ' export. By default, all the python files of' +
+                    ' input_dir are exported'),
+    make_option('-r', '--release', type="string",
+                help='Name of the release of the scripts, stored in the' +
+                    ' snapshot'),
+    make_option('-j', '--jobs', type='int', default=1,
+                help='Number of worker processes used to read the scripts' +
+                    ' [default: %default]'),
+    make_option('--no_import_sandbox', action='store_true', default=False,
+                help='By default, the scripts whose script_info is built' +
+                    ' dynamically are imported in a child process. Use this' +
+                    ' option to import them in the worker processes.'),
+    make_option('--import_timeout', type='int', default=120,
+                help='Maximum time, in seconds, to import a script' +
+                    ' [default: %default]'),
+    make_option('--import_memory_limit', type='int', default=0,
+                help='Maximum address space, in MB, of the process' +
+                    ' importing a script. It limits the virtual memory of' +
+                    ' the process, not its RSS. Use 0 for no limit' +
+                    ' [default: %default]'),
+]
+script_info['version'] = __version__
+
+if __name__ == '__main__':
+    option_parser, opts, args = parse_command_line_parameters(**script_info)
+    input_dir = opts.input_dir
+    output_fp = opts.output_fp
+    config_file = opts.config_file
+    release = opts.release
+    jobs = opts.jobs
+
+    if jobs < 1:
+        option_parser.error("jobs must be greater than 0")
+
+    sandbox = None
+    if not opts.no_import_sandbox:
+        sandbox = ImportSandbox(opts.import_timeout, opts.import_memory_limit)
+
+    missing = []
+    if config_file:
+        scripts, missing = find_configured_scripts(input_dir,
+            list(load_config(config_file)))
+    else:
+        scripts = walk_scripts_dir(input_dir)
+
+    snapshot, errors = export_snapshot(scripts, release, jobs, sandbox)
+    save_snapshot(snapshot, output_fp)
+
+    for name in missing:
+        print "%s: missing - not in input directory" % name
+    for name, error in errors:
+        print "%s: %s" % (name, error)
+    print "%d scripts exported to %s" % (len(snapshot), output_fp)
+
+    if config_file and (missing or errors):
+        sys.exit(1)
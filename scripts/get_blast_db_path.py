@@ -9,9 +9,9 @@ __maintainer__ = "Jose Antonio Navas Molina"
 __email__ = "josenavasmolina@gmail.com"
 __status__ = "Development"
 
-from cogent.util.option_parsing import (parse_command_line_parameters, 
-                                        make_option)
-from format_blast_db_string import format_blast_db_string
+from fast_option_parsing import (parse_command_line_parameters,
+                                 make_option)
+from helper_daemon import call_helper
 
 script_info = {}
 script_info['brief_description'] = "Prints to standard output the path to a \
@@ -23,7 +23,15 @@ script_info['script_description'] = """This script takes a path and it\
 script_info['script_usage'] = [("Example:",
 "Extract the content of the tgz file named 'in.tgz' into the\
  directory 'out_dir'",
-"%prog -i in.tgz -o out_dir")]
+"%prog -i in.tgz -o out_dir"),
+("Cached example:", "Print the base path of the blast database in the tgz\
+ file 'db.tgz', extracting it in the cache directory 'db_cache' if it was not\
+ extracted before",
+"%prog -i db.tgz -c db_cache"),
+("Held example:", "Print the base path of the blast database in the tgz\
+ file 'db.tgz', which is not evicted from the cache while the current shell\
+ runs",
+"%prog -i db.tgz -c db_cache --hold_pid $$")]
 script_info['output_description'] = """Prints through standard output the base\
  path of the blast database or the path to the reference sequence file,\
  depending on the input path"""
@@ -31,12 +39,44 @@ script_info['required_options'] = [
     make_option('-i', '--input_path', type="existing_path",
                 help='Path to check')
 ]
-script_info['optional_options'] = []
+script_info['optional_options'] = [
+    make_option('-c', '--cache_dir', type="string",
+                help='Directory of the blast database cache. If provided,' +
+                    ' input_path can be a tgz file with the blast database,' +
+                    ' which is extracted in the cache only the first time' +
+                    ' it is used.'),
+    make_option('--hold_pid', type="int",
+                help='Id of the process using the blast database, usually' +
+                    ' the shell of the job. If provided with cache_dir, the' +
+                    ' cache entry of the database is not evicted until the' +
+                    ' process exits.'),
+    make_option('-s', '--max_cache_size', type="float",
+                help='Maximum size of the blast database cache, in GB. The' +
+                    ' least recently used databases are removed when it is' +
+                    ' exceeded. [default: no limit]')
+]
 script_info['version'] = __version__
 
 if __name__ == '__main__':
     option_parser, opts, args = parse_command_line_parameters(**script_info)
     in_path = opts.input_path
+    cache_dir = opts.cache_dir
+    max_cache_size = opts.max_cache_size
 
-    path = format_blast_db_string(in_path)
+    if cache_dir:
+        if max_cache_size is not None:
+            max_cache_size = int(max_cache_size * 1024 ** 3)
+        if opts.hold_pid:
+            # The entry is held by a process of this host, so the helper
+            # daemon is not used
+            from blast_db_cache import BlastDbCache, hold_while_alive
+            path, lock_file = BlastDbCache(cache_dir,
+                max_cache_size).open_db(in_path)
+            if lock_file is not None:
+                hold_while_alive(lock_file, opts.hold_pid)
+        else:
+            path = call_helper('resolve_cached', [in_path, cache_dir,
+                max_cache_size])
+    else:
+        path = call_helper('resolve', [in_path])
     print path
\ No newline at end of file
@@ -11,44 +11,170 @@ __status__ = "Development"
 
 from cogent.util.option_parsing import (parse_command_line_parameters,
                                         make_option)
-from galaxy_integration import integrate
+from os import path
+from galaxy_integration import (integrate, integrate_releases, Release,
+    get_release_name, format_integration_diff)
 
 script_info = {}
 script_info['brief_description'] = "Integrate the scripts from the given\
  directory on the given Galaxy instance"
 script_info['script_description'] = "For each script in 'input_dir', generates\
  the XML file, puts the XML file in the right Galaxy directory and updates the\
- Galaxy's tool_conf.xml file."
+ Galaxy's tool_conf.xml file.\
+ Several releases of the scripts can be integrated side by side in a single\
+ pass, giving comma-separated lists of configuration files and input\
+ directories (or snapshots), one per release. Their tool ids and sections are\
+ versioned with the release names."
 script_info['script_usage'] = [("Example:",
 "Integrate the scripts under 'scripts_dir' on the Galaxy instante\
  'galaxy_dist_dir' using the configuration file 'config_file.txt'",
-"%prog -i scripts_dir -g galaxy_dist_dir -c config_file.txt")]
+"%prog -i scripts_dir -g galaxy_dist_dir -c config_file.txt"),
+("Snapshot:", "Integrate the scripts of the script_info snapshot\
+ 'qiime_1.9.0.json.gz' without importing them",
+"%prog -s qiime_1.9.0.json.gz -g galaxy_dist_dir -c config_file.txt"),
+("Several releases:", "Integrate QIIME 1.8.0 and QIIME 1.9.0 side by side. The\
+ release names, 1.8.0 and 1.9.0, are taken from the configuration files",
+"%prog -i qiime180/scripts,qiime190/scripts -g galaxy_dist_dir\
+ -c QIIME_1.8.0.conf,QIIME_1.9.0.conf")]
 script_info['output_description'] = ""
 script_info['required_options'] = [
-    make_option('-i', '--input_dir', type="existing_dirpath",
-                help='directory containing the scripts to integrate'),
     make_option('-g', '--galaxy_dist_dir', type="existing_dirpath",
                 help='The Galaxy installation directory'),
-    make_option('-c', '--config_file', type="existing_filepath",
+    make_option('-c', '--config_file', type="existing_filepaths",
                 help='Configuration file which contains the section structure' +
-                    ' of the scripts')
+                    ' of the scripts, or a comma-separated list with the' +
+                    ' configuration file of each release')
 ]
 script_info['optional_options'] = [
+    make_option('-i', '--input_dir', type="string",
+                help='directory containing the scripts to integrate, or a' +
+                    ' comma-separated list with the directory of each' +
+                    ' release. Required if no snapshot_fp is given'),
+    make_option('-s', '--snapshot_fp', type="existing_filepaths",
+                help='script_info snapshot of the scripts to integrate, as' +
+                    ' written by export_script_info_snapshot.py, or a' +
+                    ' comma-separated list with the snapshot of each' +
+                    ' release. The scripts are read from the snapshot' +
+                    ' instead of input_dir and they are not imported'),
+    make_option('-r', '--releases', type="string",
+                help='comma-separated list with the name of each release,' +
+                    ' used to version the tool ids and the sections. By' +
+                    ' default, several releases are named after the version' +
+                    ' at the end of their configuration file names, and a' +
+                    ' single release is not versioned'),
     make_option('--update_tool_conf', action='store_true',
                 help='By default, the Galaxy tool_conf file is overwritten.' + 
                     ' Use this option to update it instead of overwrite it.'),
     make_option('-l', '--log_file', type='new_filepath',
                 help='File path where to store the log file.' +
-                    ' [Default: input_dir/integration.log]')
+                    ' [Default: input_dir/integration.log, or' +
+                    ' galaxy_dist_dir/integration.log with a snapshot or' +
+                    ' several releases]'),
+    make_option('-j', '--jobs', type='int', default=1,
+                help='Number of worker processes used to generate the XML' +
+                    ' files [default: %default]'),
+    make_option('-f', '--force', action='store_true', default=False,
+                help='By default, only the XML files of the scripts that' +
+                    ' changed since the last integration are generated.' +
+                    ' Use this option to regenerate all of them.'),
+    make_option('--link_inputs', action='store_true', default=False,
+                help='By default, the input directories and blast databases' +
+                    ' are always passed through uncompress_tgz.py. Use this' +
+                    ' option to only extract the tgz datasets and link the' +
+                    ' rest into the job working directory.'),
+    make_option('--blast_db_cache_dir', type='string',
+                help='Directory of the Galaxy server where the blast' +
+                    ' databases are extracted and shared among the jobs.' +
+                    ' By default, each job extracts its own copy.'),
+    make_option('--log_format', type='choice', choices=['text', 'json'],
+                default='text',
+                help='Format of the log file: text, or json for one JSON' +
+                    ' object per line [default: %default]'),
+    make_option('--top_n', type='int', default=10,
+                help='Number of slowest scripts listed in the summary of' +
+                    ' the log file [default: %default]'),
+    make_option('--dry_run', action='store_true', default=False,
+                help='Print the directories and files that would be' +
+                    ' created or modified and the tool_conf entries that' +
+                    ' would be added or removed, without writing anything.' +
+                    ' By default, only the changed files are written.'),
+    make_option('--walk_scripts_dir', action='store_true', default=False,
+                help='By default, only the scripts listed in the' +
+                    ' configuration file are looked for in input_dir. Use' +
+                    ' this option to walk the whole input_dir tree and also' +
+                    ' log the scripts missing in the configuration file.'),
+    make_option('--no_import_sandbox', action='store_true', default=False,
+                help='By default, the scripts whose script_info is built' +
+                    ' dynamically are imported in a child process. Use this' +
+                    ' option to import them in the current process.'),
+    make_option('--import_timeout', type='int', default=120,
+                help='Maximum time, in seconds, to import a script' +
+                    ' [default: %default]'),
+    make_option('--import_memory_limit', type='int', default=0,
+                help='Maximum address space, in MB, of the process' +
+                    ' importing a script. It limits the virtual memory of' +
+                    ' the process, not its RSS. Use 0 for no limit' +
+                    ' [default: %default]')
 ]
 script_info['version'] = __version__
 
 if __name__ == '__main__':
     option_parser, opts, args = parse_command_line_parameters(**script_info)
-    input_dir = opts.input_dir
+    input_dirs = opts.input_dir.split(',') if opts.input_dir else []
+    snapshot_fps = opts.snapshot_fp or []
     galaxy_dir = opts.galaxy_dist_dir
-    config_file_fp = opts.config_file
+    config_fps = opts.config_file
+    release_names = opts.releases.split(',') if opts.releases else []
     update = opts.update_tool_conf
     log_fp = opts.log_file
+    jobs = opts.jobs
+    force = opts.force
+    link_inputs = opts.link_inputs
+    blast_db_cache_dir = opts.blast_db_cache_dir
+    log_format = opts.log_format
+    top_n = opts.top_n
+    dry_run = opts.dry_run
+    walk_scripts = opts.walk_scripts_dir
+    sandbox_imports = not opts.no_import_sandbox
+    import_timeout = opts.import_timeout
+    import_memory_limit = opts.import_memory_limit
 
-    integrate(input_dir, galaxy_dir, config_file_fp, update, log_fp)
\ No newline at end of file
+    if jobs < 1:
+        option_parser.error("jobs must be greater than 0")
+    if bool(input_dirs) == bool(snapshot_fps):
+        option_parser.error("Either input_dir or snapshot_fp must be provided")
+    for input_dir in input_dirs:
+        if not path.isdir(input_dir):
+            option_parser.error("Directory does not exist: %r" % input_dir)
+    sources = input_dirs or snapshot_fps
+    if len(sources) != len(config_fps):
+        option_parser.error("An input_dir or snapshot_fp must be provided" +
+            " for each configuration file")
+    if release_names and len(release_names) != len(config_fps):
+        option_parser.error("A release name must be provided for each" +
+            " configuration file")
+
+    if len(config_fps) == 1 and not release_names:
+        diff = integrate(input_dirs[0] if input_dirs else None, galaxy_dir,
+            config_fps[0], update, log_fp, jobs, force, link_inputs,
+            blast_db_cache_dir, log_format, top_n, dry_run, walk_scripts,
+            sandbox_imports, import_timeout, import_memory_limit,
+            snapshot_fps[0] if snapshot_fps else None)
+    else:
+        if not release_names:
+            release_names = map(get_release_name, config_fps)
+        releases = []
+        for name, source, config_fp in zip(release_names, sources,
+                config_fps):
+            if input_dirs:
+                releases.append(Release(name, source, config_fp, None))
+            else:
+                releases.append(Release(name, None, config_fp, source))
+        diff = integrate_releases(releases, galaxy_dir, update, log_fp, jobs,
+            force, link_inputs, blast_db_cache_dir, log_format, top_n,
+            dry_run, walk_scripts, sandbox_imports, import_timeout,
+            import_memory_limit)
+
+    if dry_run:
+        lines = format_integration_diff(diff, path.abspath(galaxy_dir))
+        print '\n'.join(lines) if lines else "No changes"
\ No newline at end of file
@@ -11,25 +11,41 @@ __status__ = "Development"
 
 from cogent.util.option_parsing import (parse_command_line_parameters, 
                                         make_option)
-from xml_generator import make_xml
+import json
+import sys
+from integration_config import load_config
+from script_info_snapshot import load_snapshot
+from xml_generator import make_xmls
 
 script_info = {}
-script_info['brief_description'] = """Generates a Galaxy XML file from a given\
- QIIME script"""
+script_info['brief_description'] = """Generates the Galaxy XML files from the\
+ given QIIME scripts"""
 script_info['script_description'] = """Reads the input script, looks for its\
  'script_info' and extract all the information necessary to generate the XML\
  file. The script generated takes the same name as the original script, but\
  changing his extension to XML. Once the XML is generated, the script must be\
- put into the Galaxy's tools folder and edit the Galaxy's tool_conf.xml file"""
+ put into the Galaxy's tools folder and edit the Galaxy's tool_conf.xml file.
+Multiple scripts can be processed at once, giving a comma-separated list of\
+ scripts or glob patterns. The result of each script is printed and the script\
+ exits with an error status if any of them fails."""
 script_info['script_usage'] = [("Example:",
 "Generate the Galaxy XML file from the script 'my_script.py' without including\
  the '--opt_a' and the '--opt_b' options.",
-"%prog -i my_script.py -r opt_a,opt_b")]
+"%prog -i my_script.py -r opt_a,opt_b"),
+("Multiple scripts:", "Generate the Galaxy XML files of all the scripts in\
+ 'scripts' starting by 'split', removing the options listed in the\
+ configuration file 'config_file.txt', using 4 processes.",
+"%prog -i 'scripts/split*.py' -c config_file.txt -o xml_dir -j 4"),
+("Snapshot:", "Generate the Galaxy XML files of all the scripts in the\
+ script_info snapshot 'qiime_1.9.0.json.gz' without importing them.",
+"%prog -i '*.py' -s qiime_1.9.0.json.gz -c config_file.txt -o xml_dir")]
 script_info['output_description'] = "An XML file that Galaxy can reads and make\
  the tool available via the web browser"
 script_info['required_options'] = [
-    make_option('-i', '--script_fp', type="existing_filepath",
-                help='the QIIME python script filepath to generate'),
+    make_option('-i', '--script_fp', type="string",
+                help='the QIIME python script filepath to generate, or a' +
+                    ' comma-separated list of script filepaths and glob' +
+                    ' patterns'),
     make_option('-o', '--output_dir', type="existing_dirpath",
                 help='output directory where to save the XML file')
 ]
@@ -37,13 +53,89 @@ script_info['optional_options'] = [
     make_option('-r', '--remove_opts', type="string",
                 help='List of option names (e.g. "option1,option2") that' + 
                     ' will not appear in the xml'),
+    make_option('-c', '--config_file', type="existing_filepath",
+                help='Galaxy-QIIME configuration file with the options that' +
+                    ' will not appear in the xml of each script. The' +
+                    ' remove_opts option is used for the scripts not listed'),
+    make_option('-s', '--snapshot_fp', type="existing_filepath",
+                help='script_info snapshot, as written by' +
+                    ' export_script_info_snapshot.py. The file names of' +
+                    ' script_fp are looked for in the snapshot instead of' +
+                    ' reading the scripts'),
+    make_option('-j', '--jobs', type='int', default=1,
+                help='Number of worker processes used to generate the XML' +
+                    ' files [default: %default]'),
+    make_option('--results_fp', type="new_filepath",
+                help='File path where to store the result of each script in' +
+                    ' JSON format'),
+    make_option('--link_inputs', action='store_true', default=False,
+                help='By default, the input directories and blast databases' +
+                    ' are always passed through uncompress_tgz.py. Use this' +
+                    ' option to only extract the tgz datasets and link the' +
+                    ' rest into the job working directory.'),
+    make_option('--blast_db_cache_dir', type='string',
+                help='Directory of the Galaxy server where the blast' +
+                    ' databases are extracted and shared among the jobs.' +
+                    ' By default, each job extracts its own copy.'),
+    make_option('--no_import_sandbox', action='store_true', default=False,
+                help='By default, the scripts whose script_info is built' +
+                    ' dynamically are imported in a child process. Use this' +
+                    ' option to import them in the current process.'),
+    make_option('--import_timeout', type='int', default=120,
+                help='Maximum time, in seconds, to import a script' +
+                    ' [default: %default]'),
+    make_option('--import_memory_limit', type='int', default=0,
+                help='Maximum address space, in MB, of the process' +
+                    ' importing a script. It limits the virtual memory of' +
+                    ' the process, not its RSS. Use 0 for no limit' +
+                    ' [default: %default]'),
 ]
 script_info['version'] = __version__
 
 if __name__ == '__main__':
     option_parser, opts, args = parse_command_line_parameters(**script_info)
-    script_fp = opts.script_fp
+    script_fps = opts.script_fp.split(',')
     output_dir = opts.output_dir
     remove_opts = opts.remove_opts
+    config_file = opts.config_file
+    snapshot_fp = opts.snapshot_fp
+    jobs = opts.jobs
+    results_fp = opts.results_fp
+    link_inputs = opts.link_inputs
+    blast_db_cache_dir = opts.blast_db_cache_dir
+    sandbox_imports = not opts.no_import_sandbox
+    import_timeout = opts.import_timeout
+    import_memory_limit = opts.import_memory_limit
 
-    make_xml(script_fp, output_dir, remove_opts)
\ No newline at end of file
+    if jobs < 1:
+        option_parser.error("jobs must be greater than 0")
+
+    remove_opts_map = {}
+    if config_file:
+        config = load_config(config_file)
+        for name in config:
+            remove_opts_map[name] = config[name].get_remove_opts_string()
+
+    snapshot = load_snapshot(snapshot_fp) if snapshot_fp else None
+
+    results = make_xmls(script_fps, output_dir, remove_opts_map, remove_opts,
+        jobs, link_inputs, blast_db_cache_dir, sandbox_imports,
+        import_timeout, import_memory_limit, snapshot)
+
+    for result in results:
+        if not result['ok']:
+            status = result['error']
+        elif result['change'] is None:
+            status = "Ok (unchanged)"
+        else:
+            status = "Ok"
+        print "%s: %s (%.2f ms)" % (result['script_fp'], status,
+            result['elapsed'] * 1000)
+
+    if results_fp:
+        f = open(results_fp, 'w')
+        json.dump(results, f, indent=1)
+        f.close()
+
+    if not all([result['ok'] for result in results]):
+        sys.exit(1)
\ No newline at end of file
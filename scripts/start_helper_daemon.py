@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.option_parsing import (parse_command_line_parameters,
+                                        make_option)
+from helper_daemon import HelperDaemon, get_default_socket_path
+
+script_info = {}
+script_info['brief_description'] = "Runs the daemon serving the operations of\
+ the Galaxy-QIIME helper scripts"
+script_info['script_description'] = """Listens on a Unix socket and executes\
+ the extract, compress and blast database resolve operations requested by\
+ uncompress_tgz.py, compress_path.py and get_blast_db_path.py, so each Galaxy\
+ job does not need to load them. The helper scripts use the daemon listening\
+ on the socket given by the QIIME_GALAXY_HELPER_SOCKET environment variable\
+ (or the default socket) and execute the operations by themselves if no\
+ daemon is running."""
+script_info['script_usage'] = [("Example:",
+"Run the helper daemon on the default socket",
+"%prog"),
+("Custom socket:", "Run the helper daemon on the socket 'helper.sock'",
+"%prog -s helper.sock")]
+script_info['output_description'] = ""
+script_info['required_options'] = []
+script_info['optional_options'] = [
+    make_option('-s', '--socket_path', type="string",
+                default=get_default_socket_path(),
+                help='Path of the Unix socket [default: %default]')
+]
+script_info['version'] = __version__
+
+if __name__ == '__main__':
+    option_parser, opts, args = parse_command_line_parameters(**script_info)
+    socket_path = opts.socket_path
+
+    try:
+        daemon = HelperDaemon(socket_path)
+    except ValueError, e:
+        option_parser.error(str(e))
+
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.server_close()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from os import path, listdir, chmod, stat, rename
+from shutil import rmtree
+import tempfile
+import atomic_write
+from atomic_write import (get_umask, UMASK, file_digest,
+    atomic_write as write, write_if_changed)
+
+class AtomicWriteTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fp = path.join(self.tmp_dir, 'file.xml')
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_get_umask(self):
+        # The umask read at import is the umask of the process
+        self.assertEqual(UMASK, get_umask())
+
+    def test_file_digest(self):
+        f = open(self.fp, 'w')
+        f.write("foo\n")
+        f.close()
+        self.assertEqual(file_digest(self.fp),
+            'f1d2d2f924e986ac86fdf7b36c94bcdf32beec15')
+
+    def test_atomic_write(self):
+        write(self.fp, "foo\n")
+        self.assertEqual(open(self.fp).read(), "foo\n")
+        self.assertEqual(stat(self.fp).st_mode & 0777, 0666 & ~get_umask())
+
+        # The permissions of an existing file are kept
+        chmod(self.fp, 0640)
+        write(self.fp, "bar\n")
+        self.assertEqual(open(self.fp).read(), "bar\n")
+        self.assertEqual(stat(self.fp).st_mode & 0777, 0640)
+        self.assertEqual(listdir(self.tmp_dir), ['file.xml'])
+
+    def test_atomic_write_error(self):
+        # If the rename fails, the old file is kept and the temporary file
+        # is removed
+        write(self.fp, "foo\n")
+        def failing_rename(src, dst):
+            raise OSError, "rename failed"
+        atomic_write.rename = failing_rename
+        try:
+            self.assertRaises(OSError, write, self.fp, "bar\n")
+        finally:
+            atomic_write.rename = rename
+        self.assertEqual(open(self.fp).read(), "foo\n")
+        self.assertEqual(listdir(self.tmp_dir), ['file.xml'])
+
+    def test_write_if_changed(self):
+        self.assertEqual(write_if_changed(self.fp, "foo\n", dry_run=True),
+            "new")
+        self.assertFalse(path.exists(self.fp))
+        self.assertEqual(write_if_changed(self.fp, "foo\n"), "new")
+
+        # The file is not touched if its contents are the same
+        ino = stat(self.fp).st_ino
+        self.assertEqual(write_if_changed(self.fp, "foo\n"), None)
+        self.assertEqual(write_if_changed(self.fp, u"foo\n"), None)
+        self.assertEqual(stat(self.fp).st_ino, ino)
+
+        # Same size, different contents
+        self.assertEqual(write_if_changed(self.fp, "bar\n", dry_run=True),
+            "modified")
+        self.assertEqual(open(self.fp).read(), "foo\n")
+        self.assertEqual(write_if_changed(self.fp, "bar\n"), "modified")
+        self.assertEqual(open(self.fp).read(), "bar\n")
+        self.assertNotEqual(stat(self.fp).st_ino, ino)
+
+        self.assertEqual(write_if_changed(self.fp, u"caf\xe9\n"), "modified")
+        self.assertEqual(open(self.fp).read(), "caf\xc3\xa9\n")
+
+if __name__ == '__main__':
+    main()
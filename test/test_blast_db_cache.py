@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from shutil import rmtree
+from os import path, listdir, utime, stat
+from shutil import copyfile
+import tarfile
+import tempfile
+from blast_db_cache import (BlastDbCache, DB_NAME, KEYS_DIRNAME,
+    hold_while_alive)
+from subprocess import Popen
+from time import sleep
+from tgz_manager import compress_to_tgz
+
+class BlastDbCacheTest(TestCase):
+    def setUp(self):
+        test_dir = path.dirname(path.abspath(__file__))
+        self.refseqs_fp = path.join(test_dir, 'support_files', 'refseqs.fasta')
+        self.blast_db_dirpath = path.join(test_dir, 'support_files',
+            'blast_db')
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = path.join(self.tmp_dir, 'cache')
+        self.db_tgz = path.join(self.tmp_dir, 'db.tgz')
+        # The database files are at the top level of the tgz file
+        t = tarfile.open(self.db_tgz, 'w:gz')
+        t.add(self.blast_db_dirpath, arcname='')
+        t.close()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def _get_keys(self):
+        return sorted([key for last_used, size, key in
+            BlastDbCache(self.cache_dir).get_entries()])
+
+    def test_get_content_key(self):
+        cache = BlastDbCache(self.cache_dir)
+        key = cache.get_content_key(self.db_tgz)
+        self.assertEqual(len(key), 40)
+        self.assertEqual(cache.get_content_key(self.db_tgz), key)
+        self.assertNotEqual(cache.get_content_key(self.refseqs_fp), key)
+
+        # The keys are readable by the jobs of all the users
+        keys_dir = path.join(self.cache_dir, KEYS_DIRNAME)
+        for name in listdir(keys_dir):
+            self.assertEqual(stat(path.join(keys_dir, name)).st_mode & 0777,
+                0644)
+
+        # A file updated in the same second with the same size is hashed again
+        db_fp = path.join(self.tmp_dir, 'db_file')
+        f = open(db_fp, 'w')
+        f.write('AAAA')
+        f.close()
+        utime(db_fp, (1000.25, 1000.25))
+        key = cache.get_content_key(db_fp)
+        f = open(db_fp, 'w')
+        f.write('CCCC')
+        f.close()
+        utime(db_fp, (1000.5, 1000.5))
+        self.assertNotEqual(cache.get_content_key(db_fp), key)
+
+    def test_get_db_path(self):
+        cache = BlastDbCache(self.cache_dir)
+        obs = cache.get_db_path(self.db_tgz)
+        key = cache.get_content_key(self.db_tgz)
+        exp_dir = path.join(self.cache_dir, key, DB_NAME)
+        self.assertEqual(path.dirname(obs), exp_dir)
+        self.assertEqual(path.basename(obs), 'refseqs.fasta')
+        self.assertEqual(sorted(listdir(exp_dir)), ['refseqs.fasta.phr',
+            'refseqs.fasta.pin', 'refseqs.fasta.psq'])
+
+        # The database is extracted only once
+        self.assertEqual(BlastDbCache(self.cache_dir).get_db_path(
+            self.db_tgz), obs)
+        self.assertEqual(self._get_keys(), [key])
+        self.assertEqual([name for name in listdir(self.cache_dir)
+            if name.startswith('.tmp')], [])
+
+    def test_get_db_path_fasta(self):
+        cache = BlastDbCache(self.cache_dir)
+        self.assertEqual(cache.get_db_path(self.refseqs_fp), self.refseqs_fp)
+        self.assertEqual(self._get_keys(), [])
+
+    def test_get_db_path_dir(self):
+        # A blast database directory is not cached
+        cache = BlastDbCache(self.cache_dir)
+        self.assertEqual(cache.get_db_path(self.blast_db_dirpath),
+            path.join(self.blast_db_dirpath, 'refseqs.fasta'))
+        self.assertEqual(cache.open_db(self.blast_db_dirpath),
+            (path.join(self.blast_db_dirpath, 'refseqs.fasta'), None))
+        self.assertEqual(self._get_keys(), [])
+
+    def test_evict(self):
+        other_tgz = path.join(self.tmp_dir, 'other.tgz')
+        compress_to_tgz(self.refseqs_fp, other_tgz)
+
+        cache = BlastDbCache(self.cache_dir, max_size=1)
+        # The new entry is held while the cache is evicted
+        cache.get_db_path(self.db_tgz)
+        db_key = cache.get_content_key(self.db_tgz)
+        self.assertEqual(self._get_keys(), [db_key])
+
+        # The least recently used entry is evicted, but not the one in use
+        obs, lock_file = cache.open_db(other_tgz)
+        other_key = cache.get_content_key(other_tgz)
+        self.assertEqual(obs, path.join(self.cache_dir, other_key, DB_NAME))
+        self.assertEqual(self._get_keys(), [other_key])
+        cache.evict()
+        self.assertEqual(self._get_keys(), [other_key])
+
+        # The content keys of the evicted entries are removed
+        keys_dir = path.join(self.cache_dir, KEYS_DIRNAME)
+        stored_keys = [open(path.join(keys_dir, name)).read() for name in
+            listdir(keys_dir)]
+        self.assertEqual(stored_keys, [other_key])
+
+        # Without maximum size, nothing is evicted
+        lock_file.close()
+        BlastDbCache(self.cache_dir).evict()
+        self.assertEqual(self._get_keys(), [other_key])
+
+        # Once it is released, the entry can be evicted
+        cache.evict()
+        self.assertEqual(self._get_keys(), [])
+
+        # An entry evicted after its key is computed is extracted again
+        copied_tgz = path.join(self.tmp_dir, 'copied.tgz')
+        copyfile(self.db_tgz, copied_tgz)
+        self.assertEqual(cache.get_content_key(copied_tgz), db_key)
+        obs = BlastDbCache(self.cache_dir).get_db_path(copied_tgz)
+        self.assertEqual(path.dirname(obs), path.join(self.cache_dir, db_key,
+            DB_NAME))
+        self.assertTrue(path.exists(obs + '.pin'))
+
+    def test_hold_while_alive(self):
+        cache = BlastDbCache(self.cache_dir, max_size=1)
+        job = Popen(['sleep', '60'])
+        try:
+            obs, lock_file = cache.open_db(self.db_tgz)
+            hold_while_alive(lock_file, job.pid, interval=0.1)
+            self.assertTrue(lock_file.closed)
+            # The entry is held by the background process while the job runs
+            cache.evict()
+            self.assertEqual(len(self._get_keys()), 1)
+        finally:
+            job.kill()
+            job.wait()
+
+        # The entry is released when the job exits
+        for i in range(50):
+            cache.evict()
+            if not self._get_keys():
+                break
+            sleep(0.1)
+        self.assertEqual(self._get_keys(), [])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from os import path, environ
+from subprocess import Popen, PIPE
+from StringIO import StringIO
+import sys
+from fast_option_parsing import make_option, parse_command_line_parameters
+from script_info_extractor import extract_script_info
+from xml_generator import ScriptInfo
+
+# Runs a helper script as __main__ and prints the cogent modules it loaded
+RUN_SCRIPT = """
+import runpy, sys
+from os.path import dirname
+script_fp = sys.argv[1]
+sys.argv = sys.argv[1:]
+sys.path.insert(0, dirname(script_fp))
+try:
+    runpy.run_path(script_fp, run_name='__main__')
+except SystemExit:
+    pass
+sys.stderr.write(' '.join(sorted([name for name in sys.modules
+    if name.split('.')[0] == 'cogent'])))
+"""
+
+class FastOptionParsingTest(TestCase):
+    def setUp(self):
+        test_dir = path.dirname(path.abspath(__file__))
+        self.lib_dir = path.join(test_dir, '..', 'lib')
+        self.scripts_dir = path.join(test_dir, '..', 'scripts')
+        self.refseqs_fp = path.join(test_dir, 'support_files', 'refseqs.fasta')
+        self.tgz_file = path.join(test_dir, 'support_files', 'tar_file.tgz')
+
+        self.script_info = {}
+        self.script_info['brief_description'] = "Example script"
+        self.script_info['script_description'] = "Example description"
+        self.script_info['script_usage'] = [("Example:", "Run it",
+            "%prog -i in.fasta")]
+        self.script_info['output_description'] = "Nothing"
+        self.script_info['required_options'] = [
+            make_option('-i', '--input_fp', type='existing_filepath',
+                help='the input file')]
+        self.script_info['optional_options'] = [
+            make_option('-o', '--output_dir', type='new_dirpath',
+                help='the output directory'),
+            make_option('-n', '--number', type='int', default=3,
+                help='a number [default: %default]')]
+        self.script_info['version'] = __version__
+
+        self._argv = sys.argv
+        self._stderr = sys.stderr
+
+    def tearDown(self):
+        sys.argv = self._argv
+        sys.stderr = self._stderr
+
+    def _parse(self, argv):
+        sys.argv = ['example.py'] + argv
+        sys.stderr = StringIO()
+        return parse_command_line_parameters(**self.script_info)
+
+    def test_parse_command_line_parameters(self):
+        option_parser, opts, args = self._parse(['-i', self.refseqs_fp,
+            '-o', 'out_dir'])
+        self.assertEqual(opts.input_fp, self.refseqs_fp)
+        self.assertEqual(opts.output_dir, 'out_dir')
+        self.assertEqual(opts.number, 3)
+        self.assertEqual(args, [])
+
+    def test_parse_command_line_parameters_errors(self):
+        # Required option omitted
+        self.assertRaises(SystemExit, self._parse, ['-o', 'out_dir'])
+        # File does not exist
+        self.assertRaises(SystemExit, self._parse, ['-i', '/not/a/file'])
+        # Positional argument
+        self.assertRaises(SystemExit, self._parse, ['-i', self.refseqs_fp,
+            'extra'])
+
+    def test_script_info_of_helper_scripts(self):
+        """The XML of the helper scripts can still be generated"""
+        for name in ['compress_path', 'get_blast_db_path', 'uncompress_tgz']:
+            info = ScriptInfo(extract_script_info(path.join(self.scripts_dir,
+                name + '.py')), name, name + '.py')
+            self.assertTrue(len(info.required_opts) > 0)
+
+    def test_helper_scripts_do_not_import_cogent(self):
+        env = dict(environ)
+        env['PYTHONPATH'] = self.lib_dir
+        # Make sure that the operations are run in-process
+        env['QIIME_GALAXY_HELPER_SOCKET'] = path.join(self.lib_dir, 'no.sock')
+        for script, argv in [('get_blast_db_path.py', ['-i', self.refseqs_fp]),
+                             ('uncompress_tgz.py', ['-h']),
+                             ('compress_path.py', ['-h'])]:
+            proc = Popen([sys.executable, '-c', RUN_SCRIPT,
+                path.join(self.scripts_dir, script)] + argv, env=env,
+                stdout=PIPE, stderr=PIPE)
+            out, err = proc.communicate()
+            self.assertEqual(proc.returncode, 0)
+            self.assertEqual(err, '')
+
+if __name__ == '__main__':
+    main()
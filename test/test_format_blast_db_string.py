@@ -11,9 +11,10 @@ __status__ = "Development"
 
 from cogent.util.unit_test import TestCase, main
 from shutil import copyfile, copytree, rmtree
-from os import path, remove
+from os import path, remove, mkdir, stat, utime
 from cogent.app.util import get_tmp_filename
 import tempfile
+import format_blast_db_string as fbds
 from format_blast_db_string import format_blast_db_string
 
 class FormatBlastDBStringTest(TestCase):
@@ -53,5 +54,139 @@ class FormatBlastDBStringTest(TestCase):
         exp = path.join(dirname, 'refseqs.fasta')
         self.assertEqual(obs, exp)
 
+    def _make_db_dir(self, names, alias=None):
+        """Creates a directory with empty files named 'names'
+
+        If alias is a tuple (name, volumes), an alias file listing 'volumes'
+        is also created
+        """
+        dirname = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up.append(dirname)
+        for name in names:
+            open(path.join(dirname, name), 'w').close()
+        if alias:
+            name, volumes = alias
+            f = open(path.join(dirname, name), 'w')
+            f.write("#\n# Alias file created by makeblastdb\n#\n" +
+                "TITLE refseqs\nDBLIST %s\n" % ' '.join(volumes))
+            f.close()
+        return dirname
+
+    def test_format_blast_db_string_stray_files(self):
+        """Test when the directory holds files not in the database"""
+        dirname = self._make_db_dir(['a_readme.txt', 'refseqs.nhr',
+            'refseqs.nin', 'refseqs.nsq', 'zz.log'])
+        obs = format_blast_db_string(dirname)
+        self.assertEqual(obs, path.join(dirname, 'refseqs'))
+
+    def test_format_blast_db_string_multiple_volumes(self):
+        """Test when the database has multiple volumes"""
+        names = []
+        for vol in ['refseqs.00', 'refseqs.01']:
+            names.extend([vol + '.pin', vol + '.phr', vol + '.psq'])
+        dirname = self._make_db_dir(names,
+            ('refseqs.pal', ['refseqs.00', 'refseqs.01']))
+        obs = format_blast_db_string(dirname)
+        self.assertEqual(obs, path.join(dirname, 'refseqs'))
+
+        # A missing volume file invalidates the alias
+        dirname = self._make_db_dir(names[:-1],
+            ('refseqs.pal', ['refseqs.00', 'refseqs.01']))
+        self.assertRaises(ValueError, format_blast_db_string, dirname)
+
+    def test_format_blast_db_string_errors(self):
+        """Test when the directory does not hold exactly one database"""
+        # Incomplete database
+        dirname = self._make_db_dir(['refseqs.pin', 'refseqs.phr',
+            'other.txt'])
+        self.assertRaises(ValueError, format_blast_db_string, dirname)
+
+        # Two databases
+        dirname = self._make_db_dir(['db1.pin', 'db1.phr', 'db1.psq',
+            'db2.nin', 'db2.nhr', 'db2.nsq'])
+        self.assertRaises(ValueError, format_blast_db_string, dirname)
+
+    def test_format_blast_db_string_wrapper_dir(self):
+        """Test when the database is inside a single subdirectory"""
+        dirname = get_tmp_filename(tmp_dir=self.tmp_dir, suffix='')
+        mkdir(dirname)
+        self._dirs_to_clean_up = [dirname]
+        copytree(self.blast_db_dirpath, path.join(dirname, 'blast_db'))
+
+        obs = format_blast_db_string(dirname)
+        exp = path.join(dirname, 'blast_db', 'refseqs.fasta')
+        self.assertEqual(obs, exp)
+
+    def test_format_blast_db_string_memo(self):
+        """Test that the result is memoized until the directory changes"""
+        dirname = self._make_db_dir(['refseqs.pin', 'refseqs.phr',
+            'refseqs.psq'])
+        obs = format_blast_db_string(dirname)
+        self.assertEqual(obs, path.join(dirname, 'refseqs'))
+        stamp, db_path = fbds._resolved_dirs[dirname]
+        self.assertEqual(db_path, obs)
+
+        resolved = []
+        resolve_blast_db_dir = fbds._resolve_blast_db_dir
+        def _resolve(in_path):
+            resolved.append(in_path)
+            return resolve_blast_db_dir(in_path)
+        fbds._resolve_blast_db_dir = _resolve
+        try:
+            # The memoized result is returned without listing the directory
+            self.assertEqual(format_blast_db_string(dirname), obs)
+            self.assertEqual(resolved, [])
+
+            # The directory is resolved again when it changes
+            utime(dirname, (1000.5, 1000.5))
+            self.assertEqual(format_blast_db_string(dirname), obs)
+            self.assertEqual(resolved, [dirname])
+
+            # or when the index file of its database changes
+            utime(path.join(dirname, 'refseqs.pin'), (1000.5, 1000.5))
+            self.assertEqual(format_blast_db_string(dirname), obs)
+            self.assertEqual(resolved, [dirname, dirname])
+        finally:
+            fbds._resolve_blast_db_dir = resolve_blast_db_dir
+
+    def test_format_blast_db_string_memo_alias(self):
+        """Test that an alias file edited in place is read again"""
+        names = []
+        for vol in ['refseqs.00', 'refseqs.01']:
+            names.extend([vol + '.pin', vol + '.phr', vol + '.psq'])
+        dirname = self._make_db_dir(names,
+            ('refseqs.pal', ['refseqs.00', 'refseqs.01']))
+        self.assertEqual(format_blast_db_string(dirname),
+            path.join(dirname, 'refseqs'))
+
+        # The alias file now lists a missing volume, but the directory does
+        # not change
+        dir_mtime = stat(dirname).st_mtime
+        f = open(path.join(dirname, 'refseqs.pal'), 'a')
+        f.write("DBLIST refseqs.02\n")
+        f.close()
+        utime(path.join(dirname, 'refseqs.pal'), (1000.5, 1000.5))
+        utime(dirname, (dir_mtime, dir_mtime))
+        self.assertRaises(ValueError, format_blast_db_string, dirname)
+
+    def test_format_blast_db_string_memo_size(self):
+        """Test that the memo only keeps the last resolved directories"""
+        old_max = fbds.MAX_RESOLVED_DIRS
+        fbds.MAX_RESOLVED_DIRS = 2
+        try:
+            dirnames = [self._make_db_dir(['refseqs.pin', 'refseqs.phr',
+                'refseqs.psq']) for i in range(3)]
+            for dirname in dirnames:
+                format_blast_db_string(dirname)
+            self.assertEqual(fbds._resolved_dirs.keys(), dirnames[1:])
+
+            # The most recently used directories are kept
+            format_blast_db_string(dirnames[1])
+            format_blast_db_string(dirnames[0])
+            self.assertEqual(fbds._resolved_dirs.keys(), [dirnames[1],
+                dirnames[0]])
+        finally:
+            fbds.MAX_RESOLVED_DIRS = old_max
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
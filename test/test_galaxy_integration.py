@@ -10,13 +10,21 @@ __email__ = "josenavasmolina@gmail.com"
 __status__ = "Development"
 
 from cogent.util.unit_test import TestCase, main
-from os import path, mkdir, remove
+import json
+from integration_config import load_config
+from os import path, mkdir, remove, listdir
 from shutil import rmtree, copyfile
 import tempfile
-from xml.dom.minidom import Document
+from xml.dom.minidom import Document, parseString
 from galaxy_integration import (parse_config_file, create_dirs,
     get_galaxy_tool_conf_file, get_section_node, exist_script_in_section,
-    add_section_to_xml, update_tool_conf_xml, create_activate_file, integrate)
+    add_section_to_xml, index_tool_conf, get_tool_conf_entries,
+    update_tool_conf_xml, create_activate_file, format_integration_diff,
+    find_configured_scripts, walk_scripts_dir, integrate, integrate_releases,
+    Release, get_release_name, get_versioned_tool_id, get_versioned_section,
+    _generate_script_xml)
+from import_sandbox import ImportSandbox
+from script_info_snapshot import export_snapshot, save_snapshot, load_snapshot
 
 class GalaxyIntegrationTest(TestCase):
     def setUp(self):
@@ -56,11 +64,17 @@ class GalaxyIntegrationTest(TestCase):
         self._dirs_to_clean_up = [galaxy_dir]
         galaxy_tools_dir = path.join(galaxy_dir, 'tools')
         mkdir(galaxy_tools_dir)
-        create_dirs(galaxy_dir, self.sections)
+        obs = create_dirs(galaxy_dir, self.sections, dry_run=True)
+        self.assertEqual(obs, [path.join(galaxy_tools_dir, 'section1'),
+            path.join(galaxy_tools_dir, 'section2')])
+        self.assertFalse(path.exists(path.join(galaxy_tools_dir, 'section1')))
+        obs = create_dirs(galaxy_dir, self.sections)
+        self.assertEqual(len(obs), 2)
         self.assertTrue(path.exists(path.join(galaxy_tools_dir, 'section1')),
             'The section directory was not created in the appropriate location')
         self.assertTrue(path.exists(path.join(galaxy_tools_dir, 'section2')),
             'The section directory was not created in the appropriate location')
+        self.assertEqual(create_dirs(galaxy_dir, self.sections), [])
 
         galaxy_dir = tempfile.mkdtemp(dir=self.tmp_dir)
         self._dirs_to_clean_up.append(galaxy_dir)
@@ -158,6 +172,24 @@ class GalaxyIntegrationTest(TestCase):
         add_section_to_xml("Section 2", [], xml)
         self.assertEqual(xml.toprettyxml(indent='\t'), exp_add_void_sect)
 
+    def test_index_tool_conf(self):
+        xml = parseString(existing_tool_conf_lines)
+        section_nodes, section_files = index_tool_conf(xml)
+        self.assertEqual(sorted(section_nodes.keys()),
+            ['Existing Section', 'Get Data'])
+        self.assertEqual(section_nodes['Get Data'],
+            get_section_node('Get Data', xml))
+        self.assertEqual(section_files, {
+            'Existing Section': set(['section_dir/file.xml']),
+            'Get Data': set(['data_source/upload.xml'])})
+
+    def test_get_tool_conf_entries(self):
+        xml = parseString(existing_tool_conf_lines)
+        self.assertEqual(get_tool_conf_entries(xml), set([
+            ('Existing Section', 'section_dir/file.xml'),
+            ('Get Data', 'data_source/upload.xml')]))
+        self.assertEqual(get_tool_conf_entries(None), set())
+
     def test_update_tool_conf_xml(self):
         xml = Document()
         toolbox = xml.createElement('toolbox')
@@ -171,6 +203,12 @@ class GalaxyIntegrationTest(TestCase):
         update_tool_conf_xml(xml, section_dict)
         self.assertEqual(xml.toprettyxml(indent='\t'), exp_update_2)
 
+        # Scripts already present or repeated are added only once
+        section_dict = {"Section 1": ['script1.py', 'script6.py',
+            'script6.py']}
+        update_tool_conf_xml(xml, section_dict)
+        self.assertEqual(xml.toprettyxml(indent='\t'), exp_update_3)
+
     def test_create_activate_file(self):
         galaxy_dir = tempfile.mkdtemp(dir=self.tmp_dir)
         self._dirs_to_clean_up = [galaxy_dir]
@@ -179,13 +217,36 @@ class GalaxyIntegrationTest(TestCase):
         self.assertTrue(path.exists(exp_activate_fp),
             "The activate.sh file was not created in the appropriate location")
 
+        # The file is not rewritten if it did not change
         exp_activate_bak_fp = path.join(galaxy_dir, 'activate.sh.bak')
-        create_activate_file(galaxy_dir)
+        self.assertEqual(create_activate_file(galaxy_dir), None)
+        self.assertFalse(path.exists(exp_activate_bak_fp))
+
+        f = open(exp_activate_fp, 'w')
+        f.write("export GALAXY_HOME=/old/galaxy\n")
+        f.close()
+        self.assertEqual(create_activate_file(galaxy_dir, dry_run=True),
+            "modified")
+        self.assertFalse(path.exists(exp_activate_bak_fp))
+        self.assertEqual(create_activate_file(galaxy_dir), "modified")
         self.assertTrue(path.exists(exp_activate_fp),
             "The activate.sh file was not created in the appropriate location")
         self.assertTrue(path.exists(exp_activate_bak_fp),
             "The activate.sh.bak file was not created in the appropriate" +
             " location")
+        self.assertEqual(open(exp_activate_bak_fp).read(),
+            "export GALAXY_HOME=/old/galaxy\n")
+
+    def test_format_integration_diff(self):
+        diff = {'new': ['/galaxy/tools/section1',
+                        '/galaxy/tools/section1/script1.xml'],
+                'modified': ['/galaxy/tool_conf.xml'],
+                'tool_conf_added': [('Section 1', 'section1/script1.xml')],
+                'tool_conf_removed': [('Old', 'old/script.xml')]}
+        self.assertEqual(format_integration_diff(diff, '/galaxy'),
+            ['A tools/section1', 'A tools/section1/script1.xml',
+             'M tool_conf.xml', '+ Section 1: section1/script1.xml',
+             '- Old: old/script.xml'])
 
 
     def test_integrate(self):
@@ -215,6 +276,356 @@ class GalaxyIntegrationTest(TestCase):
         self.assertTrue(path.exists(log_fp),
             "The log file was not created in the appropriate location")
 
+        # An already loaded configuration can be reused
+        diff = integrate(scripts_dir, galaxy_dir,
+            load_config(self.config_file), True, log_fp)
+        self.assertEqual(diff['new'] + diff['modified'], [])
+
+    def test_integrate_jobs(self):
+        scripts_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [scripts_dir]
+        copyfile(self.script1, path.join(scripts_dir, 'script1.py'))
+        copyfile(self.script2, path.join(scripts_dir, 'script2.py'))
+        copyfile(self.script3, path.join(scripts_dir, 'script3.py'))
+
+        galaxy_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up.append(galaxy_dir)
+        galaxy_tool_conf_fp = path.join(galaxy_dir, 'tool_conf.xml')
+        f = open(galaxy_tool_conf_fp, 'w')
+        f.close()
+        galaxy_tools_dir = path.join(galaxy_dir, 'tools')
+        mkdir(galaxy_tools_dir)
+
+        integrate(scripts_dir, galaxy_dir, self.config_file, False, None,
+            jobs=2)
+
+        for xml_fp in ['section1/script1.xml', 'section1/script2.xml',
+                        'section2/script3.xml']:
+            self.assertTrue(path.exists(path.join(galaxy_tools_dir, xml_fp)),
+                "The XML file was not created in the appropriate location")
+        log_lines = open(path.join(scripts_dir, 'integration.log')).readlines()
+        self.assertEqual(len(log_lines), 11)
+        self.assertTrue(all("... Ok" in l for l in log_lines[:6]))
+        self.assertTrue(log_lines[6].startswith("Integration summary: 3" +
+            " scripts generated, 0 unchanged, 0 skipped, 0 missing, 0" +
+            " failed"))
+        self.assertEqual(log_lines[7], "Slowest scripts:\n")
+        self.assertEqual(sorted([l.split()[0] for l in log_lines[8:]]),
+            ['script1.py', 'script2.py', 'script3.py'])
+
+    def test_integrate_json_log(self):
+        scripts_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [scripts_dir]
+        copyfile(self.script1, path.join(scripts_dir, 'script1.py'))
+        copyfile(self.script3, path.join(scripts_dir, 'script3.py'))
+        f = open(path.join(scripts_dir, 'other.py'), 'w')
+        f.close()
+
+        galaxy_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up.append(galaxy_dir)
+        f = open(path.join(galaxy_dir, 'tool_conf.xml'), 'w')
+        f.close()
+        mkdir(path.join(galaxy_dir, 'tools'))
+        log_fp = path.join(scripts_dir, 'integration.log')
+
+        integrate(scripts_dir, galaxy_dir, self.config_file, False, None,
+            log_format='json', top_n=1, walk_scripts=True)
+        records = map(json.loads, open(log_fp))
+        self.assertEqual([r['event'] for r in records], ['script'] * 4 +
+            ['step'] * 3 + ['summary'])
+
+        # The missing scripts are reported first
+        self.assertEqual((records[0]['script'], records[0]['status']),
+            ('script2.py', 'missing'))
+        scripts = dict([(r['script'], r) for r in records[1:4]])
+        self.assertEqual(scripts['other.py']['status'], 'skipped')
+        for name in ['script1.py', 'script3.py']:
+            self.assertEqual(scripts[name]['status'], 'ok')
+            for field in ['wall', 'import', 'xml', 'write', 'rss_delta']:
+                self.assertTrue(scripts[name][field] >= 0)
+            self.assertAlmostEqual(scripts[name]['wall'],
+                scripts[name]['import'] + scripts[name]['xml'] +
+                scripts[name]['write'])
+
+        summary = records[-1]
+        self.assertEqual((summary['ok'], summary['unchanged'],
+            summary['skipped'], summary['missing'], summary['failed']),
+            (2, 0, 1, 1, 0))
+        self.assertEqual(len(summary['slowest']), 1)
+        self.assertEqual(summary['slowest'][0][1], max(
+            scripts['script1.py']['wall'], scripts['script3.py']['wall']))
+
+    def test_find_configured_scripts(self):
+        scripts_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [scripts_dir]
+        copyfile(self.script1, path.join(scripts_dir, 'script1.py'))
+        copyfile(self.script3, path.join(scripts_dir, 'script3.py'))
+        mkdir(path.join(scripts_dir, 'script2.py'))
+
+        found, missing = find_configured_scripts(scripts_dir,
+            ['script3.py', 'script2.py', 'script1.py', 'script4.py'])
+        self.assertEqual(found, [
+            ('script3.py', path.join(scripts_dir, 'script3.py')),
+            ('script1.py', path.join(scripts_dir, 'script1.py'))])
+        self.assertEqual(missing, ['script2.py', 'script4.py'])
+        self.assertEqual(find_configured_scripts(scripts_dir, []), ([], []))
+
+    def test_walk_scripts_dir(self):
+        scripts_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [scripts_dir]
+        mkdir(path.join(scripts_dir, 'sub'))
+        copyfile(self.script1, path.join(scripts_dir, 'script1.py'))
+        copyfile(self.script3, path.join(scripts_dir, 'sub', 'script3.py'))
+        f = open(path.join(scripts_dir, 'README'), 'w')
+        f.close()
+        self.assertEqual(sorted(walk_scripts_dir(scripts_dir)), [
+            ('script1.py', path.join(scripts_dir, 'script1.py')),
+            ('script3.py', path.join(scripts_dir, 'sub', 'script3.py'))])
+
+    def test_integrate_cache(self):
+        scripts_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [scripts_dir]
+        copyfile(self.script1, path.join(scripts_dir, 'script1.py'))
+        copyfile(self.script3, path.join(scripts_dir, 'script3.py'))
+
+        galaxy_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up.append(galaxy_dir)
+        galaxy_tool_conf_fp = path.join(galaxy_dir, 'tool_conf.xml')
+        f = open(galaxy_tool_conf_fp, 'w')
+        f.close()
+        mkdir(path.join(galaxy_dir, 'tools'))
+        log_fp = path.join(scripts_dir, 'integration.log')
+
+        integrate(scripts_dir, galaxy_dir, self.config_file, False, None)
+        self.assertEqual(open(log_fp).read().count("Ok (unchanged)"), 0)
+
+        # Nothing changed: the XML files are reused
+        integrate(scripts_dir, galaxy_dir, self.config_file, False, None)
+        self.assertEqual(open(log_fp).read().count("Ok (unchanged)"), 2)
+        self.assertEqual(open(galaxy_tool_conf_fp).read().count("<tool "), 3)
+
+        # Modified script: only its XML file is regenerated
+        f = open(path.join(scripts_dir, 'script3.py'), 'a')
+        f.write("\n# A change\n")
+        f.close()
+        integrate(scripts_dir, galaxy_dir, self.config_file, False, None)
+        log = open(log_fp).read()
+        self.assertTrue("script1.py script... Ok (unchanged)" in log)
+        self.assertTrue("script3.py script... Ok [wall: " in log)
+
+        # Forced integration: all the XML files are regenerated
+        integrate(scripts_dir, galaxy_dir, self.config_file, False, None,
+            force=True)
+        self.assertEqual(open(log_fp).read().count("Ok (unchanged)"), 0)
+
+    def test_integrate_dry_run(self):
+        scripts_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [scripts_dir]
+        copyfile(self.script1, path.join(scripts_dir, 'script1.py'))
+        copyfile(self.script3, path.join(scripts_dir, 'script3.py'))
+
+        galaxy_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up.append(galaxy_dir)
+        tool_conf_fp = path.join(galaxy_dir, 'tool_conf.xml')
+        f = open(tool_conf_fp, 'w')
+        f.write(existing_tool_conf_lines)
+        f.close()
+        tools_dir = path.join(galaxy_dir, 'tools')
+        mkdir(tools_dir)
+        log_fp = path.join(scripts_dir, 'integration.log')
+
+        # Dry run: the diff is computed but nothing is written
+        diff = integrate(scripts_dir, galaxy_dir, self.config_file, True,
+            None, dry_run=True)
+        self.assertEqual(sorted(diff['new']), [
+            path.join(galaxy_dir, 'activate.sh'),
+            path.join(tools_dir, 'section1'),
+            path.join(tools_dir, 'section1', 'script1.xml'),
+            path.join(tools_dir, 'section2'),
+            path.join(tools_dir, 'section2', 'script3.xml')])
+        self.assertEqual(diff['modified'], [tool_conf_fp])
+        self.assertEqual(diff['tool_conf_added'], [
+            ('Section 1', 'section1/script1.xml'),
+            ('Section 2', 'section2/script3.xml')])
+        self.assertEqual(diff['tool_conf_removed'], [])
+        self.assertEqual(sorted(listdir(tools_dir)), [])
+        self.assertFalse(path.exists(log_fp))
+        self.assertFalse(path.exists(path.join(galaxy_dir, 'activate.sh')))
+        self.assertEqual(open(tool_conf_fp).read(), existing_tool_conf_lines)
+
+        # Apply: the same changes are written
+        self.assertEqual(integrate(scripts_dir, galaxy_dir, self.config_file,
+            True, None), diff)
+        self.assertTrue(path.exists(log_fp))
+
+        # Nothing changed: nothing is written, even if the XML files are
+        # regenerated
+        xml_fp = path.join(tools_dir, 'section1', 'script1.xml')
+        mtime = path.getmtime(xml_fp)
+        exp = {'new': [], 'modified': [], 'tool_conf_added': [],
+            'tool_conf_removed': []}
+        self.assertEqual(integrate(scripts_dir, galaxy_dir, self.config_file,
+            True, None, force=True), exp)
+        self.assertEqual(path.getmtime(xml_fp), mtime)
+
+        # Overwriting the tool_conf removes the existing entries
+        diff = integrate(scripts_dir, galaxy_dir, self.config_file, False,
+            None, dry_run=True)
+        self.assertEqual(diff['modified'], [tool_conf_fp])
+        self.assertEqual(diff['tool_conf_removed'], [
+            ('Existing Section', 'section_dir/file.xml')])
+
+    def test_integrate_snapshot(self):
+        scripts = [('script1.py', self.script1), ('script3.py', self.script3)]
+        snapshot, errors = export_snapshot(scripts)
+        tmp_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [tmp_dir]
+        snapshot_fp = path.join(tmp_dir, 'snapshot.json.gz')
+        save_snapshot(snapshot, snapshot_fp)
+
+        scripts_dir = path.join(tmp_dir, 'scripts')
+        mkdir(scripts_dir)
+        for name, script_fp in scripts:
+            copyfile(script_fp, path.join(scripts_dir, name))
+
+        # The same XML files are generated from the scripts and the snapshot
+        galaxy_dirs = []
+        for scripts_dir, snapshot_arg in [(scripts_dir, None),
+                (None, snapshot_fp)]:
+            galaxy_dir = tempfile.mkdtemp(dir=tmp_dir)
+            galaxy_dirs.append(galaxy_dir)
+            f = open(path.join(galaxy_dir, 'tool_conf.xml'), 'w')
+            f.close()
+            mkdir(path.join(galaxy_dir, 'tools'))
+            integrate(scripts_dir, galaxy_dir, self.config_file, False, None,
+                snapshot=snapshot_arg)
+        for xml_fp in ['section1/script1.xml', 'section2/script3.xml']:
+            self.assertEqual(open(path.join(galaxy_dirs[0], 'tools',
+                xml_fp)).read(), open(path.join(galaxy_dirs[1], 'tools',
+                xml_fp)).read())
+
+        # The log is written in the Galaxy folder and the script missing in
+        # the snapshot is reported
+        log_lines = open(path.join(galaxy_dirs[1],
+            'integration.log')).readlines()
+        self.assertEqual(log_lines[0], "Generating XML file for script2.py" +
+            " script... missing - not in scripts directory\n")
+
+        # The cache keys of the snapshot scripts are kept
+        diff = integrate(None, galaxy_dirs[1], self.config_file, False, None,
+            snapshot=load_snapshot(snapshot_fp))
+        self.assertEqual(diff['new'] + diff['modified'], [])
+
+    def test_generate_script_xml_sandbox_rss(self):
+        # The memory of the imports in the sandbox is logged
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            script_fp = path.join(tmp_dir, 'big_script.py')
+            f = open(script_fp, 'w')
+            f.write(big_dynamic_script)
+            f.close()
+            task = (script_fp, [], False, None, ImportSandbox(timeout=30), None,
+                [('big_script', None)])
+            xml_strings, status, timings = _generate_script_xml(task)
+            self.assertEqual(status, "Ok")
+            self.assertEqual(xml_strings.keys(), ['big_script'])
+            self.assertTrue(timings['rss_delta'] >= 60 * 1024)
+        finally:
+            rmtree(tmp_dir)
+
+    def test_get_release_name(self):
+        self.assertEqual(get_release_name('config_files/QIIME_1.9.0.conf'),
+            '1.9.0')
+        self.assertEqual(get_release_name('qiime-1.8.0-dev.conf'),
+            '1.8.0-dev')
+        self.assertEqual(get_release_name('config_file.txt'), 'config_file')
+
+    def test_get_versioned_tool_id(self):
+        self.assertEqual(get_versioned_tool_id('alpha_diversity.py', None),
+            'alpha_diversity')
+        self.assertEqual(get_versioned_tool_id('alpha_diversity.py',
+            '1.9.0-dev'), 'alpha_diversity_1_9_0_dev')
+
+    def test_get_versioned_section(self):
+        self.assertEqual(get_versioned_section('Section 1', None),
+            'Section 1')
+        self.assertEqual(get_versioned_section('Section 1', '1.9.0'),
+            'Section 1 1.9.0')
+        self.assertEqual(get_versioned_section('QIIME 1.9.0', '1.9.0'),
+            'QIIME 1.9.0')
+
+    def test_integrate_releases(self):
+        tmp_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [tmp_dir]
+        scripts_dirs = [path.join(tmp_dir, 'r1'), path.join(tmp_dir, 'r2')]
+        for scripts_dir in scripts_dirs:
+            mkdir(scripts_dir)
+            for script_fp in [self.script1, self.script2, self.script3]:
+                copyfile(script_fp, path.join(scripts_dir,
+                    path.basename(script_fp)))
+        # script3.py changes in the second release
+        f = open(path.join(scripts_dirs[1], 'script3.py'), 'a')
+        f.write("\n# Changed\n")
+        f.close()
+
+        galaxy_dir = path.join(tmp_dir, 'galaxy')
+        mkdir(galaxy_dir)
+        f = open(path.join(galaxy_dir, 'tool_conf.xml'), 'w')
+        f.close()
+        tools_dir = path.join(galaxy_dir, 'tools')
+        mkdir(tools_dir)
+        log_fp = path.join(galaxy_dir, 'integration.log')
+
+        releases = [Release('1.0', scripts_dirs[0], self.config_file, None),
+                    Release('2.0', scripts_dirs[1], self.config_file, None)]
+        diff = integrate_releases(releases, galaxy_dir, False, None,
+            jobs=2, log_format='json')
+
+        self.assertEqual(sorted(listdir(tools_dir)),
+            ['.qiime_galaxy_cache.json', 'section11.0', 'section12.0',
+             'section21.0', 'section22.0'])
+        self.assertEqual(sorted(listdir(path.join(tools_dir, 'section12.0'))),
+            ['script1_2_0.xml', 'script2_2_0.xml'])
+        xml = open(path.join(tools_dir, 'section12.0',
+            'script1_2_0.xml')).read()
+        self.assertTrue('id="script1_2_0"' in xml)
+        # Each release requires its own version of QIIME
+        self.assertTrue('<requirement type="package" version="2.0">qiime'
+            in xml)
+        xml = open(path.join(tools_dir, 'section11.0',
+            'script1_1_0.xml')).read()
+        self.assertTrue('<requirement type="package" version="1.0">qiime'
+            in xml)
+        self.assertEqual(diff['tool_conf_added'], [
+            ('Get Data', 'data_source/upload.xml'),
+            ('Section 1 1.0', 'section11.0/script1_1_0.xml'),
+            ('Section 1 1.0', 'section11.0/script2_1_0.xml'),
+            ('Section 1 2.0', 'section12.0/script1_2_0.xml'),
+            ('Section 1 2.0', 'section12.0/script2_2_0.xml'),
+            ('Section 2 1.0', 'section21.0/script3_1_0.xml'),
+            ('Section 2 2.0', 'section22.0/script3_2_0.xml')])
+
+        # The unchanged scripts are only loaded once for both releases
+        records = [r for r in map(json.loads, open(log_fp))
+            if r['event'] == 'script']
+        self.assertEqual([r['script'] for r in records], ['1.0/script1.py',
+            '1.0/script2.py', '1.0/script3.py', '2.0/script1.py',
+            '2.0/script2.py', '2.0/script3.py'])
+        self.assertTrue(all([r['status'] == 'ok' for r in records]))
+        self.assertEqual([r['import'] == 0.0 and r['xml'] == 0.0
+            for r in records[3:]], [True, True, False])
+
+        # Nothing changed
+        diff = integrate_releases(releases, galaxy_dir, True, None)
+        self.assertEqual(diff, {'new': [], 'modified': [],
+            'tool_conf_added': [], 'tool_conf_removed': []})
+        self.assertEqual(open(log_fp).read().count("Ok (unchanged)"), 6)
+
+        self.assertRaises(ValueError, integrate_releases, [releases[0],
+            releases[0]], galaxy_dir, True, None)
+        self.assertRaises(ValueError, integrate_releases, releases,
+            galaxy_dir, True, None, sandbox_imports=False)
+
 
 config_lines = """# At the begging we can have some comments
 # More than one line comments
@@ -252,30 +663,7 @@ exp_doc_new = """<?xml version="1.0" ?>
 </toolbox>
 """
 
-exp_doc_existing = """<?xml version="1.0" ?>
-<toolbox>
-\t
-\t
-\t<section id="exis_sect" name="Existing Section">
-\t\t
-\t\t
-\t\t<tool file="section_dir/file.xml"/>
-\t\t
-\t
-\t</section>
-\t
-\t
-\t<section id="getext" name="Get Data">
-\t\t
-\t\t
-\t\t<tool file="data_source/upload.xml"/>
-\t\t
-\t
-\t</section>
-\t
-
-</toolbox>
-"""
+exp_doc_existing = existing_tool_conf_lines
 
 exp_add_sect = """<?xml version="1.0" ?>
 <toolbox>
@@ -324,5 +712,35 @@ exp_update_2 = """<?xml version="1.0" ?>
 </toolbox>
 """
 
+exp_update_3 = """<?xml version="1.0" ?>
+<toolbox>
+\t<section id="section1" name="Section 1">
+\t\t<tool file="section1/script1.xml"/>
+\t\t<tool file="section1/script2.xml"/>
+\t\t<tool file="section1/script6.xml"/>
+\t</section>
+\t<section id="section2" name="Section 2">
+\t\t<tool file="section2/script3.xml"/>
+\t</section>
+\t<section id="section3" name="Section 3">
+\t\t<tool file="section3/script4.xml"/>
+\t\t<tool file="section3/script5.xml"/>
+\t</section>
+</toolbox>
+"""
+
+big_dynamic_script = """
+from optparse import make_option
+data = ' ' * (64 * 1024 * 1024)
+script_info = {}
+script_info['brief_description'] = "A script using %d bytes" % len(data)
+script_info['script_description'] = "Description"
+script_info['output_description'] = "Output"
+script_info['required_options'] = [make_option('-i', '--input_fp',
+    type='string', help='The input')]
+script_info['optional_options'] = []
+script_info['version'] = "1.0"
+"""
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
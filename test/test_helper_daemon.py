@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from shutil import rmtree
+from os import path, listdir, chdir, getcwd, chmod, getuid, stat
+from threading import Thread
+import tarfile
+import tempfile
+from helper_daemon import (HelperDaemon, call_helper, execute_request,
+    get_default_socket_path, is_trusted_socket, OPERATIONS)
+
+class HelperDaemonTest(TestCase):
+    def setUp(self):
+        test_dir = path.dirname(path.abspath(__file__))
+        self.tgz_dir = path.join(test_dir, 'support_files', 'tar_dir.tgz')
+        self.refseqs_fp = path.join(test_dir, 'support_files', 'refseqs.fasta')
+        self.blast_db_dirpath = path.join(test_dir, 'support_files',
+            'blast_db')
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.socket_path = path.join(self.tmp_dir, 'helper.sock')
+        self.daemon = None
+
+    def tearDown(self):
+        if self.daemon is not None:
+            self.daemon.shutdown()
+            self.daemon.server_close()
+        rmtree(self.tmp_dir)
+
+    def _start_daemon(self):
+        self.daemon = HelperDaemon(self.socket_path)
+        thread = Thread(target=self.daemon.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def _check_operations(self):
+        """Runs each helper operation through call_helper"""
+        out_dir = path.join(self.tmp_dir, 'extracted')
+        call_helper('extract', [self.tgz_dir, out_dir], self.socket_path)
+        self.assertEqual(sorted(listdir(out_dir)), ['file1.txt', 'file2.txt',
+            'file3.txt'])
+
+        out_tgz = path.join(self.tmp_dir, 'out.tgz')
+        call_helper('compress', [out_dir, out_tgz, 6, 1], self.socket_path)
+        self.assertEqual(sorted(tarfile.open(out_tgz).getnames()),
+            ['extracted', 'extracted/file1.txt', 'extracted/file2.txt',
+             'extracted/file3.txt'])
+
+        obs = call_helper('resolve', [self.blast_db_dirpath],
+            self.socket_path)
+        self.assertEqual(obs, path.join(self.blast_db_dirpath,
+            'refseqs.fasta'))
+        self.assertTrue(isinstance(obs, str))
+
+        obs = call_helper('resolve_cached', [self.refseqs_fp,
+            path.join(self.tmp_dir, 'cache'), None], self.socket_path)
+        self.assertEqual(obs, self.refseqs_fp)
+
+        self.assertRaises(ValueError, call_helper, 'resolve',
+            [self.tmp_dir], self.socket_path)
+        self.assertRaises(ValueError, call_helper, 'unknown', [],
+            self.socket_path)
+
+    def test_call_helper_daemon(self):
+        self._start_daemon()
+        # The relative paths are resolved in the client directory
+        old_cwd = getcwd()
+        chdir(self.tmp_dir)
+        try:
+            self._check_operations()
+            call_helper('extract', [self.tgz_dir, 'relative'],
+                self.socket_path)
+        finally:
+            chdir(old_cwd)
+        self.assertTrue(path.isdir(path.join(self.tmp_dir, 'relative')))
+
+    def test_call_helper_in_process(self):
+        # Nobody is listening on the socket
+        self._check_operations()
+
+    def test_helper_daemon_running(self):
+        self._start_daemon()
+        self.assertRaises(ValueError, HelperDaemon, self.socket_path)
+
+    def test_socket_permissions(self):
+        self.assertEqual(path.basename(path.dirname(
+            get_default_socket_path())), 'qiime_galaxy_helper_%d' % getuid())
+
+        self.assertFalse(is_trusted_socket(self.socket_path))
+        # The socket directory is created with mode 0700
+        self.socket_path = path.join(self.tmp_dir, 'private', 'helper.sock')
+        self._start_daemon()
+        self.assertEqual(stat(path.dirname(self.socket_path)).st_mode & 0777,
+            0700)
+        self.assertEqual(stat(self.socket_path).st_mode & 0777, 0600)
+        self.assertTrue(is_trusted_socket(self.socket_path))
+
+        # A socket in a directory writable by other users is not trusted, so
+        # the operations are executed in the current process
+        chmod(path.dirname(self.socket_path), 0777)
+        self.assertFalse(is_trusted_socket(self.socket_path))
+        self._check_operations()
+        self.assertRaises(ValueError, HelperDaemon,
+            path.join(path.dirname(self.socket_path), 'other.sock'))
+
+        # A file that is not a socket is not trusted
+        fake_fp = path.join(self.tmp_dir, 'fake.sock')
+        open(fake_fp, 'w').close()
+        self.assertFalse(is_trusted_socket(fake_fp))
+
+    def test_execute_request(self):
+        obs = execute_request({'op': 'resolve', 'args': [self.refseqs_fp]})
+        self.assertEqual(obs, {'result': self.refseqs_fp})
+
+        obs = execute_request({'op': 'resolve', 'args': [self.tmp_dir]})
+        self.assertEqual(obs['error'], 'ValueError')
+
+        obs = execute_request({'op': 'unknown', 'args': []})
+        self.assertEqual(obs['error'], 'ValueError')
+        obs = execute_request({'args': []})
+        self.assertEqual(obs['error'], 'ValueError')
+        self.assertEqual(sorted(OPERATIONS), ['compress', 'extract',
+            'resolve', 'resolve_cached'])
+
+if __name__ == '__main__':
+    main()
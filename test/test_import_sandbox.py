@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from optparse import make_option, NO_DEFAULT
+import json
+from os import path
+from shutil import rmtree
+import sys
+import tempfile
+from import_sandbox import (ImportSandbox, ScriptImportError,
+    serialize_option, serialize_script_info, deserialize_script_info)
+from script_info_extractor import get_script_info
+
+class ImportSandboxTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def _write_script(self, name, contents):
+        script_fp = path.join(self.tmp_dir, name)
+        f = open(script_fp, 'w')
+        f.write(contents)
+        f.close()
+        return script_fp
+
+    def test_serialize_option(self):
+        option = make_option('-i', '--input_fp', type='string',
+            help='the input file')
+        self.assertEqual(serialize_option(option), {'opts': ['-i',
+            '--input_fp'], 'action': 'store', 'type': 'string',
+            'help': 'the input file', 'choices': None, 'mchoices': None,
+            'default': None})
+
+        option = make_option('-n', type='int', default=5)
+        self.assertEqual(serialize_option(option)['default'], '5')
+
+    def test_serialize_script_info(self):
+        script_info = {'brief_description': 'A script',
+            'script_usage': [('Example', 'An example', '%prog -i in')],
+            'required_options': [make_option('-i', '--input_fp',
+                type='choice', choices=['a', 'b'], help='the input')],
+            'optional_options': [make_option('--verbose',
+                action='store_true', default=False)],
+            'not_serializable': object()}
+        obs = deserialize_script_info(json.loads(json.dumps(
+            serialize_script_info(script_info))))
+        self.assertEqual(sorted(obs.keys()), ['brief_description',
+            'optional_options', 'required_options', 'script_usage'])
+        self.assertEqual(obs['brief_description'], 'A script')
+        self.assertEqual(obs['script_usage'],
+            [['Example', 'An example', '%prog -i in']])
+
+        [req] = obs['required_options']
+        self.assertEqual(req.get_opt_string(), '--input_fp')
+        self.assertEqual(req._short_opts, ['-i'])
+        self.assertEqual(req.type, 'choice')
+        self.assertEqual(req.choices, ['a', 'b'])
+        self.assertEqual(req.default, NO_DEFAULT)
+
+        [opt] = obs['optional_options']
+        self.assertEqual(opt.action, 'store_true')
+        self.assertEqual(opt.default, 'False')
+
+    def test_get_script_info(self):
+        # The script_info is built dynamically, so it has to be imported
+        script_fp = self._write_script('dynamic_script.py',
+            "from optparse import make_option\n"
+            "script_info = {}\n"
+            "script_info['brief_description'] = 'Dynamic'\n"
+            "script_info['required_options'] = [make_option('-%s' % 'i',"
+            " type='string', help='the input')]\n")
+        sandbox = ImportSandbox(timeout=30)
+        self.assertEqual(sandbox.last_rss_delta, None)
+        obs = sandbox.get_script_info(script_fp)
+        self.assertEqual(obs['brief_description'], 'Dynamic')
+        self.assertTrue(sandbox.last_rss_delta >= 0)
+        self.assertEqual(obs['required_options'][0].get_opt_string(), '-i')
+
+        # The script is not imported in the current process
+        self.assertFalse('dynamic_script' in sys.modules)
+
+        # get_script_info only uses the sandbox if the script has to be
+        # imported
+        obs = get_script_info(script_fp, sandbox)
+        self.assertEqual(obs['brief_description'], 'Dynamic')
+        self.assertFalse('dynamic_script' in sys.modules)
+
+    def test_get_script_info_rss_delta(self):
+        # The memory used by the import is measured in the child process
+        script_fp = self._write_script('big_script.py',
+            "data = ' ' * (64 * 1024 * 1024)\n"
+            "script_info = {'brief_description': 'Big %d' % len(data)}\n")
+        sandbox = ImportSandbox(timeout=30)
+        obs = sandbox.get_script_info(script_fp)
+        self.assertEqual(obs['brief_description'], 'Big %d' % (64 * 1024 *
+            1024))
+        self.assertTrue(sandbox.last_rss_delta >= 60 * 1024)
+
+    def test_get_script_info_errors(self):
+        script_fp = self._write_script('raising_script.py',
+            "raise ValueError('broken script')\n")
+        self.assertRaises(ScriptImportError,
+            ImportSandbox().get_script_info, script_fp)
+        try:
+            ImportSandbox().get_script_info(script_fp)
+        except ScriptImportError as exc:
+            self.assertTrue('ValueError: broken script' in str(exc))
+
+        script_fp = self._write_script('hanging_script.py',
+            "import time\ntime.sleep(60)\n")
+        self.assertRaises(ScriptImportError,
+            ImportSandbox(timeout=1).get_script_info, script_fp)
+
+        script_fp = self._write_script('greedy_script.py',
+            "data = ' ' * (1024 * 1024 * 1024)\n")
+        self.assertRaises(ScriptImportError,
+            ImportSandbox(memory_limit=256).get_script_info, script_fp)
+        # The address space is not limited by default
+        ImportSandbox().get_script_info(self._write_script('big_script.py',
+            "data = ' ' * (300 * 1024 * 1024)\nscript_info = {}\n"))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from hashlib import sha1
+from os import path
+from shutil import rmtree, copyfile
+import tempfile
+from atomic_write import file_digest
+from integration_cache import (compute_script_key, get_generator_digest,
+    IntegrationCache, GENERATOR_MODULES)
+
+class IntegrationCacheTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+        test_dir = path.dirname(path.abspath(__file__))
+        self.script1 = path.join(test_dir, './support_files/script1.py')
+        self.script3 = path.join(test_dir, './support_files/script3.py')
+
+        self.xml_fp = path.join(self.tmp_dir, 'script1.xml')
+        f = open(self.xml_fp, 'w')
+        f.close()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_compute_script_key(self):
+        key = compute_script_key(self.script1, None)
+        self.assertEqual(key, compute_script_key(self.script1, None))
+        self.assertNotEqual(key, compute_script_key(self.script1, 'opt1'))
+        self.assertNotEqual(compute_script_key(self.script1, 'opt1'),
+            compute_script_key(self.script1, 'opt1,opt2'))
+
+        # Same source code in a different path gives the same key
+        script_fp = path.join(self.tmp_dir, 'script1.py')
+        copyfile(self.script1, script_fp)
+        self.assertEqual(key, compute_script_key(script_fp, None))
+
+        # Modified source code gives a different key
+        f = open(script_fp, 'a')
+        f.write("\n# A change\n")
+        f.close()
+        self.assertNotEqual(key, compute_script_key(script_fp, None))
+
+    def test_get_generator_digest(self):
+        exp = sha1()
+        for module_name in GENERATOR_MODULES:
+            module_fp = path.splitext(__import__(module_name).__file__)[0] + \
+                '.py'
+            exp.update('%s\0%s\0' % (module_name, file_digest(module_fp)))
+        self.assertEqual(get_generator_digest(), exp.hexdigest())
+
+        # The modules reading the script_info change the generated XML too
+        self.assertEqual(GENERATOR_MODULES, ['xml_generator',
+            'xml_stream_writer', 'script_info_extractor', 'import_sandbox',
+            'script_info_snapshot'])
+
+    def test_is_fresh(self):
+        cache = IntegrationCache(path.join(self.tmp_dir, 'cache.json'))
+        key = compute_script_key(self.script1, None)
+        self.assertFalse(cache.is_fresh('script1.py', key, self.xml_fp))
+
+        cache.update('script1.py', key)
+        self.assertTrue(cache.is_fresh('script1.py', key, self.xml_fp))
+        self.assertFalse(cache.is_fresh('script1.py', 'other_key',
+            self.xml_fp))
+        self.assertFalse(cache.is_fresh('script1.py', key,
+            path.join(self.tmp_dir, 'missing.xml')))
+
+        cache.remove('script1.py')
+        self.assertFalse(cache.is_fresh('script1.py', key, self.xml_fp))
+
+    def test_save(self):
+        cache_fp = path.join(self.tmp_dir, 'cache.json')
+        cache = IntegrationCache(cache_fp)
+        key = compute_script_key(self.script1, None)
+        cache.update('script1.py', key)
+        cache.save()
+
+        cache = IntegrationCache(cache_fp)
+        self.assertTrue(cache.is_fresh('script1.py', key, self.xml_fp))
+
+        # A corrupted cache file starts an empty cache
+        f = open(cache_fp, 'w')
+        f.write("Not a cache file")
+        f.close()
+        cache = IntegrationCache(cache_fp)
+        self.assertFalse(cache.is_fresh('script1.py', key, self.xml_fp))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from os import path, utime
+from shutil import rmtree
+import tempfile
+from integration_config import (ScriptEntry, IntegrationConfig,
+    parse_config_lines, load_config)
+
+class IntegrationConfigTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        test_dir = path.dirname(path.abspath(__file__))
+        self.config_files_dir = path.join(test_dir, '..', 'config_files')
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def _write(self, name, contents):
+        fp = path.join(self.tmp_dir, name)
+        f = open(fp, 'w')
+        f.write(contents)
+        f.close()
+        return fp
+
+    def test_script_entry(self):
+        entry = ScriptEntry('Section 1', frozenset(['opt2', 'opt1']))
+        self.assertEqual(entry.get_remove_opts_string(), 'opt1,opt2')
+        entry = ScriptEntry('Section 1', frozenset())
+        self.assertEqual(entry.get_remove_opts_string(), None)
+
+    def test_integration_config(self):
+        config = IntegrationConfig(['S1', 'S2'], [
+            ('b.py', ScriptEntry('S1', frozenset())),
+            ('a.py', ScriptEntry('S2', frozenset(['opt']))),
+            ('c.py', ScriptEntry('S1', frozenset()))])
+        self.assertEqual(config.sections, ('S1', 'S2'))
+        self.assertEqual(list(config), ['b.py', 'a.py', 'c.py'])
+        self.assertEqual(len(config), 3)
+        self.assertTrue('a.py' in config)
+        self.assertFalse('d.py' in config)
+        self.assertEqual(config['a.py'].remove_opts, frozenset(['opt']))
+        self.assertEqual(config.get('d.py'), None)
+        self.assertEqual(config.get_section_scripts('S1'), ('b.py', 'c.py'))
+        self.assertRaises(AttributeError, setattr, config, 'sections', ())
+
+    def test_parse_config_lines(self):
+        config = parse_config_lines(config_lines.splitlines(True))
+        self.assertEqual(config.sections, ('Section 1', 'Section 2'))
+        self.assertEqual(list(config), ['script1.py', 'script2.py',
+            'script3.py'])
+        self.assertEqual(config['script2.py'], ScriptEntry('Section 1',
+            frozenset(['option1', 'option2'])))
+        self.assertEqual(config['script3.py'], ScriptEntry('Section 2',
+            frozenset()))
+
+    def test_parse_config_lines_errors(self):
+        # All the errors are reported at once
+        try:
+            parse_config_lines(bad_config_lines.splitlines(True), 'bad.conf')
+        except ValueError as exc:
+            msg = str(exc)
+        else:
+            self.fail("ValueError not raised")
+        for error in ["bad.conf:1: script script0.py is not under a section",
+                "bad.conf:5: duplicate script script1.py, already listed at" +
+                " bad.conf:3",
+                "bad.conf:6: invalid option name 'bad-opt'",
+                "bad.conf:7: repeated option in 'opt1,opt1'",
+                "bad.conf:8: unknown directive %exclude",
+                "bad.conf:9: cannot remove script9.py, it is not listed",
+                "bad.conf:10: malformed line 'script5.py opt1 opt2'"]:
+            self.assertTrue(error in msg, error)
+
+    def test_load_config_include(self):
+        self._write('base.conf', base_config)
+        config_fp = self._write('release.conf', release_config)
+        config = load_config(config_fp)
+        self.assertEqual(config.sections, ('Release',))
+        self.assertEqual(list(config), ['script1.py', 'script2.py',
+            'script4.py'])
+        # The included scripts are in the section of the include directive
+        self.assertEqual(config['script1.py'], ScriptEntry('Release',
+            frozenset(['opt1'])))
+        # Overridden entry
+        self.assertEqual(config['script2.py'].remove_opts, frozenset())
+
+    def test_load_config_include_errors(self):
+        self._write('cycle.conf', "\tS\n%include cycle.conf\n")
+        self.assertRaises(ValueError, load_config,
+            path.join(self.tmp_dir, 'cycle.conf'))
+        self._write('missing.conf', "\tS\n%include other.conf\n")
+        self.assertRaises(ValueError, load_config,
+            path.join(self.tmp_dir, 'missing.conf'))
+        # The same script from two included files
+        self._write('base.conf', base_config)
+        self._write('base2.conf', "script1.py\n")
+        self._write('twice.conf', "\tS\n%include base.conf\n" +
+            "%include base2.conf\n")
+        self.assertRaises(ValueError, load_config,
+            path.join(self.tmp_dir, 'twice.conf'))
+
+    def test_load_config_memo(self):
+        base_fp = self._write('base.conf', base_config)
+        config_fp = self._write('release.conf', release_config)
+        config = load_config(config_fp)
+        self.assertTrue(load_config(config_fp) is config)
+
+        # A change in an included file is detected
+        self._write('base.conf', base_config + "script5.py\n")
+        utime(base_fp, (0, 0))
+        obs = load_config(config_fp)
+        self.assertFalse(obs is config)
+        self.assertTrue('script5.py' in obs)
+
+    def test_load_config_qiime_files(self):
+        for version, num_scripts in [('1.7.0', 130), ('1.8.0', 134),
+                ('1.9.0', 145)]:
+            config = load_config(path.join(self.config_files_dir,
+                'QIIME_%s.conf' % version))
+            self.assertEqual(config.sections, ('QIIME %s' % version,))
+            self.assertEqual(len(config), num_scripts)
+        self.assertEqual(config['summarize_taxa.py'].remove_opts,
+            frozenset())
+        self.assertTrue('check_id_map.py' not in config)
+
+config_lines = """# At the begging we can have some comments
+# More than one line comments
+\tSection 1
+script1.py
+script2.py\toption1,option2
+
+\tSection 2
+script3.py
+"""
+
+bad_config_lines = """script0.py
+\tSection 1
+script1.py
+script2.py
+script1.py
+script3.py\tbad-opt
+script4.py\topt1,opt1
+%exclude script2.py
+%remove script9.py
+script5.py opt1 opt2
+"""
+
+base_config = """# Scripts shared by the releases
+\tBase
+script1.py\topt1
+script2.py\topt2
+script3.py
+"""
+
+release_config = """\tRelease
+%include base.conf
+%remove script3.py
+script2.py
+script4.py
+"""
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from StringIO import StringIO
+import json
+from integration_log import IntegrationLog, get_peak_rss
+
+class IntegrationLogTest(TestCase):
+    def setUp(self):
+        self.out = StringIO()
+        self.fast = {'wall': 0.5, 'import': 0.25, 'xml': 0.125,
+            'write': 0.125, 'rss_delta': 512}
+        self.slow = {'wall': 2.0, 'import': 1.5, 'xml': 0.25,
+            'write': 0.25, 'rss_delta': 2048}
+
+    def _log_run(self, log):
+        log.script('fast.py', 'ok', timings=self.fast)
+        log.script('slow.py', 'ok', timings=self.slow)
+        log.script('same.py', 'unchanged')
+        log.script('other.py', 'skipped')
+        log.script('gone.py', 'missing')
+        log.script('bad.py', 'failed', error="<type 'exceptions.IOError'> : X")
+        log.step("Generating tool_conf", 0.01)
+        log.summary(3.0)
+
+    def test_get_peak_rss(self):
+        self.assertTrue(get_peak_rss() > 0)
+
+    def test_text_log(self):
+        self._log_run(IntegrationLog(self.out, top_n=1))
+        self.assertEqual(self.out.getvalue(), exp_text_log)
+
+    def test_json_log(self):
+        self._log_run(IntegrationLog(self.out, 'json', top_n=5))
+        records = map(json.loads, self.out.getvalue().splitlines())
+        self.assertEqual(len(records), 8)
+        self.assertEqual(records[0], {'event': 'script', 'script': 'fast.py',
+            'status': 'ok', 'wall': 0.5, 'import': 0.25, 'xml': 0.125,
+            'write': 0.125, 'rss_delta': 512})
+        self.assertEqual(records[4]['status'], 'missing')
+        self.assertEqual(records[5]['error'],
+            "<type 'exceptions.IOError'> : X")
+        self.assertEqual(records[6], {'event': 'step',
+            'step': 'Generating tool_conf', 'status': 'ok', 'elapsed': 0.01})
+        self.assertEqual(records[7], {'event': 'summary', 'elapsed': 3.0,
+            'ok': 2, 'unchanged': 1, 'skipped': 1, 'missing': 1, 'failed': 1,
+            'slowest': [['slow.py', 2.0], ['fast.py', 0.5]]})
+
+    def test_wrong_format(self):
+        self.assertRaises(ValueError, IntegrationLog, self.out, 'xml')
+
+exp_text_log = """Generating XML file for fast.py script... Ok [wall: 0.500s, \
+import: 0.250s, xml: 0.125s, write: 0.125s, peak RSS delta: 512 KB]
+Generating XML file for slow.py script... Ok [wall: 2.000s, \
+import: 1.500s, xml: 0.250s, write: 0.250s, peak RSS delta: 2048 KB]
+Generating XML file for same.py script... Ok (unchanged)
+Generating XML file for other.py script... skipped - not in configuration file
+Generating XML file for gone.py script... missing - not in scripts directory
+Generating XML file for bad.py script... <type 'exceptions.IOError'> : X
+Generating tool_conf... Ok
+Integration summary: 2 scripts generated, 1 unchanged, 1 skipped, 1 missing, \
+1 failed in 3.000s
+Slowest scripts:
+\tslow.py\t2.000s
+"""
+
+if __name__ == '__main__':
+    main()
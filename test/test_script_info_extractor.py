@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from os import path, remove
+import sys
+import tempfile
+from imp import load_source
+from optparse import NO_DEFAULT
+from script_info_extractor import (StaticOption, DynamicScriptInfoError,
+    extract_script_info, get_script_info)
+from xml_generator import ScriptInfo, generate_xml_string
+
+class StaticOptionTest(TestCase):
+    def test_init(self):
+        obs = StaticOption('-i', '--input_fp', type='existing_filepath',
+            help='Input file')
+        self.assertEqual(obs._short_opts, ['-i'])
+        self.assertEqual(obs._long_opts, ['--input_fp'])
+        self.assertEqual(obs.action, 'store')
+        self.assertEqual(obs.type, 'existing_filepath')
+        self.assertEqual(obs.help, 'Input file')
+        self.assertEqual(obs.default, NO_DEFAULT)
+        self.assertEqual(obs.get_opt_string(), '--input_fp')
+
+        obs = StaticOption('-f', action='store_true', help='Flag')
+        self.assertEqual(obs.type, None)
+        self.assertEqual(obs.get_opt_string(), '-f')
+
+        obs = StaticOption('-c', choices=['a', 'b'], help='Choice')
+        self.assertEqual(obs.type, 'choice')
+
+        obs = StaticOption('-n', type='str', default=5, help='Number')
+        self.assertEqual(obs.type, 'string')
+        self.assertEqual(obs.default, 5)
+
+class ScriptInfoExtractorTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.gettempdir()
+
+        test_dir = path.dirname(path.abspath(__file__))
+        self.script_fp = path.join(test_dir, './support_files/example_script.py')
+
+        self._paths_to_clean_up = []
+
+    def tearDown(self):
+        map(remove, self._paths_to_clean_up)
+
+    def _write_script(self, source):
+        fd, script_fp = tempfile.mkstemp(dir=self.tmp_dir, suffix='.py')
+        self._paths_to_clean_up.append(script_fp)
+        f = open(script_fp, 'w')
+        f.write(source)
+        f.close()
+        return script_fp
+
+    def test_extract_script_info(self):
+        obs = extract_script_info(self.script_fp)
+        self.assertEqual(obs['brief_description'],
+            "An example of brief description")
+        self.assertEqual(obs['version'], "1.4.0-dev")
+        self.assertEqual(len(obs['required_options']), 2)
+        self.assertEqual(len(obs['optional_options']), 2)
+        opt = obs['optional_options'][0]
+        self.assertEqual(opt.get_opt_string(), '--choice_ex')
+        self.assertEqual(opt.type, 'choice')
+        self.assertEqual(opt.choices, ['choice1', 'choice2', 'choice3'])
+
+        obs = extract_script_info(self._write_script(static_script))
+        self.assertEqual(obs['version'], "1.2.3")
+        self.assertEqual(obs['brief_description'], "A brief description")
+        opt = obs['optional_options'][0]
+        self.assertEqual(opt.help, "A help string split in two lines")
+        self.assertEqual(opt.default, -1)
+        self.assertEqual(opt.type, 'int')
+
+    def test_extract_script_info_same_xml(self):
+        """The extracted script_info generates the same XML as the imported"""
+        exp_info = load_source('example_script', self.script_fp).script_info
+        obs_info = extract_script_info(self.script_fp)
+        exp = generate_xml_string(ScriptInfo(exp_info, 'example_script',
+            'example_script.py'))
+        obs = generate_xml_string(ScriptInfo(obs_info, 'example_script',
+            'example_script.py'))
+        self.assertEqual(obs, exp)
+
+    def test_extract_script_info_dynamic(self):
+        self.assertRaises(DynamicScriptInfoError, extract_script_info,
+            self._write_script(dynamic_default_script))
+        self.assertRaises(DynamicScriptInfoError, extract_script_info,
+            self._write_script(modified_script))
+        self.assertRaises(DynamicScriptInfoError, extract_script_info,
+            self._write_script(no_script_info_script))
+
+    def test_extract_script_info_mutated_names(self):
+        """The variables modified by any statement are not used"""
+        for source in [appended_options_script, subscript_options_script,
+                       aliased_options_script, late_append_script,
+                       import_rebind_script, star_import_script,
+                       late_star_import_script]:
+            self.assertRaises(DynamicScriptInfoError, extract_script_info,
+                self._write_script(source))
+
+        # Rebinding a variable does not modify the value already used
+        obs = extract_script_info(self._write_script(rebound_options_script))
+        self.assertEqual([o.get_opt_string() for o in
+            obs['optional_options']], ['--alpha'])
+
+        # A star import only forgets the variables defined before it
+        obs = extract_script_info(self._write_script(
+            early_star_import_script))
+        self.assertEqual([o.get_opt_string() for o in
+            obs['optional_options']], ['--alpha'])
+
+    def test_get_script_info(self):
+        obs = get_script_info(self.script_fp)
+        self.assertEqual(obs['version'], "1.4.0-dev")
+
+        # Dynamic script_info: the script is imported
+        script_fp = self._write_script(dynamic_default_script)
+        tmp_dir, script_name = path.split(script_fp)
+        sys.path.insert(0, tmp_dir)
+        try:
+            obs = get_script_info(script_fp)
+        finally:
+            sys.path.remove(tmp_dir)
+        if path.exists(script_fp + 'c'):
+            self._paths_to_clean_up.append(script_fp + 'c')
+        self.assertEqual(obs['optional_options'][0].default, 3)
+
+static_script = """
+from cogent.util.option_parsing import make_option
+__version__ = "1.2.3"
+
+script_info = {'brief_description': "A brief description"}
+script_info['script_description'] = "A description"
+script_info['output_description'] = "An output description"
+script_info['required_options'] = []
+script_info['optional_options'] = [
+    make_option('-n', '--number', type=int, default=-1,
+        help="A help string " + "split in two lines")
+]
+script_info['version'] = __version__
+
+if __name__ == '__main__':
+    parse_command_line_parameters(**script_info)
+"""
+
+dynamic_default_script = """
+from cogent.util.option_parsing import make_option
+default_number = len('abc')
+
+script_info = {}
+script_info['brief_description'] = "A brief description"
+script_info['script_description'] = "A description"
+script_info['output_description'] = "An output description"
+script_info['required_options'] = []
+script_info['optional_options'] = [
+    make_option('-n', '--number', type='int', default=default_number,
+        help="A number")
+]
+script_info['version'] = "1.2.3"
+"""
+
+modified_script = """
+from cogent.util.option_parsing import make_option
+
+script_info = {}
+script_info['brief_description'] = "A brief description"
+script_info['required_options'] = []
+script_info['required_options'].append(make_option('-n', help="A number"))
+"""
+
+options_script_tail = """
+script_info = {}
+script_info['brief_description'] = "A brief description"
+script_info['required_options'] = []
+script_info['optional_options'] = opts
+"""
+
+appended_options_script = """
+from cogent.util.option_parsing import make_option
+opts = [make_option('--alpha')]
+opts.append(make_option('--beta'))
+""" + options_script_tail
+
+subscript_options_script = """
+from cogent.util.option_parsing import make_option
+opts = [make_option('--alpha')]
+opts[0] = make_option('--gamma')
+""" + options_script_tail
+
+aliased_options_script = """
+from cogent.util.option_parsing import make_option
+opts = [make_option('--alpha')]
+alias = opts
+alias += [make_option('--beta')]
+""" + options_script_tail
+
+late_append_script = """
+from cogent.util.option_parsing import make_option
+opts = [make_option('--alpha')]
+""" + options_script_tail + """
+opts.append(make_option('--beta'))
+"""
+
+import_rebind_script = """
+from cogent.util.option_parsing import make_option
+opts = [make_option('--alpha')]
+from other_module import opts
+""" + options_script_tail
+
+star_import_script = """
+from cogent.util.option_parsing import make_option
+opts = [make_option('--alpha')]
+from other_module import *
+""" + options_script_tail
+
+late_star_import_script = """
+from cogent.util.option_parsing import make_option
+opts = [make_option('--alpha')]
+""" + options_script_tail + """
+from other_module import *
+"""
+
+early_star_import_script = """
+from cogent.util.option_parsing import *
+opts = [make_option('--alpha')]
+""" + options_script_tail
+
+rebound_options_script = """
+from cogent.util.option_parsing import make_option
+opts = [make_option('--alpha')]
+""" + options_script_tail + """
+opts = [make_option('--beta')]
+"""
+
+no_script_info_script = """
+print "This script does not have a script_info"
+"""
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from os import path
+from shutil import rmtree
+import tempfile
+from script_info_snapshot import (ScriptInfoSnapshot, export_snapshot,
+    save_snapshot, load_snapshot)
+from xml_generator import make_xml_string
+
+class ScriptInfoSnapshotTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        support_dir = path.join(path.dirname(path.abspath(__file__)),
+            'support_files')
+        self.scripts = [(name, path.join(support_dir, name)) for name in
+            ['script1.py', 'script2.py', 'script3.py', 'example_script.py']]
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_export_snapshot(self):
+        bad_fp = path.join(self.tmp_dir, 'bad_script.py')
+        f = open(bad_fp, 'w')
+        f.write("x = 1\n")
+        f.close()
+
+        snapshot, errors = export_snapshot(self.scripts +
+            [('bad_script.py', bad_fp)], release='1.9.0')
+        self.assertEqual(list(snapshot), ['example_script.py', 'script1.py',
+            'script2.py', 'script3.py'])
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot.release, '1.9.0')
+        self.assertEqual([name for name, error in errors], ['bad_script.py'])
+        self.assertFalse('bad_script.py' in snapshot)
+
+        # Only the keys used to build the ScriptInfo objects are stored
+        self.assertEqual(sorted(snapshot.get_entry('script1.py')),
+            ['brief_description', 'optional_options', 'output_description',
+             'required_options', 'script_description', 'version'])
+
+        # The XML generated from the snapshot is the same
+        for name, script_fp in self.scripts:
+            self.assertEqual(make_xml_string(name, None, snapshot=snapshot),
+                make_xml_string(script_fp, None))
+        self.assertEqual(make_xml_string('example_script.py', 'repeat_ex',
+            snapshot=snapshot), make_xml_string(self.scripts[3][1],
+            'repeat_ex'))
+
+        self.assertRaises(ValueError, snapshot.get_script_info, 'missing.py')
+
+    def test_save_load_snapshot(self):
+        snapshot, errors = export_snapshot(self.scripts, jobs=2)
+        self.assertEqual(errors, [])
+        for name in ['snapshot.json', 'snapshot.json.gz']:
+            snapshot_fp = path.join(self.tmp_dir, name)
+            self.assertEqual(save_snapshot(snapshot, snapshot_fp), "new")
+            # Saving the same snapshot does not rewrite the file
+            self.assertEqual(save_snapshot(snapshot, snapshot_fp), None)
+
+            obs = load_snapshot(snapshot_fp)
+            self.assertEqual(list(obs), list(snapshot))
+            self.assertEqual(obs.release, None)
+            self.assertEqual(obs.to_json(), snapshot.to_json())
+            self.assertEqual(make_xml_string('script2.py', 'choice_ex',
+                snapshot=obs), make_xml_string('script2.py', 'choice_ex',
+                snapshot=snapshot))
+
+        bad_fp = path.join(self.tmp_dir, 'bad.json')
+        f = open(bad_fp, 'w')
+        f.write('{"scripts": {}}')
+        f.close()
+        self.assertRaises(ValueError, load_snapshot, bad_fp)
+
+if __name__ == '__main__':
+    main()
@@ -11,10 +11,16 @@ __status__ = "Development"
 
 from cogent.util.unit_test import TestCase, main
 from shutil import rmtree, copyfile
-from os import mkdir, path, remove
-from tgz_manager import compress_to_tgz, extract_from_tgz, ERROR_MSG
+from os import mkdir, path, remove, listdir, getcwd, chdir, stat, environ
+from subprocess import call
+from tgz_manager import (compress_to_tgz, extract_from_tgz, ERROR_MSG,
+    XZ_ERROR_MSG, ParallelGzipFile, sniff_archive_format, link_or_copy,
+    extract_if_is_tgz)
 from cogent.app.util import get_tmp_filename
+import gzip
+import tarfile
 import tempfile
+import zlib
 
 class TgzManagerTest(TestCase):
     def setUp(self):
@@ -68,6 +74,54 @@ class TgzManagerTest(TestCase):
         self.assertTrue(path.exists(output_tgz), 'The tgz file was not created in the appropiate location')
 
 
+    def test_compress_to_tgz_threads(self):
+        dirname = get_tmp_filename(tmp_dir=self.tmp_dir)
+        mkdir(dirname)
+        self._dirs_to_clean_up = [dirname]
+        contents = {}
+        for i, size in enumerate([0, 1000, 300000]):
+            filename = path.join(dirname, 'file%d.txt' % i)
+            contents[filename] = ''.join([str(j % 97) for j in range(size)])
+            f = open(filename, 'w')
+            f.write(contents[filename])
+            f.close()
+
+        output_tgz = get_tmp_filename(tmp_dir=self.tmp_dir, suffix='.tgz')
+        self._paths_to_clean_up = [output_tgz]
+        compress_to_tgz(dirname, output_tgz, compresslevel=6, threads=4)
+        self.assertTrue(path.exists(output_tgz), 'The tgz file was not created in the appropiate location')
+
+        path_name = get_tmp_filename(tmp_dir=self.tmp_dir)
+        self._dirs_to_clean_up.append(path_name)
+        extract_from_tgz(output_tgz, path_name)
+        for filename, content in contents.items():
+            extracted_fp = path.join(path_name, path.basename(dirname),
+                path.basename(filename))
+            self.assertEqual(open(extracted_fp).read(), content)
+
+    def test_parallel_gzip_file(self):
+        data = ''.join([str(i % 1013) for i in range(100000)])
+        output_gz = get_tmp_filename(tmp_dir=self.tmp_dir, suffix='.gz')
+        self._paths_to_clean_up = [output_gz]
+
+        gz = ParallelGzipFile(output_gz, compresslevel=6, threads=3,
+            block_size=10000)
+        for start in range(0, len(data), 7777):
+            gz.write(data[start:start + 7777])
+        self.assertEqual(gz.tell(), len(data))
+        gz.close()
+
+        self.assertEqual(gzip.open(output_gz).read(), data)
+        # zlib only decompresses the first member of a gzip file: the output
+        # must be a single member
+        self.assertEqual(zlib.decompress(open(output_gz, 'rb').read(),
+            16 + zlib.MAX_WBITS), data)
+
+        # Empty file
+        gz = ParallelGzipFile(output_gz)
+        gz.close()
+        self.assertEqual(gzip.open(output_gz).read(), '')
+
     def test_extract_from_tgz(self):
         #test with a tgz file which contains only one file
         filename = get_tmp_filename(tmp_dir=self.tmp_dir)
@@ -108,5 +162,151 @@ class TgzManagerTest(TestCase):
 
         self.assertRaises(ValueError, extract_from_tgz, filename, "")
 
+    def test_extract_from_tgz_single_pass(self):
+        out_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        cwd_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [out_dir, cwd_dir]
+
+        # The current working directory is not used during the extraction
+        old_cwd = getcwd()
+        chdir(cwd_dir)
+        try:
+            extract_from_tgz(self.tgz_file, path.join(out_dir, 'single'))
+            extract_from_tgz(self.tgz_dir, path.join(out_dir, 'multiple'))
+        finally:
+            chdir(old_cwd)
+        self.assertEqual(listdir(cwd_dir), [])
+        # No temporary directories are left next to the output path
+        self.assertEqual(sorted(listdir(out_dir)), ['multiple', 'single'])
+        self.assertTrue(path.isfile(path.join(out_dir, 'single')))
+        self.assertEqual(sorted(listdir(path.join(out_dir, 'multiple'))),
+            [self.tgz_dir_file1, self.tgz_dir_file2, self.tgz_dir_file3])
+
+        # Extracting on an existing directory keeps its contents
+        existing = path.join(out_dir, 'existing')
+        mkdir(existing)
+        open(path.join(existing, 'other.txt'), 'w').close()
+        extract_from_tgz(self.tgz_dir, existing)
+        self.assertEqual(sorted(listdir(existing)), [self.tgz_dir_file1,
+            self.tgz_dir_file2, self.tgz_dir_file3, 'other.txt'])
+
+        # Uncompressed and bzip2 tar files are also extracted
+        src_dir = path.join(out_dir, 'multiple')
+        for mode in ['w', 'w:bz2']:
+            tar_fp = path.join(out_dir, 'archive.tar')
+            t = tarfile.open(tar_fp, mode)
+            t.add(src_dir, arcname='')
+            t.close()
+            result = path.join(out_dir, 'result_%s' % mode.replace(':', ''))
+            extract_from_tgz(tar_fp, result)
+            self.assertEqual(sorted(listdir(result)), [self.tgz_dir_file1,
+                self.tgz_dir_file2, self.tgz_dir_file3])
+
+    def test_extract_from_tgz_single_dir_attributes(self):
+        out_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [out_dir]
+
+        # A tgz file with a single, empty, directory
+        tgz_fp = path.join(out_dir, 'empty_dir.tgz')
+        t = tarfile.open(tgz_fp, 'w:gz')
+        member = tarfile.TarInfo('empty_dir')
+        member.type = tarfile.DIRTYPE
+        member.mode = 0755
+        member.mtime = 1234567890
+        t.addfile(member)
+        t.close()
+
+        result = path.join(out_dir, 'result')
+        extract_from_tgz(tgz_fp, result)
+        self.assertTrue(path.isdir(result))
+        self.assertEqual(stat(result).st_mode & 0777, 0755)
+        self.assertEqual(int(stat(result).st_mtime), 1234567890)
+
+    def test_sniff_archive_format(self):
+        out_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [out_dir]
+
+        self.assertEqual(sniff_archive_format(self.tgz_file), 'gzip')
+        self.assertEqual(sniff_archive_format(self.tgz_dir), 'gzip')
+
+        plain_fp = path.join(out_dir, 'plain.fna')
+        f = open(plain_fp, 'w')
+        f.write(">seq1\nACGT\n" * 100)
+        f.close()
+        self.assertEqual(sniff_archive_format(plain_fp), None)
+
+        empty_fp = path.join(out_dir, 'empty.txt')
+        open(empty_fp, 'w').close()
+        self.assertEqual(sniff_archive_format(empty_fp), None)
+
+        for mode, exp in [('w', 'tar'), ('w:bz2', 'bz2'), ('w:gz', 'gzip')]:
+            tar_fp = path.join(out_dir, 'archive_%s' % mode.replace(':', ''))
+            t = tarfile.open(tar_fp, mode)
+            t.add(plain_fp, arcname='plain.fna')
+            t.close()
+            self.assertEqual(sniff_archive_format(tar_fp), exp)
+
+        f = open(path.join(out_dir, 'archive.xz'), 'wb')
+        f.write('\xfd7zXZ\x00\x00')
+        f.close()
+        self.assertEqual(sniff_archive_format(path.join(out_dir,
+            'archive.xz')), 'xz')
+
+    def test_extract_from_tgz_xz(self):
+        out_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [out_dir]
+
+        tar_fp = path.join(out_dir, 'archive.tar')
+        t = tarfile.open(tar_fp, 'w')
+        t.add(self.tgz_file, arcname='file1.txt')
+        t.close()
+        try:
+            if call(['xz', tar_fp]) != 0:
+                return
+        except OSError:
+            # The xz tool is not installed
+            return
+
+        extract_from_tgz(tar_fp + '.xz', path.join(out_dir, 'result'))
+        self.assertTrue(path.isfile(path.join(out_dir, 'result')))
+
+    def test_extract_from_tgz_xz_missing(self):
+        out_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [out_dir]
+
+        xz_fp = path.join(out_dir, 'archive.tar.xz')
+        f = open(xz_fp, 'wb')
+        f.write('\xfd7zXZ\x00\x00')
+        f.close()
+        # Without the xz tool, the archive is neither extracted nor linked
+        old_path = environ.get('PATH')
+        environ['PATH'] = out_dir
+        try:
+            for extract in [extract_from_tgz, extract_if_is_tgz]:
+                try:
+                    extract(xz_fp, path.join(out_dir, 'result'))
+                except ValueError, e:
+                    self.assertEqual(str(e), XZ_ERROR_MSG)
+                else:
+                    self.fail("ValueError not raised")
+        finally:
+            environ['PATH'] = old_path
+        self.assertFalse(path.exists(path.join(out_dir, 'result')))
+
+    def test_link_or_copy(self):
+        out_dir = tempfile.mkdtemp(dir=self.tmp_dir)
+        self._dirs_to_clean_up = [out_dir]
+
+        src = path.join(out_dir, 'src.fna')
+        f = open(src, 'w')
+        f.write(">seq1\nACGT\n")
+        f.close()
+
+        # Same filesystem: the file is linked
+        dst = path.join(out_dir, 'dst.fna')
+        link_or_copy(src, dst)
+        self.assertEqual(open(dst).read(), ">seq1\nACGT\n")
+        self.assertEqual(stat(dst).st_ino, stat(src).st_ino)
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -11,12 +11,17 @@ __status__ = "Development"
 
 from qcli.option_parsing import make_option
 from cogent.util.unit_test import TestCase, main
-from xml.dom.minidom import Document
+from StringIO import StringIO
+import pickle
+from xml.dom.minidom import parseString
 from xml_generator import (OptionInfo, ScriptInfo, CommandGenerator,
-    XmlOptionsAttributesGenerator, generate_xml_string, make_xml)
+    XmlOptionsAttributesGenerator, write_xml, generate_xml_string, make_xml,
+    make_xmls, expand_script_fps)
+from script_info_snapshot import export_snapshot
+from xml_stream_writer import XmlStreamWriter
 import tempfile
-from os import path, remove
-from shutil import copyfile
+from os import path, remove, listdir
+from shutil import copyfile, rmtree
 
 class OptionInfoTest(TestCase):
     def setUp(self):
@@ -384,13 +389,42 @@ class ScriptInfoTest(TestCase):
         obs = obj._get_optional_opt('input_fp')
         self.assertEqual(obs, None)
 
-    def test_remove_options(self):
-        obs = ScriptInfo(self.info_dict, 'example_script', 'example_script.py')
-        obs.remove_options('choice_ex,repeat_ex')
-        self.assertEqual(obs.optional_opts, [])
+    def test_get_option(self):
+        obj = ScriptInfo(self.info_dict, 'example_script', 'example_script.py')
+        self.assertEqual(obj.get_option('input_fp'), obj.required_opts[0])
+        self.assertEqual(obj.get_option('repeat_ex'), obj.optional_opts[1])
+        self.assertEqual(obj.get_option('option'), None)
 
-        obs = ScriptInfo(self.info_dict, 'example_script', 'example_script.py')
-        obs.remove_options('choice_ex')
+    def test_immutable(self):
+        obj = ScriptInfo(self.info_dict, 'example_script', 'example_script.py')
+        self.assertRaises(AttributeError, setattr, obj, 'id', 'other')
+        self.assertRaises(AttributeError, setattr, obj, 'other', 'other')
+        self.assertRaises(AttributeError, delattr, obj, 'id')
+        self.assertRaises(AttributeError, setattr, obj.required_opts[0],
+            'name', 'other')
+        self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertFalse(hasattr(obj.required_opts[0], '__dict__'))
+
+    def test_pickle(self):
+        obj = ScriptInfo(self.info_dict, 'example_script', 'example_script.py')
+        for protocol in [0, pickle.HIGHEST_PROTOCOL]:
+            obs = pickle.loads(pickle.dumps(obj, protocol))
+            self.assertEqual(generate_xml_string(obs),
+                generate_xml_string(obj))
+            self.assertEqual(obs.get_option('repeat_ex').type, 'repeat')
+            self.assertRaises(ValueError, obs.remove_options, 'input_fp')
+
+    def test_remove_options(self):
+        obj = ScriptInfo(self.info_dict, 'example_script', 'example_script.py')
+        obs = obj.remove_options('choice_ex,repeat_ex')
+        self.assertEqual(obs.optional_opts, ())
+        self.assertEqual(obs.get_option('choice_ex'), None)
+        # The original object is not modified
+        self.assertEqual(len(obj.optional_opts), 2)
+        self.assertTrue(obj.remove_options(None) is obj)
+
+        obs = ScriptInfo(self.info_dict, 'example_script',
+            'example_script.py').remove_options('choice_ex')
         self.assertEqual(len(obs.optional_opts), 1)
         obs_option = obs.optional_opts[0]
         self.assertEqual(obs_option.name, 'repeat_ex')
@@ -462,6 +496,21 @@ class CommandGeneratorTest(TestCase):
         obj._generate_blast_db_command_text(obj_info.optional_opts[0])
         self.assertEqual(obj.command_text, exp_blast_db_command)
 
+        obj = CommandGenerator(obj_info, link_inputs=True)
+        obj._is_optional = True
+        obj._generate_blast_db_command_text(obj_info.optional_opts[0])
+        self.assertEqual(obj.command_text, exp_blast_db_command_link)
+
+        obj = CommandGenerator(obj_info, blast_db_cache_dir='/galaxy/db_cache')
+        obj._is_optional = True
+        obj._generate_blast_db_command_text(obj_info.optional_opts[0])
+        exp = "\n#if str($blast_db_opt) != 'None':\n BLAST_DB_NAME=" +\
+            "`get_blast_db_path.py -i $blast_db_opt -c /galaxy/db_cache" +\
+            " --hold_pid \\$\\$`;" +\
+            "\n#end if\nblast_db_script.py\n#if str($blast_db_opt) !=" +\
+            " 'None':\n -b \\$BLAST_DB_NAME\n#end if\n"
+        self.assertEqual(obj.command_text, exp)
+
     def test_generate_integer_float_command_text(self):
         obj_info = ScriptInfo(integer_float_script_info, 'int_float_script',
             'int_float_script.py')
@@ -562,6 +611,53 @@ class CommandGeneratorTest(TestCase):
         self.assertRaises(ValueError, obj._generate_input_dir_command_text,
             obj_info.required_opts[0])
 
+        obj_info = ScriptInfo(input_dir_script_info, 'input_dir_script',
+            'input_dir_script.py')
+        obj = CommandGenerator(obj_info, link_inputs=True)
+        obj._generate_input_dir_command_text(obj_info.required_opts[0])
+        exp = "#if $path.ext in ['tgz', 'tar', 'tar.gz', 'tar.bz2'," +\
+            " 'tar.xz', 'gz', 'gzip', 'bz2', 'bzip2', 'xz', 'data'," +\
+            " 'binary']:\nuncompress_tgz.py -i" +\
+            " $path -o input_dir_script_input;\n#else:\nln -s" +\
+            " $path input_dir_script_input;\n#end if\n" +\
+            "input_dir_script.py -p input_dir_script_input"
+        self.assertEqual(obj._uncompress_command + obj.command_text, exp)
+
+        # The archives uploaded with other extensions are also extracted
+        condition = obj._uncompress_command.splitlines()[0]
+        self.assertTrue(condition.startswith('#if $path.ext in '))
+        condition = condition[len('#if $path.ext in '):-1]
+        for ext in ['tgz', 'tar', 'gz', 'bz2', 'tar.gz', 'data']:
+            self.assertTrue(ext in eval(condition))
+        for ext in ['fasta', 'txt', 'biom']:
+            self.assertFalse(ext in eval(condition))
+
+def write_options_xml(info, calls, outputs=False):
+    """Returns the XML of a tool with the elements written by 'calls'
+
+    Inputs:
+        info: a ScriptInfo object
+        calls: list of (XmlOptionsAttributesGenerator method name, option,
+            is_optional) tuples
+        outputs: boolean showing if the calls write to the outputs element
+    """
+    out = StringIO()
+    writer = XmlStreamWriter(out)
+    xml_opts_generator = XmlOptionsAttributesGenerator(info, writer)
+
+    writer.start_document()
+    writer.start_element('tool')
+    for section in ['inputs', 'outputs']:
+        writer.start_element(section)
+        if (section == 'outputs') == outputs:
+            for method, option, is_optional in calls:
+                xml_opts_generator._is_optional = is_optional
+                getattr(xml_opts_generator, method)(option)
+        writer.end_element(section)
+    writer.end_element('tool')
+    writer.end_document()
+    return out.getvalue()
+
 class XmlOptionsAttributesGeneratorTest(TestCase):
     def setUp(self):
         pass
@@ -569,213 +665,115 @@ class XmlOptionsAttributesGeneratorTest(TestCase):
     def test_update(self):
         info = ScriptInfo(script_info_example, 'example_script',
             'example_script.py')
-        doc = Document()
-        tool = doc.createElement('tool')
-        doc.appendChild(tool)
-        inputs = doc.createElement('inputs')
-        outputs = doc.createElement('outputs')
-        tool.appendChild(inputs)
-        tool.appendChild(outputs)
-
-        xml_opts_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                                    outputs)
+        out = StringIO()
+        writer = XmlStreamWriter(out)
+        writer.start_document()
+        writer.start_element('tool')
+
+        xml_opts_generator = XmlOptionsAttributesGenerator(info, writer)
         xml_opts_generator.update()
-        obs = doc.toprettyxml(indent="\t")
+
+        writer.end_element('tool')
+        writer.end_document()
+        obs = out.getvalue()
         self.assertEqual(obs, exp_update)
 
     def test_generate_integer_float_attributes(self):
         info = ScriptInfo(integer_float_script_info, 'integer_float_script',
             'integer_float_script.py')
-        doc = Document()
-        tool = doc.createElement('tool')
-        doc.appendChild(tool)
-        inputs = doc.createElement('inputs')
-        outputs = doc.createElement('outputs')
-        tool.appendChild(inputs)
-        tool.appendChild(outputs)
-
-        xml_opts_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                                    outputs)
-
-        xml_opts_generator._generate_integer_float_attributes(
-            info.required_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls = [('_generate_integer_float_attributes', info.required_opts[0],
+            False)]
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_integer_float_1)
 
-        xml_opts_generator._is_optional = True
-        xml_opts_generator._generate_integer_float_attributes(
-            info.optional_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls.append(('_generate_integer_float_attributes',
+            info.optional_opts[0], True))
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_integer_float_2)
 
     def test_generate_text_data_attributes(self):
         info = ScriptInfo(text_data_script_info, 'param_script',
             'param_script.py')
-        doc = Document()
-        tool = doc.createElement('tool')
-        doc.appendChild(tool)
-        inputs = doc.createElement('inputs')
-        outputs = doc.createElement('outputs')
-        tool.appendChild(inputs)
-        tool.appendChild(outputs)
-
-        xml_opts_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                                    outputs)
-
-        xml_opts_generator._generate_text_data_attributes(info.required_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls = [('_generate_text_data_attributes', info.required_opts[0],
+            False)]
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_text_data_1)
 
-        xml_opts_generator._is_optional = True
-        xml_opts_generator._generate_text_data_attributes(info.optional_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls.append(('_generate_text_data_attributes', info.optional_opts[0],
+            True))
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_text_data_2)
 
     def test_generate_blast_db_attributes(self):
         info = ScriptInfo(blast_db_script_info, 'blast_db_script',
             'blast_db_script.py')
-        doc = Document()
-        tool = doc.createElement('tool')
-        doc.appendChild(tool)
-        inputs = doc.createElement('inputs')
-        outputs = doc.createElement('outputs')
-        tool.appendChild(inputs)
-        tool.appendChild(outputs)
-
-        xml_opts_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                                    outputs)
-        xml_opts_generator._is_optional = True
-        xml_opts_generator._generate_blast_db_attributes(info.optional_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls = [('_generate_blast_db_attributes', info.optional_opts[0],
+            True)]
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_blast_db)
 
     def test_generate_input_dir_attributes(self):
         info = ScriptInfo(input_dir_script_info, 'input_dir_script',
             'input_dir_script.py')
-        doc = Document()
-        tool = doc.createElement('tool')
-        doc.appendChild(tool)
-        inputs = doc.createElement('inputs')
-        outputs = doc.createElement('outputs')
-        tool.appendChild(inputs)
-        tool.appendChild(outputs)
-
-        xml_opts_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                                        outputs)
-
-        xml_opts_generator._generate_input_dir_attributes(info.required_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls = [('_generate_input_dir_attributes', info.required_opts[0],
+            False)]
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_input_dir)
 
     def test_generate_select_attributes(self):
         info = ScriptInfo(select_XML_script_info, 'select_script',
             'select_script.py')
-        doc = Document()
-        tool = doc.createElement('tool')
-        doc.appendChild(tool)
-        inputs = doc.createElement('inputs')
-        outputs = doc.createElement('outputs')
-        tool.appendChild(inputs)
-        tool.appendChild(outputs)
-
-        xml_opts_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                                        outputs)
-
-        xml_opts_generator._generate_select_attributes(info.required_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls = [('_generate_select_attributes', info.required_opts[0], False)]
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_select_1)
 
-        xml_opts_generator._is_optional = True
-        xml_opts_generator._generate_select_attributes(info.optional_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls.append(('_generate_select_attributes', info.optional_opts[0],
+            True))
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_select_2)
 
     def test_generate_multiple_select_attributes(self):
         info = ScriptInfo(multiple_select_XML_script_info,
                 'multiple_select_script', 'multiple_select_script.py')
-        doc = Document()
-        tool = doc.createElement('tool')
-        doc.appendChild(tool)
-        inputs = doc.createElement('inputs')
-        outputs = doc.createElement('outputs')
-        tool.appendChild(inputs)
-        tool.appendChild(outputs)
-
-        xml_opts_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                                    outputs)
-
-        xml_opts_generator._generate_multiple_select_attributes(
-            info.required_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls = [('_generate_multiple_select_attributes',
+            info.required_opts[0], False)]
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_multiple_select)
 
     def test_generate_repeat_attributes(self):
         info = ScriptInfo(repeat_script_info, 'repeat_script',
             'repeat_script.py')
-        doc = Document()
-        tool = doc.createElement('tool')
-        doc.appendChild(tool)
-        inputs = doc.createElement('inputs')
-        outputs = doc.createElement('outputs')
-        tool.appendChild(inputs)
-        tool.appendChild(outputs)
-
-        xml_opts_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                                    outputs)
-
-        xml_opts_generator._generate_repeat_attributes(info.required_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls = [('_generate_repeat_attributes', info.required_opts[0], False)]
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_repeat_1)
 
-        xml_opts_generator._is_optional = True
-        xml_opts_generator._generate_repeat_attributes(info.optional_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls.append(('_generate_repeat_attributes', info.optional_opts[0],
+            True))
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_repeat_2)
 
     def test_generate_output_attributes(self):
         info = ScriptInfo(output_XML_script_info, 'output_script',
             'output_script.py')
-        doc = Document()
-        tool = doc.createElement('tool')
-        doc.appendChild(tool)
-        inputs = doc.createElement('inputs')
-        outputs = doc.createElement('outputs')
-        tool.appendChild(inputs)
-        tool.appendChild(outputs)
-
-        xml_opts_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                                    outputs)
-
-        xml_opts_generator._generate_output_attributes(info.required_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls = [('_generate_output_attributes', info.required_opts[0], False)]
+        obs = write_options_xml(info, calls, outputs=True)
         self.assertEqual(obs, exp_output_1)
 
-        xml_opts_generator._is_optional = True
-        xml_opts_generator._generate_output_attributes(info.optional_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls.append(('_generate_output_attributes', info.optional_opts[0],
+            True))
+        obs = write_options_xml(info, calls, outputs=True)
         self.assertEqual(obs, exp_output_2)
 
     def test_generate_boolean_attributes(self):
         info = ScriptInfo(boolean_script_info, 'boolean_script',
             'boolean_script.py')
-        doc = Document()
-        tool = doc.createElement('tool')
-        doc.appendChild(tool)
-        inputs = doc.createElement('inputs')
-        outputs = doc.createElement('outputs')
-        tool.appendChild(inputs)
-        tool.appendChild(outputs)
-
-        xml_opts_generator = XmlOptionsAttributesGenerator(info, doc, inputs,
-                                                                    outputs)
-
-        xml_opts_generator._is_optional = True
-        xml_opts_generator._generate_boolean_attributes(info.optional_opts[0])
-        obs = doc.toprettyxml(indent="\t")
+        calls = [('_generate_boolean_attributes', info.optional_opts[0], True)]
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_boolean_1)
 
-        xml_opts_generator._generate_boolean_attributes(info.optional_opts[1])
-        obs = doc.toprettyxml(indent="\t")
+        calls.append(('_generate_boolean_attributes', info.optional_opts[1],
+            True))
+        obs = write_options_xml(info, calls)
         self.assertEqual(obs, exp_boolean_2)
 
 class XmlGeneratorTest(TestCase):
@@ -795,16 +793,102 @@ class XmlGeneratorTest(TestCase):
         obs = generate_xml_string(self.info)
         self.assertEqual(obs, exp_full_xml)
 
+        # The compact form is the same XML document without indentation
+        obs = generate_xml_string(self.info, pretty=False)
+        self.assertFalse(obs.startswith('<?xml version="1.0" ?>\n'))
+        self.assertEqual(parseString(obs).toprettyxml(indent="\t"),
+            exp_full_xml)
+
+        # The qiime requirement is versioned by the release
+        obs = generate_xml_string(self.info, release='1.9.0')
+        self.assertEqual(obs, exp_full_xml.replace(
+            '<requirement type="package">qiime</requirement>',
+            '<requirement type="package" version="1.9.0">qiime</requirement>'))
+
+    def test_write_xml(self):
+        out = StringIO()
+        write_xml(self.info, out)
+        self.assertEqual(out.getvalue(), exp_full_xml)
+
     def test_make_xml(self):
         output_fp = path.join(self.output_dir, 'example_script.xml')
         self._paths_to_clean_up = [output_fp, './example_script.py']
         copyfile(self.script_fp, './example_script.py')
 
-        make_xml(self.script_fp, self.output_dir, None)
+        self.assertEqual(make_xml(self.script_fp, self.output_dir, None),
+            "new")
 
         self.assertTrue(path.exists(output_fp),
             'The xml file was not created in the appropiate location')
 
+        # The file is not rewritten if it does not change
+        mtime = path.getmtime(output_fp)
+        self.assertEqual(make_xml(self.script_fp, self.output_dir, None),
+            None)
+        self.assertEqual(path.getmtime(output_fp), mtime)
+        self.assertEqual(make_xml(self.script_fp, self.output_dir,
+            'repeat_ex'), "modified")
+
+    def test_expand_script_fps(self):
+        support_dir = path.dirname(self.script_fp)
+        obs = expand_script_fps([path.join(support_dir, 'script*.py'),
+            path.join(support_dir, 'script1.py'), 'missing.py'])
+        exp = [path.join(support_dir, 'script1.py'),
+               path.join(support_dir, 'script2.py'),
+               path.join(support_dir, 'script3.py'), 'missing.py']
+        self.assertEqual(obs, exp)
+
+    def test_make_xmls(self):
+        output_dir = tempfile.mkdtemp()
+        support_dir = path.dirname(self.script_fp)
+        try:
+            for jobs in [1, 2]:
+                obs = make_xmls([self.script_fp, 'missing_script.py'],
+                    output_dir, {'example_script.py': 'repeat_ex'}, None,
+                    jobs)
+                self.assertEqual([r['script_fp'] for r in obs],
+                    [self.script_fp, 'missing_script.py'])
+                self.assertEqual([r['ok'] for r in obs], [True, False])
+                self.assertEqual(obs[0]['change'],
+                    "new" if jobs == 1 else None)
+                self.assertEqual(obs[0]['error'], None)
+                self.assertTrue(obs[1]['error'] is not None)
+                self.assertTrue(all([r['elapsed'] >= 0 for r in obs]))
+                self.assertEqual(listdir(output_dir), ['example_script.xml'])
+
+            # The remove_opts of the script are applied
+            f = open(path.join(output_dir, 'example_script.xml'), 'U')
+            xml = f.read()
+            f.close()
+            self.assertFalse('repeat_ex' in xml)
+            self.assertTrue('choice_ex' in xml)
+
+            # A wrong option name only makes fail its script
+            obs = make_xmls([self.script_fp, path.join(support_dir,
+                'script*.py')], output_dir, {'example_script.py': None},
+                'not_an_option')
+            self.assertEqual([r['ok'] for r in obs], [True, False, False,
+                False])
+        finally:
+            rmtree(output_dir)
+
+    def test_make_xmls_snapshot(self):
+        output_dir = tempfile.mkdtemp()
+        support_dir = path.dirname(self.script_fp)
+        snapshot, errors = export_snapshot([(name, path.join(support_dir,
+            name)) for name in ['script1.py', 'script3.py']])
+        try:
+            # The patterns are matched against the snapshot script names
+            obs = make_xmls(['script*.py', 'missing.py'], output_dir,
+                jobs=2, snapshot=snapshot)
+            self.assertEqual([r['script_fp'] for r in obs],
+                ['script1.py', 'script3.py', 'missing.py'])
+            self.assertEqual([r['ok'] for r in obs], [True, True, False])
+            self.assertEqual(sorted(listdir(output_dir)),
+                ['script1.xml', 'script3.xml'])
+        finally:
+            rmtree(output_dir)
+
 # A script info example
 script_info_example = {}
 script_info_example['brief_description'] = "An example of brief description"
@@ -1020,6 +1104,22 @@ output_XML_script_info['optional_options'] = [
 ]
 output_XML_script_info['version'] = "1.4.0-dev"
 
+exp_blast_db_command_link = """
+#if str($blast_db_opt) != 'None':
+#if $blast_db_opt.ext in ['tgz', 'tar', 'tar.gz', 'tar.bz2', 'tar.xz', 'gz', \
+'gzip', 'bz2', 'bzip2', 'xz', 'data', 'binary']:
+ uncompress_tgz.py -i $blast_db_opt -o blast_db;
+ BLAST_DB_NAME=`get_blast_db_path.py -i blast_db`;
+#else:
+ BLAST_DB_NAME=$blast_db_opt;
+#end if
+#end if
+blast_db_script.py
+#if str($blast_db_opt) != 'None':
+ -b \$BLAST_DB_NAME
+#end if
+"""
+
 exp_blast_db_command = """
 #if str($blast_db_opt) != 'None':
  uncompress_tgz.py -i $blast_db_opt -o blast_db;
@@ -1040,11 +1140,7 @@ example_script.py -i example_script_input -o example_script_output
 #if $input_files_repeat_ex:
 
 #def list_dict_to_string(list_dict):
-\t#set $file_list = list_dict[0]['additional_input'].__getattr__('file_name')
-\t#for d in list_dict[1:]:
-\t\t#set $file_list = $file_list + ',' + d['additional_input'].__getattr__('file_name')
-\t#end for
-\t#return $file_list
+\t#return ','.join([d['additional_input'].file_name for d in list_dict])
 #end def
  -r $list_dict_to_string($input_files_repeat_ex)
 #end if
@@ -1054,21 +1150,13 @@ compress_path.py -i example_script_output -o $output_fp
 
 exp_cg_repeat_1 = """repeat_script.py
 #def list_dict_to_string(list_dict):
-\t#set $file_list = list_dict[0]['additional_input'].__getattr__('file_name')
-\t#for d in list_dict[1:]:
-\t\t#set $file_list = $file_list + ',' + d['additional_input'].__getattr__('file_name')
-\t#end for
-\t#return $file_list
+\t#return ','.join([d['additional_input'].file_name for d in list_dict])
 #end def
  -i $list_dict_to_string($input_files_input_fps)"""
 
 exp_cg_repeat_2 = """repeat_script.py
 #def list_dict_to_string(list_dict):
-\t#set $file_list = list_dict[0]['additional_input'].__getattr__('file_name')
-\t#for d in list_dict[1:]:
-\t\t#set $file_list = $file_list + ',' + d['additional_input'].__getattr__('file_name')
-\t#end for
-\t#return $file_list
+\t#return ','.join([d['additional_input'].file_name for d in list_dict])
 #end def
  -i $list_dict_to_string($input_files_input_fps)
 #if $input_files_repeat:
@@ -1275,11 +1363,7 @@ example_script.py -i example_script_input -o example_script_output
 #if $input_files_repeat_ex:
 
 #def list_dict_to_string(list_dict):
-\t#set $file_list = list_dict[0]['additional_input'].__getattr__('file_name')
-\t#for d in list_dict[1:]:
-\t\t#set $file_list = $file_list + ',' + d['additional_input'].__getattr__('file_name')
-\t#end for
-\t#return $file_list
+\t#return ','.join([d['additional_input'].file_name for d in list_dict])
 #end def
  -r $list_dict_to_string($input_files_repeat_ex)
 #end if
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+__author__ = "Jose Antonio Navas Molina"
+__copyright__ = "Copyright 2013, The Galaxy-QIIME Project"
+__credits__ = ["Jose Antonio Navas Molina"]
+__license__ = "GPL"
+__version__ = "0.0.1-dev"
+__maintainer__ = "Jose Antonio Navas Molina"
+__email__ = "josenavasmolina@gmail.com"
+__status__ = "Development"
+
+from cogent.util.unit_test import TestCase, main
+from StringIO import StringIO
+from xml.dom.minidom import Document
+from xml_stream_writer import escape, XmlStreamWriter
+
+class XmlStreamWriterTest(TestCase):
+    def setUp(self):
+        self.out = StringIO()
+        self.writer = XmlStreamWriter(self.out)
+
+    def _write_example(self, writer):
+        """Writes a document with all the supported node layouts"""
+        writer.start_document()
+        writer.start_element('root', [('b', '2'), ('a', '1 & "1"')])
+        writer.element('empty')
+        writer.element('text', [('x', 'y')], 'Some <text>')
+        writer.element('empty_text', text='')
+        writer.start_element('mixed')
+        writer.text('first')
+        writer.element('child')
+        writer.text('last')
+        writer.end_element('mixed')
+        writer.start_element('texts')
+        writer.text('one')
+        writer.text('two')
+        writer.end_element('texts')
+        writer.end_element('root')
+        writer.end_document()
+
+    def test_escape(self):
+        self.assertEqual(escape('a & <b> "c"'),
+            'a &amp; &lt;b&gt; &quot;c&quot;')
+
+    def test_pretty_is_minidom_compatible(self):
+        self._write_example(self.writer)
+
+        # Same document built with minidom
+        doc = Document()
+        root = doc.createElement('root')
+        root.setAttribute('b', '2')
+        root.setAttribute('a', '1 & "1"')
+        doc.appendChild(root)
+        root.appendChild(doc.createElement('empty'))
+        text = doc.createElement('text')
+        text.setAttribute('x', 'y')
+        text.appendChild(doc.createTextNode('Some <text>'))
+        root.appendChild(text)
+        empty_text = doc.createElement('empty_text')
+        empty_text.appendChild(doc.createTextNode(''))
+        root.appendChild(empty_text)
+        mixed = doc.createElement('mixed')
+        mixed.appendChild(doc.createTextNode('first'))
+        mixed.appendChild(doc.createElement('child'))
+        mixed.appendChild(doc.createTextNode('last'))
+        root.appendChild(mixed)
+        texts = doc.createElement('texts')
+        texts.appendChild(doc.createTextNode('one'))
+        texts.appendChild(doc.createTextNode('two'))
+        root.appendChild(texts)
+
+        self.assertEqual(self.out.getvalue(), doc.toprettyxml(indent="\t"))
+
+    def test_compact(self):
+        writer = XmlStreamWriter(self.out, pretty=False)
+        self._write_example(writer)
+        self.assertEqual(self.out.getvalue(), exp_compact)
+
+    def test_errors(self):
+        self.writer.start_element('root')
+        self.writer.start_element('child')
+        self.assertRaises(ValueError, self.writer.end_element, 'root')
+        self.assertRaises(ValueError, self.writer.end_document)
+
+exp_compact = ('<?xml version="1.0" ?><root b="2" a="1 &amp; &quot;1&quot;">'
+    '<empty/><text x="y">Some &lt;text&gt;</text><empty_text></empty_text>'
+    '<mixed>first<child/>last</mixed><texts>onetwo</texts></root>')
+
+if __name__ == '__main__':
+    main()